@@ -16,17 +16,36 @@ Features:
 All features accessible from: http://localhost:5000
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import jwt
 import json
 import math
 import os
+import random
 import base64
 from functools import wraps
+from sqlalchemy.orm import load_only
 from predict_risk import AccidentPredictor
-from database import db, Driver, DrivingSession, HealthRecord, init_db
+from token_cache import VerifiedTokenCache
+from password_hashing import HashingBusy, hash_password, needs_rehash, verify_password
+from pagination import PaginationError, parse_page_args, paginate
+from columnar import wants_columnar, columnar_payload
+from write_ops import perform_write
+from unit_of_work import init_unit_of_work
+from compression import init_compression, compression_stats
+from db_routing import configure_replicas, replica_reads
+from driver_versions import conditional_get
+from fleet_monitor import init_fleet_monitor
+from event_bus import bus
+from heatmap import HeatmapError, heatmap_tile, parse_tile_args
+from intent_matcher import chat_matcher, voice_matcher
+from knowledge_index import knowledge_answer
+from database import (
+    db, Driver, DrivingSession, HealthRecord, init_db, configure_engine,
+    get_daily_metrics, summarize_daily_metrics, total_daily_metrics
+)
 try:
     from model_inference_simple import get_detector
     ML_MODEL_AVAILABLE = True
@@ -62,8 +81,17 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'kenya-road-safety-2024-secur
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-2024')
 
-# Initialize database with app
+# Verified tokens are cached, so steady-state auth skips the HS256 check
+jwt_cache = VerifiedTokenCache(app.config['JWT_SECRET_KEY'])
+
+# Initialize database with app (WAL + pragmas on SQLite, pool sizing per backend)
+configure_engine(app)
 db.init_app(app)
+configure_replicas(app)
+# after_request hooks run in reverse order: compress the final response, after the commit
+init_compression(app)
+init_unit_of_work(app)  # One commit per request
+init_fleet_monitor(app, Driver)  # GET /api/admin/fleet/stream (SSE)
 predictor = AccidentPredictor()
 
 print("""
@@ -93,21 +121,46 @@ print("""
 # UTILITY FUNCTIONS
 # ============================================================================
 
-def token_required(f):
-    """Decorator for protected routes"""
+def token_required(f=None, *, columns=None):
+    """
+    Decorator for protected routes.
+
+    Only decodes the JWT; the Driver row is loaded lazily, at most once per
+    request, by current_driver(). Use @token_required(columns=(...)) to
+    load just the Driver columns the handler reads.
+    """
+    if f is None:
+        return lambda fn: token_required(fn, columns=columns)
+    
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization', '').replace('Bearer ', '')
         if not token:
             return redirect(url_for('login'))
         try:
-            data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+            data = jwt_cache.decode(token)
             current_driver_id = data['driver_id']
         except:
             return redirect(url_for('login'))
+        g.driver_id = current_driver_id
+        g.driver_columns = columns
         return f(current_driver_id, *args, **kwargs)
     return decorated
 
+def current_driver():
+    """The authenticated Driver for this request (None if it no longer exists), loaded once"""
+    if 'current_driver' not in g:
+        columns = g.get('driver_columns')
+        options = [load_only(*(getattr(Driver, c) for c in columns))] if columns else []
+        g.current_driver = db.session.get(Driver, g.driver_id, options=options)
+    return g.current_driver
+
+def _hashing_busy(error):
+    """503 for a full password-hashing queue, telling the client when to retry"""
+    response = jsonify({'success': False, 'message': 'Server busy, please try again shortly'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
 def generate_token(driver_id):
     """Generate JWT token for driver"""
     return jwt.encode(
@@ -164,7 +217,7 @@ def index():
     token = request.cookies.get('token')
     if token:
         try:
-            jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+            jwt_cache.decode(token)
             return redirect(url_for('dashboard'))
         except:
             pass
@@ -175,6 +228,17 @@ def test():
     """Test route"""
     return jsonify({'status': 'ok', 'message': 'Flask is working'}), 200
 
+@app.route('/api/metrics')
+def metrics():
+    """Process-local cache counters (per worker)"""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'jwt_cache': jwt_cache.stats(),
+        'compression': compression_stats(),
+        'event_bus': bus.stats()
+    }), 200
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     """Registration page"""
@@ -213,6 +277,8 @@ def register():
         db.session.add(driver)
         db.session.commit()
         return jsonify({'success': True, 'message': 'Account created! Please login'}), 201
+    except HashingBusy as e:
+        return _hashing_busy(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -224,10 +290,26 @@ def login():
         return render_template('login.html')
     
     data = request.get_json()
-    driver = Driver.query.filter_by(username=data.get('username')).first()
+    password = data.get('password')
+    driver = db.session.query(Driver.id, Driver.password_hash).filter_by(username=data.get('username')).first()
+    # Hand the pooled connection back before the (slow) hash check
+    db.session.close()
+    
+    try:
+        if not driver or not password or not verify_password(driver.password_hash, password):
+            return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+    except HashingBusy as e:
+        return _hashing_busy(e)
     
-    if not driver or not driver.check_password(data.get('password')):
-        return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+    # Move the stored hash to the configured method/cost while we have the password
+    if needs_rehash(driver.password_hash):
+        try:
+            new_hash = hash_password(password)
+            Driver.query.filter_by(id=driver.id).update({'password_hash': new_hash})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()  # Keep the old hash; try again next login
+            print(f"⚠️  Password rehash skipped for driver {driver.id}: {e}")
     
     token = generate_token(driver.id)
     response = jsonify({'success': True, 'message': 'Login successful', 'token': token, 'driver_id': driver.id})
@@ -238,6 +320,9 @@ def login():
 @app.route('/logout')
 def logout():
     """Logout"""
+    token = request.cookies.get('token')
+    if token:
+        jwt_cache.revoke(token)
     response = redirect(url_for('login'))
     response.delete_cookie('token')
     return response
@@ -250,7 +335,7 @@ def dashboard():
         return redirect(url_for('login'))
     
     try:
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        data = jwt_cache.decode(token)
         driver = Driver.query.get(data['driver_id'])
         if not driver:
             return redirect(url_for('login'))
@@ -267,7 +352,7 @@ def chatbot():
         return redirect(url_for('login'))
     
     try:
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        data = jwt_cache.decode(token)
         driver = Driver.query.get(data['driver_id'])
         if not driver:
             return redirect(url_for('login'))
@@ -282,9 +367,11 @@ def chatbot():
 
 @app.route('/api/driver/profile', methods=['GET'])
 @token_required
+@conditional_get('profile', 'private, no-cache')
+@replica_reads
 def get_profile(driver_id):
     """Get driver profile"""
-    driver = Driver.query.get(driver_id)
+    driver = current_driver()
     if not driver:
         return jsonify({'success': False, 'message': 'Driver not found'}), 404
     
@@ -306,42 +393,64 @@ def get_profile(driver_id):
     }), 200
 
 @app.route('/api/driver/statistics', methods=['GET'])
-@token_required
+@token_required(columns=('id',))
+@conditional_get('statistics', 'private, max-age=30', daily=True)
+@replica_reads
 def get_statistics(driver_id):
     """Get driver statistics"""
-    driver = Driver.query.get(driver_id)
+    driver = current_driver()
     if not driver:
         return jsonify({'success': False, 'message': 'Driver not found'}), 404
     
-    sessions = DrivingSession.query.filter_by(driver_id=driver_id).all()
-    health_records = HealthRecord.query.filter_by(driver_id=driver_id).all()
-    
-    total_hours = sum([s.duration_hours or 0 for s in sessions])
-    avg_fatigue = sum([s.average_fatigue or 0 for s in sessions]) / len(sessions) if sessions else 0
-    total_alerts = sum([s.drowsiness_alerts or 0 for s in sessions])
+    # Totals and weekly figures come from the daily rollup, not from raw rows
+    totals = total_daily_metrics(driver_id)
+    seven_days_ago = datetime.utcnow().date() - timedelta(days=7)
+    last_week = summarize_daily_metrics(get_daily_metrics(driver_id, seven_days_ago))
     
     return jsonify({
         'success': True,
         'statistics': {
-            'total_driving_hours': round(total_hours, 1),
-            'total_sessions': len(sessions),
-            'average_fatigue': round(avg_fatigue, 1),
-            'total_alerts': total_alerts,
-            'health_records_count': len(health_records)
+            'total_driving_hours': round(totals['driving_hours'], 1),
+            'total_sessions': totals['sessions'],
+            'average_fatigue': totals['average_fatigue'],
+            'total_alerts': totals['alerts'],
+            'health_records_count': totals['health_records'],
+            'last_week': last_week
         }
     }), 200
 
+@app.route('/api/driver/daily-metrics', methods=['GET'])
+@token_required
+@replica_reads
+def get_driver_daily_metrics(driver_id):
+    """Get daily rollup rows for a date range (defaults to the last 30 days)"""
+    try:
+        end_date = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if 'to' in request.args else datetime.utcnow().date()
+        start_date = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if 'from' in request.args else end_date - timedelta(days=30)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    metrics = get_daily_metrics(driver_id, start_date, end_date)
+    
+    return jsonify({
+        'success': True,
+        'from': start_date.isoformat(),
+        'to': end_date.isoformat(),
+        'summary': summarize_daily_metrics(metrics),
+        'days': [m.to_dict() for m in metrics]
+    }), 200
+
 # ============================================================================
 # API ENDPOINTS - Drowsiness Detection
 # ============================================================================
 
 @app.route('/api/drowsiness/assess', methods=['POST'])
-@token_required
+@token_required(columns=('id',))
 def assess_drowsiness(driver_id):
     """Assess drowsiness using ML model or fallback manual calculation"""
     data = request.get_json()
     
-    driver = Driver.query.get(driver_id)
+    driver = current_driver()
     if not driver:
         return jsonify({'success': False, 'message': 'Driver not found'}), 404
     
@@ -415,26 +524,29 @@ def assess_drowsiness(driver_id):
             alert_level = 'safe'
             recommendation = '[OK] Great! You are alert. Keep up good driving'
     
-    # Save to database
-    driver.fatigue_level = int(fatigue_score)
-    driver.last_fatigue_assessment = datetime.utcnow()
+    # Optional position, for the fleet fatigue heatmap; a bad one is dropped, not an error
+    latitude, longitude = data.get('latitude'), data.get('longitude')
+    try:
+        located = -90 <= float(latitude) <= 90 and -180 <= float(longitude) <= 180
+    except (TypeError, ValueError):
+        located = False
     
-    record = HealthRecord(
+    # Save to database
+    perform_write(
+        'record_assessment',
         driver_id=driver_id,
-        assessment_type='drowsiness',
         fatigue_level=int(fatigue_score),
+        alert_sent=(alert_level in ['critical', 'warning']),
+        recommendation=recommendation,
         eye_closure_percentage=data.get('eye_closure_percentage', 0),
         blink_frequency=data.get('blink_frequency', 15),
         head_position=data.get('head_position', 'normal'),
         yawn_detected=data.get('yawn_detected', False),
         hours_driven=data.get('hours_driven', 0),
-        recommendation=recommendation,
-        alert_sent=(alert_level in ['critical', 'warning'])
+        latitude=float(latitude) if located else None,
+        longitude=float(longitude) if located else None
     )
     
-    db.session.add(record)
-    db.session.commit()
-    
     return jsonify({
         'success': True,
         'fatigue_level': round(fatigue_score, 1),
@@ -450,6 +562,33 @@ def assess_drowsiness(driver_id):
         }
     }), 200
 
+# ============================================================================
+# API ENDPOINTS - Fatigue Heatmap
+# ============================================================================
+
+@app.route('/api/heatmap/fatigue', methods=['GET'])
+@token_required
+@replica_reads
+def fatigue_heatmap(driver_id):
+    """Fleet fatigue by map cell for ?bbox=, from/to days and hours of day (see heatmap.py)"""
+    try:
+        bbox, start, end, hours, precision = parse_tile_args(request.args)
+    except HeatmapError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    tile = heatmap_tile(bbox, start, end, hours, precision)
+    response = jsonify({
+        'success': True,
+        'bbox': list(bbox),
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'hours': hours,
+        **tile
+    })
+    # Bins only change by a few counts per assessment; a minute of staleness is fine for a map
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response, 200
+
 # ============================================================================
 # API ENDPOINTS - Sessions
 # ============================================================================
@@ -460,27 +599,21 @@ def start_session(driver_id):
     """Start driving session"""
     data = request.get_json()
     
-    session = DrivingSession(
+    session = perform_write(
+        'start_session',
         driver_id=driver_id,
         start_location=data.get('start_location', 'Unknown'),
         weather_condition=data.get('weather', 'Unknown'),
         road_conditions=data.get('road_conditions', 'Normal')
     )
     
-    db.session.add(session)
-    db.session.commit()
-    
-    driver = Driver.query.get(driver_id)
-    driver.status = 'on_trip'
-    db.session.commit()
-    
     return jsonify({
         'success': True,
         'session': {
-            'id': session.id,
-            'driver_id': session.driver_id,
-            'start_time': session.start_time.isoformat(),
-            'start_location': session.start_location
+            'id': session['id'],
+            'driver_id': session['driver_id'],
+            'start_time': session['start_time'],
+            'start_location': session['start_location']
         }
     }), 201
 
@@ -490,63 +623,81 @@ def end_session(driver_id, session_id):
     """End driving session"""
     data = request.get_json()
     
-    session = DrivingSession.query.get(session_id)
-    if not session or session.driver_id != driver_id:
+    session = perform_write(
+        'end_session',
+        driver_id=driver_id,
+        session_id=session_id,
+        end_location=data.get('end_location', 'Unknown'),
+        distance_km=data.get('distance_km', 0),
+        average_fatigue=data.get('average_fatigue', 0),
+        max_fatigue=data.get('max_fatigue', 0),
+        drowsiness_alerts=data.get('drowsiness_alerts', 0),
+        breaks_taken=data.get('breaks_taken', 0)
+    )
+    if not session:
         return jsonify({'success': False, 'message': 'Session not found'}), 404
-    
-    session.end_time = datetime.utcnow()
-    session.end_location = data.get('end_location', 'Unknown')
-    session.distance_km = data.get('distance_km', 0)
-    session.average_fatigue = data.get('average_fatigue', 0)
-    session.max_fatigue = data.get('max_fatigue', 0)
-    session.drowsiness_alerts = data.get('drowsiness_alerts', 0)
-    session.breaks_taken = data.get('breaks_taken', 0)
-    
-    if session.start_time and session.end_time:
-        duration = (session.end_time - session.start_time).total_seconds() / 3600
-        session.duration_hours = round(duration, 2)
-    
-    db.session.commit()
-    
-    driver = Driver.query.get(driver_id)
-    driver.status = 'inactive'
-    driver.total_driving_hours += session.duration_hours or 0
-    db.session.commit()
+    if session.pop('already_ended'):
+        return jsonify({'success': False, 'message': 'Session already ended'}), 409
     
     return jsonify({
         'success': True,
-        'session': {
-            'id': session.id,
-            'duration_hours': session.duration_hours,
-            'distance_km': session.distance_km,
-            'average_fatigue': session.average_fatigue,
-            'alerts': session.drowsiness_alerts
-        }
+        'session': session
     }), 200
 
 @app.route('/api/session/history', methods=['GET'])
 @token_required
+@replica_reads
 def get_sessions(driver_id):
-    """Get session history"""
-    sessions = DrivingSession.query.filter_by(driver_id=driver_id).order_by(DrivingSession.start_time.desc()).limit(20).all()
+    """Get session history (keyset-paginated: ?limit=&before=&after=&from=&to=, ?format=columnar)"""
+    try:
+        page = parse_page_args(request.args, default_limit=20)
+    except PaginationError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if wants_columnar(request.args):
+        columns = SESSION_HISTORY_COLUMNS
+        rows, page_info = paginate(
+            db.session.query(*(column for _, column in columns)).filter(DrivingSession.driver_id == driver_id),
+            DrivingSession.start_time, DrivingSession.id, page
+        )
+        return jsonify(columnar_payload(columns, rows, success=True, total=len(rows), page=page_info)), 200
+    
+    sessions, page_info = paginate(
+        DrivingSession.query.filter_by(driver_id=driver_id),
+        DrivingSession.start_time, DrivingSession.id, page
+    )
     
     return jsonify({
         'success': True,
         'total': len(sessions),
-        'sessions': [{
-            'id': s.id,
-            'start_time': s.start_time.isoformat(),
-            'end_time': s.end_time.isoformat() if s.end_time else None,
-            'duration_hours': s.duration_hours,
-            'distance_km': s.distance_km,
-            'start_location': s.start_location,
-            'end_location': s.end_location,
-            'average_fatigue': s.average_fatigue,
-            'max_fatigue': s.max_fatigue,
-            'alerts': s.drowsiness_alerts
-        } for s in sessions]
+        'page': page_info,
+        'sessions': [session_history_dict(s) for s in sessions]
     }), 200
 
+# Shared with the async route in asgi.py
+SESSION_HISTORY_COLUMNS = [
+    ('id', DrivingSession.id), ('start_time', DrivingSession.start_time),
+    ('end_time', DrivingSession.end_time), ('duration_hours', DrivingSession.duration_hours),
+    ('distance_km', DrivingSession.distance_km), ('start_location', DrivingSession.start_location),
+    ('end_location', DrivingSession.end_location), ('average_fatigue', DrivingSession.average_fatigue),
+    ('max_fatigue', DrivingSession.max_fatigue), ('alerts', DrivingSession.drowsiness_alerts)
+]
+
+def session_history_dict(s):
+    """One DrivingSession as listed by /api/session/history"""
+    return {
+        'id': s.id,
+        'start_time': s.start_time.isoformat(),
+        'end_time': s.end_time.isoformat() if s.end_time else None,
+        'duration_hours': s.duration_hours,
+        'distance_km': s.distance_km,
+        'start_location': s.start_location,
+        'end_location': s.end_location,
+        'average_fatigue': s.average_fatigue,
+        'max_fatigue': s.max_fatigue,
+        'alerts': s.drowsiness_alerts
+    }
+
 # ============================================================================
 # API ENDPOINTS - Health Records
 # ============================================================================
@@ -557,123 +708,124 @@ def record_health(driver_id):
     """Log health record"""
     data = request.get_json()
     
-    record = HealthRecord(
+    record = perform_write(
+        'record_health',
         driver_id=driver_id,
-        assessment_type=data.get('record_type', 'health_update'),
+        record_type=data.get('record_type', 'health_update'),
         sleep_hours=data.get('sleep_hours'),
         tiredness_level=data.get('tiredness_level'),
         fatigue_level=data.get('fatigue_level', 0),
         recommendation=data.get('recommendation', '')
     )
     
-    db.session.add(record)
-    db.session.commit()
-    
     return jsonify({
         'success': True,
-        'record': {
-            'id': record.id,
-            'timestamp': record.timestamp.isoformat(),
-            'sleep_hours': record.sleep_hours,
-            'tiredness_level': record.tiredness_level
-        }
+        'record': record
     }), 201
 
 @app.route('/api/health/history', methods=['GET'])
 @token_required
+@replica_reads
 def get_health_history(driver_id):
-    """Get health history"""
-    limit = request.args.get('limit', 50, type=int)
-    records = HealthRecord.query.filter_by(driver_id=driver_id).order_by(HealthRecord.timestamp.desc()).limit(limit).all()
+    """Get health history (keyset-paginated: ?limit=&before=&after=&from=&to=, ?format=columnar)"""
+    try:
+        page = parse_page_args(request.args, default_limit=50)
+    except PaginationError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if wants_columnar(request.args):
+        columns = HEALTH_HISTORY_COLUMNS
+        rows, page_info = paginate(
+            db.session.query(*(column for _, column in columns)).filter(HealthRecord.driver_id == driver_id),
+            HealthRecord.timestamp, HealthRecord.id, page
+        )
+        return jsonify(columnar_payload(columns, rows, success=True, total=len(rows), page=page_info)), 200
+    
+    records, page_info = paginate(
+        HealthRecord.query.filter_by(driver_id=driver_id),
+        HealthRecord.timestamp, HealthRecord.id, page
+    )
     
     return jsonify({
         'success': True,
         'total': len(records),
-        'records': [{
-            'id': r.id,
-            'timestamp': r.timestamp.isoformat(),
-            'assessment_type': r.assessment_type,
-            'sleep_hours': r.sleep_hours,
-            'tiredness_level': r.tiredness_level,
-            'fatigue_level': r.fatigue_level,
-            'recommendation': r.recommendation
-        } for r in records]
+        'page': page_info,
+        'records': [health_history_dict(r) for r in records]
     }), 200
 
+# Shared with the async route in asgi.py
+HEALTH_HISTORY_COLUMNS = [
+    ('id', HealthRecord.id), ('timestamp', HealthRecord.timestamp),
+    ('assessment_type', HealthRecord.assessment_type), ('sleep_hours', HealthRecord.sleep_hours),
+    ('tiredness_level', HealthRecord.tiredness_level), ('fatigue_level', HealthRecord.fatigue_level),
+    ('recommendation', HealthRecord.recommendation)
+]
+
+def health_history_dict(r):
+    """One HealthRecord as listed by /api/health/history"""
+    return {
+        'id': r.id,
+        'timestamp': r.timestamp.isoformat(),
+        'assessment_type': r.assessment_type,
+        'sleep_hours': r.sleep_hours,
+        'tiredness_level': r.tiredness_level,
+        'fatigue_level': r.fatigue_level,
+        'recommendation': r.recommendation
+    }
+
 # ============================================================================
 # API ENDPOINTS - Chatbot
 # ============================================================================
 
+# Reply per chat intent (intent_matcher.CHAT_RULES); only the matched one is formatted.
+# Fields: {fatigue}, {total_hours}, {fatigue_note}
+CHAT_RESPONSES = {
+    'fatigue_level': 'Your current fatigue level is {fatigue}%. {fatigue_note}',
+    'drowsy': 'I notice you might be getting drowsy. Fatigue at {fatigue}%. Please pull over safely and take a 15-20 minute break. Stay hydrated and stretch!',
+    'sleep': 'Optimal sleep before driving: 7-8 hours. Quick power naps (15-20 min) can boost alertness. You\'ve driven {total_hours} hours so far.',
+    'black_spots': 'Top dangerous roads in Kenya:\n• Nairobi-Mombasa Road (156 accidents)\n• Mombasa Road Junction (145 accidents)\n• Thika Road (101 accidents)\n• Eldoret-Nakuru Road (54 accidents)\nStay alert and reduce speed!',
+    'start_session': '✅ Driving session started! Stay safe and remember to take breaks every 2 hours.',
+    'end_session': '✅ Driving session ended! You\'ve driven {total_hours} hours total. Well done on safe driving!',
+    'safety_tips': '🚗 Road Safety Tips:\n1. Always wear seatbelts\n2. Follow speed limits (Urban: 50km/h, Highway: 100km/h)\n3. Avoid distractions\n4. Take breaks every 2 hours\n5. Never drive under influence\n6. Use headlights at night\n7. Check weather conditions',
+    'weather': 'Current weather affects driving safety. Rain reduces traction, fog reduces visibility. Check weather before long trips!',
+    'driving_time': 'You\'ve been driving {total_hours} hours total. Remember to take a 15-minute break for every 2 hours of driving!',
+    'music': '🎵 Playing relaxing driving music to keep you alert and focused on the road!',
+    'help': 'I can help with:\n✅ Fatigue monitoring\n✅ Black spot warnings\n✅ Safety tips\n✅ Route risk assessment\n✅ Session tracking\n✅ Emergency alerts\nJust ask naturally!',
+    None: 'I\'m here to help with road safety! You can ask about your fatigue level ({fatigue}%), black spots, safety tips, or session tracking. What would you like to know?',
+}
+
+def chatbot_reply(user_message, fatigue, total_hours):
+    """Reply to a chat message for a driver with the given fatigue % and driving hours"""
+    intent = chat_matcher.match(user_message)
+    if intent is None:
+        # Free-text question - quote the extracted reports if they cover it
+        answer = knowledge_answer(user_message)
+        if answer:
+            return answer
+    template = CHAT_RESPONSES[intent]
+    if '{' not in template:
+        return template
+    return template.format(
+        fatigue=fatigue,
+        total_hours=total_hours,
+        fatigue_note='⚠️ HIGH - Please take a break immediately!' if fatigue >= 60 else '✅ You are alert. Keep up safe driving!'
+    )
+
 @app.route('/api/chatbot/chat', methods=['POST'])
-@token_required
+@token_required(columns=('fatigue_level', 'total_driving_hours', 'full_name'))
 def chatbot_chat(driver_id):
     """Chat with AI chatbot"""
     data = request.get_json()
     user_message = data.get('message', '').lower().strip()
     
-    driver = Driver.query.get(driver_id)
+    driver = current_driver()
     if not driver:
         return jsonify({'success': False, 'message': 'Driver not found'}), 404
     
     # Get driver's stats
     fatigue = driver.fatigue_level or 0
     total_hours = round(driver.total_driving_hours, 1)
-    
-    # Define all response patterns - more comprehensive matching
-    response_patterns = [
-        # Fatigue/Drowsiness
-        (['fatigue level', 'my fatigue', 'what is my fatigue'], 
-         f'Your current fatigue level is {fatigue}%. ' + 
-         ('⚠️ HIGH - Please take a break immediately!' if fatigue >= 60 else 
-          '✅ You are alert. Keep up safe driving!')),
-        
-        (['drowsy', 'sleepy', 'tired', 'sleepiness', 'drowsiness'], 
-         f'I notice you might be getting drowsy. Fatigue at {fatigue}%. Please pull over safely and take a 15-20 minute break. Stay hydrated and stretch!'),
-        
-        (['sleep', 'nap', 'rest'], 
-         f'Optimal sleep before driving: 7-8 hours. Quick power naps (15-20 min) can boost alertness. You\'ve driven {total_hours} hours so far.'),
-        
-        # Black Spots & Danger
-        (['black spot', 'where are the black', 'dangerous road', 'high risk', 'accident spot'], 
-         'Top dangerous roads in Kenya:\n• Nairobi-Mombasa Road (156 accidents)\n• Mombasa Road Junction (145 accidents)\n• Thika Road (101 accidents)\n• Eldoret-Nakuru Road (54 accidents)\nStay alert and reduce speed!'),
-        
-        # Sessions
-        (['start session', 'start driving', 'begin trip'], 
-         '✅ Driving session started! Stay safe and remember to take breaks every 2 hours.'),
-        
-        (['end session', 'end driving', 'finish trip', 'stop driving'], 
-         f'✅ Driving session ended! You\'ve driven {total_hours} hours total. Well done on safe driving!'),
-        
-        # Safety Tips
-        (['safety', 'safety tip', 'safe driving', 'how to drive safe'], 
-         '🚗 Road Safety Tips:\n1. Always wear seatbelts\n2. Follow speed limits (Urban: 50km/h, Highway: 100km/h)\n3. Avoid distractions\n4. Take breaks every 2 hours\n5. Never drive under influence\n6. Use headlights at night\n7. Check weather conditions'),
-        
-        (['weather', 'what is the weather', 'weather condition'], 
-         'Current weather affects driving safety. Rain reduces traction, fog reduces visibility. Check weather before long trips!'),
-        
-        # Driving Time
-        (['how long', 'driving time', 'total hours', 'hours driven'], 
-         f'You\'ve been driving {total_hours} hours total. Remember to take a 15-minute break for every 2 hours of driving!'),
-        
-        # Music
-        (['music', 'play music', 'song'], 
-         '🎵 Playing relaxing driving music to keep you alert and focused on the road!'),
-        
-        # Help & Info
-        (['help', 'what can you do', 'assist me'], 
-         'I can help with:\n✅ Fatigue monitoring\n✅ Black spot warnings\n✅ Safety tips\n✅ Route risk assessment\n✅ Session tracking\n✅ Emergency alerts\nJust ask naturally!'),
-    ]
-    
-    # Find matching response
-    bot_response = None
-    for keywords, response in response_patterns:
-        if any(keyword in user_message for keyword in keywords):
-            bot_response = response
-            break
-    
-    # Default response if no match
-    if not bot_response:
-        bot_response = f'I\'m here to help with road safety! You can ask about your fatigue level ({fatigue}%), black spots, safety tips, or session tracking. What would you like to know?'
+    bot_response = chatbot_reply(user_message, fatigue, total_hours)
     
     return jsonify({
         'success': True,
@@ -744,7 +896,7 @@ def voice_communication():
         return redirect(url_for('login'))
     
     try:
-        data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        data = jwt_cache.decode(token)
         driver = Driver.query.get(data['driver_id'])
         if not driver:
             return redirect(url_for('login'))
@@ -757,14 +909,22 @@ def voice_communication():
 # API ENDPOINTS - Voice Communication
 # ============================================================================
 
+VOICE_SAFETY_TIPS = [
+    'Always wear your seatbelt, even for short trips.',
+    'Take a 15-minute break every 2 hours of driving.',
+    'Never drive if you feel sleepy - pull over and rest.',
+    'Maintain safe following distance from other vehicles.',
+    'Check mirrors frequently to stay aware of surroundings.'
+]
+
 @app.route('/api/voice/command', methods=['POST'])
-@token_required
+@token_required(columns=('fatigue_level', 'total_driving_hours', 'full_name'))
 def voice_command(driver_id):
     """Process voice command from driver"""
     data = request.get_json()
     command = data.get('command', '').lower()
     
-    driver = Driver.query.get(driver_id)
+    driver = current_driver()
     
     # Get current session
     current_session = DrivingSession.query.filter_by(
@@ -776,9 +936,10 @@ def voice_command(driver_id):
     response = ''
     action = None
     session_id = None
+    intent = voice_matcher.match(command)
     
     # Fatigue level query
-    if 'fatigue' in command or 'tired' in command or 'sleepy' in command:
+    if intent == 'fatigue':
         fatigue = driver.fatigue_level or 0
         if fatigue >= 70:
             response = f'Your fatigue level is {fatigue} percent. This is high! Please take a break immediately for your safety.'
@@ -788,53 +949,38 @@ def voice_command(driver_id):
             response = f'Your fatigue level is {fatigue} percent. You are doing well! Keep up safe driving.'
     
     # Weather query
-    elif 'weather' in command or 'rain' in command:
+    elif intent == 'weather':
         response = 'Current weather conditions may vary. Drive carefully in rain and reduce speed. Check local weather updates for your area.'
     
     # Black spots
-    elif 'black spot' in command or 'dangerous' in command or 'accident' in command:
+    elif intent == 'black_spots':
         response = 'There are several high-risk areas on Kenyan roads. Stay alert, especially on Nairobi-Mombasa Road, Thika Road, and Mombasa Road Junction. Would you like me to check black spots near your location?'
     
     # Start session
-    elif 'start' in command and ('session' in command or 'trip' in command or 'drive' in command):
-        if current_session:
+    elif intent == 'start_session':
+        session = None if current_session else perform_write('start_session', driver_id=driver_id, only_if_idle=True)
+        if not session or session['already_active']:
             response = 'You already have an active driving session. Say "end session" to finish it.'
         else:
-            session = DrivingSession(
-                driver_id=driver_id,
-                start_location='Unknown',
-                weather_condition='Unknown',
-                road_conditions='Normal'
-            )
-            db.session.add(session)
-            db.session.commit()
-            
-            driver.status = 'on_trip'
-            db.session.commit()
-            
-            session_id = session.id
+            session_id = session['id']
             action = 'start_session'
             response = 'Driving session started! Remember to drive safely. I will monitor your fatigue levels throughout your trip.'
     
     # End session
-    elif 'end' in command and ('session' in command or 'trip' in command):
+    elif intent == 'end_session':
         if not current_session:
             response = 'You have no active driving session to end.'
         else:
-            current_session.end_time = datetime.utcnow()
-            duration = (current_session.end_time - current_session.start_time).total_seconds() / 3600
-            current_session.duration_hours = round(duration, 2)
-            
-            driver.status = 'inactive'
-            driver.total_driving_hours += current_session.duration_hours
-            
-            db.session.commit()
-            
-            response = f'Driving session ended. You drove for {round(duration, 1)} hours. Stay safe!'
-            action = 'end_session'
+            ended = perform_write('end_session', driver_id=driver_id, session_id=current_session.id)
+            if not ended or ended['already_ended']:
+                # Ended by another request since current_session was read
+                response = 'You have no active driving session to end.'
+            else:
+                response = f'Driving session ended. You drove for {round(ended["duration_hours"] or 0.0, 1)} hours. Stay safe!'
+                action = 'end_session'
     
     # Driving time
-    elif 'how long' in command or 'driving time' in command or 'hours driven' in command:
+    elif intent == 'driving_time':
         if current_session:
             duration = (datetime.utcnow() - current_session.start_time).total_seconds() / 3600
             response = f'You have been driving for {round(duration, 1)} hours in your current session.'
@@ -842,33 +988,24 @@ def voice_command(driver_id):
             response = f'You have driven for a total of {round(driver.total_driving_hours, 1)} hours overall.'
     
     # Safety tips
-    elif 'safety' in command or 'tip' in command or 'advice' in command:
-        tips = [
-            'Always wear your seatbelt, even for short trips.',
-            'Take a 15-minute break every 2 hours of driving.',
-            'Never drive if you feel sleepy - pull over and rest.',
-            'Maintain safe following distance from other vehicles.',
-            'Check mirrors frequently to stay aware of surroundings.'
-        ]
-        import random
-        tip = random.choice(tips)
-        response = f'Here is a safety tip: {tip}'
+    elif intent == 'safety_tip':
+        response = f'Here is a safety tip: {random.choice(VOICE_SAFETY_TIPS)}'
     
     # Emergency
-    elif 'emergency' in command or 'help' in command or 'save me' in command:
+    elif intent == 'emergency':
         response = 'Initiating emergency protocol. Your emergency contacts will be notified.'
         action = 'emergency'
     
     # Music
-    elif 'music' in command or 'play' in command:
+    elif intent == 'music':
         response = 'I cannot play music directly, but you can use your phone or car stereo. Stay focused on the road!'
     
     # Greetings
-    elif 'hello' in command or 'hi' in command or 'hey' in command:
+    elif intent == 'greeting':
         response = f'Hello {driver.full_name}! I am your driving assistant. Ask me about your fatigue level, weather, black spots, or say "start session" to begin driving.'
     
     # Thank you
-    elif 'thank' in command:
+    elif intent == 'thanks':
         response = 'You are welcome! Stay safe on the road!'
     
     # Don't understand
@@ -883,10 +1020,10 @@ def voice_command(driver_id):
     }), 200
 
 @app.route('/api/voice/emergency', methods=['POST'])
-@token_required
+@token_required(columns=('fatigue_level', 'full_name'))
 def voice_emergency(driver_id):
     """Handle emergency voice command"""
-    driver = Driver.query.get(driver_id)
+    driver = current_driver()
     
     # Get current session info
     current_session = DrivingSession.query.filter_by(
@@ -894,30 +1031,25 @@ def voice_emergency(driver_id):
         end_time=None
     ).first()
     
-    # Log emergency
-    record = HealthRecord(
-        driver_id=driver_id,
-        assessment_type='emergency',
-        fatigue_level=driver.fatigue_level or 0,
-        recommendation='EMERGENCY: Driver requested emergency assistance',
-        alert_sent=True
-    )
+    # Read before the write - committing expires the loaded driver
+    driver_name = driver.full_name
     
-    db.session.add(record)
-    db.session.commit()
+    # Log emergency
+    perform_write('log_emergency', driver_id=driver_id, fatigue_level=driver.fatigue_level or 0)
     
     return jsonify({
         'success': True,
         'message': 'Emergency protocol activated',
-        'driver_name': driver.full_name,
+        'driver_name': driver_name,
         'location': 'Unknown - enable location for precise coordinates'
     }), 200
 
 @app.route('/api/voice/status', methods=['GET'])
-@token_required
+@token_required(columns=('full_name', 'fatigue_level', 'health_status', 'total_driving_hours'))
+@replica_reads
 def voice_status(driver_id):
     """Get current driver status for voice system"""
-    driver = Driver.query.get(driver_id)
+    driver = current_driver()
     
     current_session = DrivingSession.query.filter_by(
         driver_id=driver_id,
@@ -926,18 +1058,22 @@ def voice_status(driver_id):
     
     return jsonify({
         'success': True,
-        'status': {
-            'driver_name': driver.full_name,
-            'fatigue_level': driver.fatigue_level or 0,
-            'health_status': driver.health_status,
-            'total_driving_hours': driver.total_driving_hours,
-            'current_session': {
-                'id': current_session.id,
-                'start_time': current_session.start_time.isoformat() if current_session else None
-            } if current_session else None
-        }
+        'status': voice_status_dict(driver, current_session)
     }), 200
 
+def voice_status_dict(driver, current_session):
+    """Driver status for the voice system (shared with asgi.py)"""
+    return {
+        'driver_name': driver.full_name,
+        'fatigue_level': driver.fatigue_level or 0,
+        'health_status': driver.health_status,
+        'total_driving_hours': driver.total_driving_hours,
+        'current_session': {
+            'id': current_session.id,
+            'start_time': current_session.start_time.isoformat() if current_session else None
+        } if current_session else None
+    }
+
 # ============================================================================
 # ERROR HANDLERS
 # ============================================================================
@@ -0,0 +1,326 @@
+"""
+⚡ ASGI SERVING MODE
+Kenya Road Safety - the same API on an event loop
+
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --workers 2 --timeout 120
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+Under the Procfile's gthread workers every open connection holds a
+request thread until it is done: one live fleet stream, one slow mobile
+upload or one long poll takes a thread out of service. In this mode:
+
+  * I/O-bound routes are coroutines on an async SQLAlchemy engine, so a
+    connection that is waiting (on the database, on the next fleet event)
+    costs a task, not a worker:
+        GET  /api/health/history     same keyset pagination and ?format=columnar
+        GET  /api/session/history
+        GET  /api/voice/status
+        POST /api/chatbot/chat
+        GET  /api/admin/fleet/stream (SSE)
+  * Every other route is the Flask app, unchanged, behind a2wsgi's WSGI
+    adapter. Each of those requests runs on a thread pool, so CPU work
+    (FatigueDetector.predict in /api/drowsiness/assess, password hashing)
+    and the synchronous write path (unit of work, event bus) never run on
+    the event loop. Async routes that need synchronous work hand it to
+    the thread pool too: /api/chatbot/chat runs chatbot_reply (intent
+    classifier, knowledge-index search) via run_in_threadpool.
+
+Responses match the Flask routes; the async routes reuse their row
+shapes (app.py), pagination (pagination.py) and fleet state
+(fleet_monitor.py). History reads go to a replica under the same
+read-your-writes rule as @replica_reads.
+
+Async drivers: sqlite+aiosqlite or postgresql+asyncpg, derived from the
+app's database URL (and DATABASE_REPLICA_URLS). If the driver is not
+installed every route is served by Flask, with a warning.
+
+Configuration:
+    ASGI_THREADS=40   threads running Flask routes, per worker
+"""
+
+import importlib.util
+import os
+from contextlib import asynccontextmanager
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, RedirectResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app, jwt_cache, chatbot_reply, voice_status_dict,
+    HEALTH_HISTORY_COLUMNS, health_history_dict, SESSION_HISTORY_COLUMNS, session_history_dict
+)
+from columnar import columnar_payload, wants_columnar
+from compression import MIN_SIZE as COMPRESS_MIN_SIZE
+from database import db, engine_options, Driver, DrivingSession, HealthRecord, SQLITE_PRAGMAS
+from db_routing import wrote_recently
+from event_bus import bus
+from fleet_monitor import SEED_COLUMNS, admin_key_error, monitor
+from pagination import PaginationError, keyset_query, page_rows, parse_page_args
+
+THREADS = int(os.getenv('ASGI_THREADS', 40))
+
+# Backend -> (async SQLAlchemy driver, module that must be importable)
+ASYNC_DRIVERS = {
+    'sqlite': ('sqlite+aiosqlite', 'aiosqlite'),
+    'postgresql': ('postgresql+asyncpg', 'asyncpg'),
+}
+
+
+# ============================================================================
+# ASYNC ENGINES
+# ============================================================================
+
+def async_url(url):
+    """The async-driver form of a database URL, or None if that driver is not installed"""
+    url = make_url(str(url).replace('postgres://', 'postgresql://', 1))
+    driver, module = ASYNC_DRIVERS.get(url.get_backend_name(), (None, None))
+    if driver is None or importlib.util.find_spec(module) is None:
+        return None
+    return url.set(drivername=driver)
+
+
+def _async_engine(url):
+    options = engine_options(str(url))
+    if url.get_backend_name() == 'sqlite':
+        # aiosqlite runs each connection on its own thread; same pool and pragmas as the sync engine
+        options.get('connect_args', {}).pop('check_same_thread', None)
+        if options.get('pool_size'):
+            options['poolclass'] = AsyncAdaptedQueuePool  # aiosqlite otherwise defaults to NullPool
+        engine = create_async_engine(url, **options)
+
+        @event.listens_for(engine.sync_engine, 'connect')
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+        return engine
+    return create_async_engine(url, **options)
+
+
+class AsyncEngines:
+    """The primary plus read replicas, picked per request like db_routing does"""
+
+    def __init__(self, primary_url, replica_urls=()):
+        self.primary = _async_engine(primary_url)
+        self.replicas = [_async_engine(url) for url in replica_urls]
+        self._next = 0
+
+    def for_reads(self, driver_id=None):
+        """A replica, unless there are none or driver_id is inside its read-your-writes window"""
+        if not self.replicas or wrote_recently(driver_id):
+            return self.primary
+        self._next = (self._next + 1) % len(self.replicas)
+        return self.replicas[self._next]
+
+    async def dispose(self):
+        for engine in [self.primary, *self.replicas]:
+            await engine.dispose()
+
+
+def _configure_engines():
+    with flask_app.app_context():
+        primary = async_url(db.engine.url)  # Resolved by Flask-SQLAlchemy (instance/ for relative SQLite paths)
+    replicas = [u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    replicas = [async_url(u) for u in replicas]
+    if primary is None or None in replicas:
+        print("⚠️  No async database driver installed (aiosqlite / asyncpg) - serving every route through Flask")
+        return None
+    print(f"✅ ASGI mode: async engine {primary.drivername}, {len(replicas)} replica(s)")
+    return AsyncEngines(primary, replicas)
+
+
+engines = _configure_engines()
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def _error(message, status):
+    return JSONResponse({'success': False, 'message': message}, status_code=status)
+
+
+def driver_route(replica=False):
+    """
+    Async counterpart of @token_required (+ @replica_reads when replica=True).
+
+    The endpoint is called as fn(request, driver_id, session) with an
+    AsyncSession bound to the engine chosen for this driver.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        async def endpoint(request):
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            try:
+                driver_id = jwt_cache.decode(token)['driver_id']
+            except Exception:
+                return RedirectResponse('/login', status_code=302)
+            bind = engines.for_reads(driver_id) if replica else engines.primary
+            async with AsyncSession(bind, expire_on_commit=False) as session:
+                return await fn(request, driver_id, session)
+        return endpoint
+    return decorator
+
+
+async def _paginate(session, statement, time_column, id_column, page):
+    """pagination.paginate() for a select() on an AsyncSession"""
+    result = await session.execute(keyset_query(statement, time_column, id_column, page))
+    return page_rows(result.all(), time_column, id_column, page)
+
+
+async def _history(request, session, columns, owner_filter, time_column, id_column, default_limit, key, as_dict):
+    try:
+        page = parse_page_args(request.query_params, default_limit=default_limit)
+    except PaginationError as e:
+        return _error(str(e), 400)
+
+    # Both layouts read just the listed columns; the row format needs no ORM objects either
+    statement = select(*(column for _, column in columns)).where(owner_filter)
+    rows, page_info = await _paginate(session, statement, time_column, id_column, page)
+    if wants_columnar(request.query_params):
+        return JSONResponse(columnar_payload(columns, rows, success=True, total=len(rows), page=page_info))
+    return JSONResponse({
+        'success': True,
+        'total': len(rows),
+        'page': page_info,
+        key: [as_dict(row) for row in rows]
+    })
+
+
+# ============================================================================
+# ASYNC ROUTES
+# ============================================================================
+
+@driver_route(replica=True)
+async def health_history(request, driver_id, session):
+    """GET /api/health/history"""
+    return await _history(
+        request, session, HEALTH_HISTORY_COLUMNS, HealthRecord.driver_id == driver_id,
+        HealthRecord.timestamp, HealthRecord.id, 50, 'records', health_history_dict
+    )
+
+
+@driver_route(replica=True)
+async def session_history(request, driver_id, session):
+    """GET /api/session/history"""
+    return await _history(
+        request, session, SESSION_HISTORY_COLUMNS, DrivingSession.driver_id == driver_id,
+        DrivingSession.start_time, DrivingSession.id, 20, 'sessions', session_history_dict
+    )
+
+
+@driver_route(replica=True)
+async def voice_status(request, driver_id, session):
+    """GET /api/voice/status"""
+    driver = (await session.execute(
+        select(Driver.full_name, Driver.fatigue_level, Driver.health_status, Driver.total_driving_hours)
+        .where(Driver.id == driver_id)
+    )).first()
+    if not driver:
+        return _error('Driver not found', 404)
+    current_session = (await session.execute(
+        select(DrivingSession.id, DrivingSession.start_time)
+        .where(DrivingSession.driver_id == driver_id, DrivingSession.end_time.is_(None))
+        .limit(1)
+    )).first()
+    return JSONResponse({'success': True, 'status': voice_status_dict(driver, current_session)})
+
+
+@driver_route()
+async def chatbot_chat(request, driver_id, session):
+    """POST /api/chatbot/chat"""
+    try:
+        data = await request.json()
+    except (ValueError, UnicodeDecodeError):
+        return _error('Request body must be JSON', 400)
+    user_message = str(data.get('message', '')).lower().strip()
+
+    driver = (await session.execute(
+        select(Driver.full_name, Driver.fatigue_level, Driver.total_driving_hours).where(Driver.id == driver_id)
+    )).first()
+    if not driver:
+        return _error('Driver not found', 404)
+
+    fatigue = driver.fatigue_level or 0
+    total_hours = round(driver.total_driving_hours, 1)
+    return JSONResponse({
+        'success': True,
+        # Intent classifier + knowledge-index search (file I/O on refresh): keep it off the loop
+        'response': await run_in_threadpool(chatbot_reply, user_message, fatigue, total_hours),
+        'driver_name': driver.full_name,
+        'fatigue_level': fatigue,
+        'total_hours': total_hours
+    })
+
+
+async def fleet_stream(request):
+    """GET /api/admin/fleet/stream - one task per open stream, woken by fleet events"""
+    error = admin_key_error(request.headers.get('X-Admin-Key') or request.query_params.get('key'))
+    if error:
+        return _error(*error)
+
+    bus.start()  # Tail other workers' events before seeding, so none fall in between
+    if not monitor.seeded:
+        async with AsyncSession(engines.primary) as session:
+            rows = (await session.execute(select(*(getattr(Driver, c) for c in SEED_COLUMNS)))).all()
+        monitor.seed(rows)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('lastEventId')
+    return StreamingResponse(
+        monitor.astream(last_event_id), media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# ============================================================================
+# APPLICATION
+# ============================================================================
+
+ASYNC_ROUTES = [
+    Route('/api/health/history', health_history, methods=['GET']),
+    Route('/api/session/history', session_history, methods=['GET']),
+    Route('/api/voice/status', voice_status, methods=['GET']),
+    Route('/api/chatbot/chat', chatbot_chat, methods=['POST']),
+    Route('/api/admin/fleet/stream', fleet_stream, methods=['GET']),
+]
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    if engines is not None:
+        await engines.dispose()
+
+
+app = Starlette(
+    # Anything not matched above - other paths, other methods - falls through to Flask
+    routes=(ASYNC_ROUTES if engines is not None else []) + [
+        Mount('/', app=WSGIMiddleware(flask_app, workers=THREADS))
+    ],
+    middleware=[
+        # Same open policy as CORS(app); Flask's own compression already set Content-Encoding, so GZip skips those
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE),
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    from database import init_db
+    init_db(flask_app)
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
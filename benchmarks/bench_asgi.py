@@ -0,0 +1,182 @@
+"""
+ASGI vs WSGI Connection Benchmark
+Holds N live fleet streams (SSE) open against one server and reports how
+many got their first event, and how /api/health/history latency looks
+for other clients while they are held. Then measures plain history
+throughput with no streams open. Compares:
+  • wsgi  - gunicorn sync workers, --sync-workers per core
+  • asgi  - gunicorn + uvicorn worker running asgi:app, one per core
+
+Usage:
+    python benchmarks/bench_asgi.py --streams 4,64,512 --sync-workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+ADMIN_KEY = 'bench-admin-key'
+PORT = 8765
+
+
+def _seed(db_path):
+    """Create the database in a child process (keeps this one free of the app)"""
+    code = f"""
+import app as web
+from datetime import datetime, timedelta
+from database import db, Driver, HealthRecord
+with web.app.app_context():
+    db.create_all()
+    driver = Driver(username='bench', email='bench@x', password_hash='x', full_name='Bench', status='on_trip')
+    db.session.add(driver)
+    db.session.flush()
+    now = datetime.utcnow()
+    db.session.execute(HealthRecord.__table__.insert(), [
+        {{'driver_id': driver.id, 'assessment_type': 'drowsiness', 'fatigue_level': i % 100,
+          'timestamp': now - timedelta(minutes=i)}} for i in range(5000)
+    ])
+    db.session.commit()
+    print('TOKEN', web.generate_token(driver.id))
+"""
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=_env(db_path), capture_output=True, text=True)
+    return next(line.split()[1] for line in out.stdout.splitlines() if line.startswith('TOKEN'))
+
+
+def _env(db_path):
+    return dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', ADMIN_API_KEY=ADMIN_KEY, EVENT_BUS_LOG='',
+                SSE_HEARTBEAT_SECONDS='5')
+
+
+def _start(mode, db_path, sync_workers):
+    cores = os.cpu_count() or 1
+    if mode == 'wsgi':
+        args = ['app:app', '--workers', str(sync_workers * cores)]
+    else:
+        args = ['asgi:app', '-k', 'uvicorn.workers.UvicornWorker', '--workers', str(cores)]
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *args, '--bind', f'127.0.0.1:{PORT}', '--timeout', '120',
+         '--backlog', '4096'],
+        cwd=ROOT, env=_env(db_path), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            asyncio.run(_get('/api/health/history?limit=1', {}, timeout=1))
+            return server
+        except OSError:
+            time.sleep(0.3)
+    server.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+async def _get(path, headers, timeout=10):
+    """One GET on a fresh connection; returns (status, seconds)"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', PORT), timeout)
+    try:
+        lines = ''.join(f'{k}: {v}\r\n' for k, v in headers.items())
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n{lines}\r\n'.encode())
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+        return int(data.split(b' ', 2)[1]), time.perf_counter() - start
+    finally:
+        writer.close()
+
+
+async def _hold_stream(held, stop):
+    """Open a fleet stream and keep it open until stop; counts it once its first event arrives"""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    except OSError:
+        return
+    try:
+        writer.write(f'GET /api/admin/fleet/stream HTTP/1.1\r\nHost: bench\r\nX-Admin-Key: {ADMIN_KEY}\r\n\r\n'.encode())
+        await writer.drain()
+        buffer = b''
+        while b'event: snapshot' not in buffer:
+            chunk = await reader.read(4096)
+            if not chunk:
+                return
+            buffer += chunk
+        held.append(1)
+        await stop.wait()
+    finally:
+        writer.close()
+
+
+async def _streams_round(streams, token, probes):
+    held, stop = [], asyncio.Event()
+    tasks = [asyncio.create_task(_hold_stream(held, stop)) for _ in range(streams)]
+    await asyncio.sleep(3)  # Let the streams connect
+
+    latencies, failures = [], 0
+    for _ in range(probes):
+        try:
+            status, seconds = await _get('/api/health/history?limit=50', {'Authorization': f'Bearer {token}'}, timeout=5)
+            if status == 200:
+                latencies.append(seconds * 1000)
+            else:
+                failures += 1
+        except (OSError, asyncio.TimeoutError):
+            failures += 1
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return len(held), latencies, failures
+
+
+async def _throughput(token, concurrency, seconds):
+    done, deadline = [], time.perf_counter() + seconds
+
+    async def client():
+        while time.perf_counter() < deadline:
+            status, _ = await _get('/api/health/history?limit=50', {'Authorization': f'Bearer {token}'})
+            done.append(status)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return len(done) / seconds
+
+
+def _p(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values[0] if values else float('nan'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--streams', default='4,64,512')
+    parser.add_argument('--sync-workers', type=int, default=4, help='sync workers per core (Procfile: 4)')
+    parser.add_argument('--probes', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    token = _seed(db_path)
+    counts = [int(n) for n in args.streams.split(',')]
+
+    print(f"\n{'='*80}")
+    print(f"Held fleet streams + history probes, {os.cpu_count()} core(s), "
+          f"{args.sync_workers} sync workers per core")
+    print(f"{'='*80}")
+    print(f"{'mode':<6}{'streams':>9}{'held':>7}{'probe ok':>10}{'p50 ms':>9}{'p99 ms':>9}  history req/s (no streams)")
+    for mode in ('wsgi', 'asgi'):
+        server = _start(mode, db_path, args.sync_workers)
+        try:
+            rate = asyncio.run(_throughput(token, args.concurrency, args.seconds))
+            for n in counts:
+                held, latencies, failures = asyncio.run(_streams_round(n, token, args.probes))
+                print(f"{mode:<6}{n:>9}{held:>7}{args.probes - failures:>7}/{args.probes:<2}"
+                      f"{_p(latencies, 50):>9.1f}{_p(latencies, 99):>9.1f}  {rate:.0f}")
+                time.sleep(1)
+        finally:
+            server.terminate()
+            server.wait()
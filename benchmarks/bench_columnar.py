@@ -0,0 +1,77 @@
+"""
+Columnar History Format Benchmark
+Payload size and server CPU per request for /api/health/history and
+/api/session/history, default row-of-dicts format vs ?format=columnar.
+
+Usage:
+    python benchmarks/bench_columnar.py --records 5000 --limit 200 --requests 200
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+import app as web
+from database import db, Driver, DrivingSession, HealthRecord
+
+
+def _seed(records):
+    with web.app.app_context():
+        db.create_all()
+        driver = Driver(username='bench', email='bench@x', password_hash='x', full_name='Bench Driver')
+        db.session.add(driver)
+        db.session.flush()
+        start = datetime.utcnow() - timedelta(days=30)
+        for i in range(records):
+            ts = start + timedelta(seconds=30 * i)
+            db.session.add(HealthRecord(
+                driver_id=driver.id, timestamp=ts, assessment_type='drowsiness', fatigue_level=i % 100,
+                recommendation='[OK] You appear alert. Continue safe driving'
+            ))
+            if i % 10 == 0:
+                db.session.add(DrivingSession(
+                    driver_id=driver.id, start_time=ts, end_time=ts + timedelta(hours=2), duration_hours=2.0,
+                    distance_km=120.5, start_location='Nairobi', end_location='Nakuru',
+                    average_fatigue=35, max_fatigue=70, drowsiness_alerts=2
+                ))
+        db.session.commit()
+        return web.generate_token(driver.id)
+
+
+def measure(client, url, token, requests):
+    headers = {'Authorization': f'Bearer {token}'}
+    body = client.get(url, headers=headers).data  # Warm-up, and the body we size
+    start = time.process_time()
+    for _ in range(requests):
+        client.get(url, headers=headers)
+    cpu_ms = (time.process_time() - start) / requests * 1000
+    return len(body), len(gzip.compress(body)), cpu_ms
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    token = _seed(args.records)
+    client = web.app.test_client()
+
+    print(f"\n{'='*70}")
+    print(f"History payloads - {args.limit} rows per page, {args.requests} requests each")
+    print(f"{'='*70}")
+    print(f"{'endpoint':<24}{'format':<10}{'bytes':>10}{'gzip':>10}{'cpu ms/req':>12}")
+    for endpoint in ('/api/health/history', '/api/session/history'):
+        for fmt in ('rows', 'columnar'):
+            url = f'{endpoint}?limit={args.limit}' + ('&format=columnar' if fmt == 'columnar' else '')
+            size, gz, cpu = measure(client, url, token, args.requests)
+            print(f"{endpoint:<24}{fmt:<10}{size:>10}{gz:>10}{cpu:>12.2f}")
@@ -0,0 +1,91 @@
+"""
+Response Compression Benchmark
+Bytes on the wire and server CPU per request for each driver-facing
+GET endpoint, with and without Accept-Encoding negotiation.
+
+Usage:
+    python benchmarks/bench_compression.py --records 5000 --requests 100
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+import app as web
+import compression
+from database import db, Driver, DrivingSession, HealthRecord
+
+ENDPOINTS = [
+    '/api/health/history?limit=200',
+    '/api/health/history?limit=200&format=columnar',
+    '/api/session/history?limit=200',
+    '/api/driver/statistics',
+    '/api/driver/profile',
+    '/api/voice/status',
+]
+
+
+def _seed(records):
+    with web.app.app_context():
+        db.create_all()
+        driver = Driver(username='bench', email='bench@x', password_hash='x', full_name='Bench Driver')
+        db.session.add(driver)
+        db.session.flush()
+        start = datetime.utcnow() - timedelta(days=30)
+        for i in range(records):
+            ts = start + timedelta(seconds=30 * i)
+            db.session.add(HealthRecord(
+                driver_id=driver.id, timestamp=ts, assessment_type='drowsiness', fatigue_level=i % 100,
+                recommendation='[OK] You appear alert. Continue safe driving'
+            ))
+            if i % 10 == 0:
+                db.session.add(DrivingSession(
+                    driver_id=driver.id, start_time=ts, end_time=ts + timedelta(hours=2), duration_hours=2.0,
+                    distance_km=120.5, start_location='Nairobi', end_location='Nakuru',
+                    average_fatigue=35, max_fatigue=70, drowsiness_alerts=2
+                ))
+        db.session.commit()
+        return web.generate_token(driver.id)
+
+
+def measure(client, url, headers, requests):
+    response = client.get(url, headers=headers)
+    start = time.process_time()
+    for _ in range(requests):
+        client.get(url, headers=headers)
+    cpu_ms = (time.process_time() - start) / requests * 1000
+    return len(response.data), response.headers.get('Content-Encoding', 'identity'), cpu_ms
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=100)
+    args = parser.parse_args()
+
+    token = _seed(args.records)
+    client = web.app.test_client()
+    auth = {'Authorization': f'Bearer {token}'}
+
+    print(f"\n{'='*84}")
+    print(f"Compression - {args.requests} requests per row (gzip level {compression.GZIP_LEVEL}, "
+          f"min size {compression.MIN_SIZE} B, brotli {'on' if compression.brotli else 'not installed'})")
+    print(f"{'='*84}")
+    print(f"{'endpoint':<48}{'encoding':<10}{'bytes':>9}{'cpu ms/req':>12}")
+    for url in ENDPOINTS:
+        for accept in (None, ', '.join(compression.ENCODINGS)):
+            headers = dict(auth, **({'Accept-Encoding': accept} if accept else {}))
+            size, encoding, cpu = measure(client, url, headers, args.requests)
+            print(f"{url:<48}{encoding:<10}{size:>9}{cpu:>12.2f}")
+
+    print("\nCompression time only (from /api/metrics):")
+    for endpoint, stats in compression.compression_stats().items():
+        per = stats['cpu_ms'] / stats['responses']
+        print(f"  {endpoint:<28} ratio {stats['ratio']:<6} {per:.3f} ms/response")
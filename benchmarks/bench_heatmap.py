@@ -0,0 +1,137 @@
+"""
+Fatigue Heatmap Benchmark
+Tile latency from the precomputed geohash bins vs scanning HealthRecord
+for the same bounding box and day window.
+
+Assessments are spread along a few highway corridors (with some GPS
+jitter), over the last --days days.
+
+Usage:
+    python benchmarks/bench_heatmap.py --records 200000 --days 30 --requests 10
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ.setdefault('EVENT_BUS_LOG', '')
+
+import numpy as np
+import app as web
+import heatmap
+from database import db, Driver, HealthRecord, FatigueHeatCell
+
+CORRIDORS = [
+    ((-1.2921, 36.8219), (-4.0435, 39.6682)),  # Nairobi - Mombasa
+    ((-1.2921, 36.8219), (-0.3031, 36.0800)),  # Nairobi - Nakuru
+    ((-0.3031, 36.0800), (0.5143, 35.2698)),   # Nakuru - Eldoret
+    ((-1.2921, 36.8219), (-1.0332, 37.0693)),  # Thika Road
+]
+
+TILES = [
+    ('Kenya', 'bbox=33.9,-4.7,41.9,4.6'),
+    ('Nairobi metro', 'bbox=36.6,-1.45,37.1,-1.15'),
+    ('Nairobi metro, 22-5h', 'bbox=36.6,-1.45,37.1,-1.15&hours=22-5'),
+]
+
+
+def _seed(records, days):
+    random.seed(7)
+    now = datetime.utcnow()
+    with web.app.app_context():
+        db.create_all()
+        driver = Driver(username='bench', email='bench@x', password_hash='x', full_name='Bench Driver')
+        db.session.add(driver)
+        db.session.flush()
+        rows = []
+        for _ in range(records):
+            (lat1, lon1), (lat2, lon2) = random.choice(CORRIDORS)
+            t = random.random()
+            fatigue = random.randint(0, 100)
+            rows.append({
+                'driver_id': driver.id, 'assessment_type': 'drowsiness', 'fatigue_level': fatigue,
+                'alert_sent': fatigue >= 60, 'timestamp': now - timedelta(minutes=random.randint(0, days * 1440)),
+                'latitude': lat1 + (lat2 - lat1) * t + random.gauss(0, 0.01),
+                'longitude': lon1 + (lon2 - lon1) * t + random.gauss(0, 0.01)
+            })
+            if len(rows) == 10000:
+                db.session.execute(HealthRecord.__table__.insert(), rows)
+                rows = []
+        if rows:
+            db.session.execute(HealthRecord.__table__.insert(), rows)
+        db.session.commit()
+
+        start = time.perf_counter()
+        heatmap.rebuild_heatmap()
+        rebuild = time.perf_counter() - start
+        bins = FatigueHeatCell.query.count()
+        return web.generate_token(driver.id), bins, rebuild
+
+
+def scan_tile(query_string):
+    """The same tile computed from raw HealthRecord rows"""
+    args = dict(pair.split('=') for pair in query_string.split('&'))
+    bbox, start, end, hours, precision = heatmap.parse_tile_args(args)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    rows = db.session.query(
+        HealthRecord.latitude, HealthRecord.longitude, HealthRecord.timestamp, HealthRecord.fatigue_level
+    ).filter(
+        HealthRecord.assessment_type == 'drowsiness',
+        HealthRecord.latitude.between(min_lat, max_lat),
+        HealthRecord.longitude.between(min_lon, max_lon),
+        HealthRecord.timestamp >= datetime.combine(start, datetime.min.time()) - heatmap.UTC_OFFSET,
+        HealthRecord.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()) - heatmap.UTC_OFFSET
+    ).all()
+    cells = {}
+    for lat, lon, ts, fatigue in rows:
+        local = heatmap._local(ts)
+        if hours is not None and local.hour not in hours:
+            continue
+        totals = cells.setdefault(heatmap.geohash_encode(lat, lon, precision), np.zeros(26))
+        totals[0] += 1
+        totals[1] += fatigue
+        totals[2 + local.hour] += 1
+    return len(cells)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=10)
+    args = parser.parse_args()
+
+    token, bins, rebuild = _seed(args.records, args.days)
+    client = web.app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"\n{'='*84}")
+    print(f"Fatigue heatmap - {args.records} located assessments over {args.days} days -> {bins} bins "
+          f"(levels {heatmap.LEVELS}); rebuild {rebuild:.1f}s")
+    print(f"{'='*84}")
+    print(f"{'tile':<24}{'precision':>10}{'cells':>8}{'bytes':>10}{'bins ms':>10}{'scan ms':>10}")
+    for name, query_string in TILES:
+        url = f'/api/heatmap/fatigue?{query_string}'
+        response = client.get(url, headers=headers)
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            client.get(url, headers=headers)
+        bins_ms = (time.perf_counter() - start) / args.requests * 1000
+
+        with web.app.app_context():
+            scan_tile(query_string)
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                scan_tile(query_string)
+            scan_ms = (time.perf_counter() - start) / args.requests * 1000
+
+        body = response.get_json()
+        print(f"{name:<24}{body['precision']:>10}{len(body['rows']):>8}{len(response.data):>10}"
+              f"{bins_ms:>10.1f}{scan_ms:>10.1f}")
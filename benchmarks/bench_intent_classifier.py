@@ -0,0 +1,165 @@
+"""
+Chatbot Query Intent Benchmark
+Accuracy and latency of chatbot_api.parse_user_query's intent sources on
+labelled messages that are NOT in training_data/chat_intents.json:
+  • legacy     - the old substring chain (any 'to' -> route_info)
+  • keywords   - intent_matcher's whole-word QUERY_RULES alone
+  • classifier - hashed n-gram linear model alone
+  • combined   - classifier, keyword rules below INTENT_MIN_CONFIDENCE
+                 (what parse_user_query does now)
+Latency is per message for predict() and for predict_batch() over the set.
+
+Usage:
+    python train_intent_classifier.py          # if models/intent_classifier.npz is missing
+    python benchmarks/bench_intent_classifier.py --repeat 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from intent_classifier import load_classifier
+from intent_matcher import query_matcher
+
+LABELLED = [
+    ('weather', 'is it going to rain on the way to Nyeri'),
+    ('weather', 'what is the weather at the coast'),
+    ('weather', 'how are conditions near Limuru today'),
+    ('weather', 'fog warning for Kikopey?'),
+    ('weather', 'is visibility ok on the escarpment'),
+    ('weather', 'will it be wet tomorrow morning'),
+    ('weather', 'any rain in Kisii'),
+    ('weather', 'hows the weather'),
+    ('weather', 'is it misty in Limuru'),
+    ('weather', 'thunderstorm coming?'),
+    ('blackspots', 'where do accidents happen on the Nairobi-Nakuru highway'),
+    ('blackspots', 'show dangerous spots around Kericho'),
+    ('blackspots', 'is the Salgaa stretch risky'),
+    ('blackspots', 'black spots to watch for'),
+    ('blackspots', 'which roads near Embu have the most crashes'),
+    ('blackspots', 'any blackspot ahead of me'),
+    ('blackspots', 'deadly corners on this road'),
+    ('blackspots', 'is Sachangwan a dangerous area'),
+    ('blackspots', 'crash-prone places near me'),
+    ('blackspots', 'where is it risky to drive'),
+    ('route_info', 'I want to go to Meru'),
+    ('route_info', 'how do I get to Kitale'),
+    ('route_info', 'heading to Embu now'),
+    ('route_info', 'how far to Garissa'),
+    ('route_info', 'route to JKIA please'),
+    ('route_info', 'distance to Namanga'),
+    ('route_info', 'driving to Kakamega'),
+    ('route_info', 'which way to Narok'),
+    ('route_info', 'going to Mombasa tomorrow'),
+    ('route_info', 'what time will I reach Nanyuki'),
+    ('route_info', 'take me home'),
+    ('route_info', 'travel time to Lodwar'),
+    ('safety', 'tips to stay awake while driving'),
+    ('safety', 'how can I drive more safely at night'),
+    ('safety', 'safety advice for bodaboda riders'),
+    ('safety', 'what to do if my brakes fail'),
+    ('safety', 'is it safe to drive while tired'),
+    ('safety', 'recommendations for a long trip'),
+    ('safety', 'how should I overtake a lorry'),
+    ('safety', 'safe driving tips please'),
+    ('safety', 'how do I avoid crashing'),
+    ('safety', 'advice for driving in heavy traffic'),
+    ('speed', 'what is the limit on Mombasa Road'),
+    ('speed', 'how fast is allowed on the highway'),
+    ('speed', 'speed limit near Machakos'),
+    ('speed', 'can I drive at 110'),
+    ('speed', 'what speed should I keep in town'),
+    ('speed', 'is 80 ok here'),
+    ('speed', 'max speed for a matatu'),
+    ('speed', 'speed limit to Naivasha'),
+    ('speed', 'am I going too fast'),
+    ('speed', 'speeding fine amount'),
+    ('general', 'hello there'),
+    ('general', 'thanks so much'),
+    ('general', 'what are you'),
+    ('general', 'good evening'),
+    ('general', 'can you help me'),
+    ('general', 'habari'),
+    ('general', 'talk to you later'),
+    ('general', 'I want to say thanks'),
+    ('general', 'nice to meet you'),
+    ('general', 'who made you'),
+]
+
+
+def legacy_parse(query):
+    """The old parse_user_query, verbatim"""
+    query_lower = query.lower()
+    intent = "general"
+    if any(word in query_lower for word in ["weather", "rain", "condition", "visibility"]):
+        intent = "weather"
+    elif any(word in query_lower for word in ["black spot", "danger", "risk", "accident", "unsafe"]):
+        intent = "blackspots"
+    elif any(word in query_lower for word in ["to", "heading", "going", "drive", "route"]):
+        intent = "route_info"
+    elif any(word in query_lower for word in ["safe", "safety", "recommendation", "advice"]):
+        intent = "safety"
+    elif any(word in query_lower for word in ["speed", "limit", "how fast"]):
+        intent = "speed"
+    return intent
+
+
+def _per_message_us(fn, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            fn(message)
+    return (time.perf_counter() - start) / (len(messages) * repeat) * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('INTENT_MIN_CONFIDENCE', 0.6)))
+    args = parser.parse_args()
+
+    classifier = load_classifier()
+    if classifier is None:
+        sys.exit(1)
+    truth = [label for label, _ in LABELLED]
+    messages = [text for _, text in LABELLED]
+
+    def keywords(q):
+        return query_matcher.match(q) or "general"
+
+    def combined(q):
+        intent, confidence = classifier.predict(q)
+        return intent if confidence >= args.threshold else keywords(q)
+
+    sources = [
+        ('legacy', legacy_parse),
+        ('keywords', keywords),
+        ('classifier', lambda q: classifier.predict(q)[0]),
+        ('combined', combined),
+    ]
+    print(f"\n{'='*64}")
+    print(f"Query intents - {len(messages)} held-out messages, threshold {args.threshold}")
+    print(f"{'='*64}")
+    print(f"{'':<12}{'accuracy':>10}{'us/msg':>10}")
+    predictions = {}
+    for name, fn in sources:
+        predictions[name] = [fn(m) for m in messages]
+        accuracy = sum(p == t for p, t in zip(predictions[name], truth)) / len(truth)
+        print(f"{name:<12}{accuracy:>10.1%}{_per_message_us(fn, messages, args.repeat):>10.1f}")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        classifier.predict_batch(messages)
+    batch_us = (time.perf_counter() - start) / (len(messages) * args.repeat) * 1e6
+    print(f"{'batch':<12}{'':>10}{batch_us:>10.1f}   (classifier.predict_batch, {len(messages)} at once)")
+
+    fallbacks = sum(classifier.predict(m)[1] < args.threshold for m in messages)
+    print(f"\nBelow threshold (keyword fallback): {fallbacks}/{len(messages)}")
+    print("Combined misses:")
+    for message, label, guess, old in zip(messages, truth, predictions['combined'], predictions['legacy']):
+        if guess != label:
+            print(f"  {message!r:52} {label:>11} -> {guess:<11} (legacy {old})")
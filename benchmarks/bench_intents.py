@@ -0,0 +1,231 @@
+"""
+Chatbot / Voice Intent Matching Benchmark
+Messages per second for chatbot replies and voice-command intents:
+  • legacy  - the old handlers' logic: rebuild every f-string response,
+              then `any(keyword in message)` / an `if 'x' in command` chain
+  • matcher - intent_matcher's compiled rules, formatting only the reply
+              that matched
+and, for scale, whole POST /api/voice/command requests (test client,
+SQLite, read-only commands) with either matcher plugged into the
+handler. Also lists every utterance whose intent changed, for review.
+
+The corpus is the messages the apps send (voice quick-command chips,
+chatbot quick actions) plus typed and spoken variations of them.
+
+Usage:
+    python benchmarks/bench_intents.py --repeat 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.environ.setdefault('EVENT_BUS_LOG', '')
+_TMP = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_TMP, 'bench.db')}")
+os.environ.setdefault('DRIVER_VERSION_FILE', os.path.join(_TMP, 'versions.bin'))
+
+import app as web
+from intent_matcher import chat_matcher, voice_matcher
+
+UTTERANCES = [
+    # Voice quick-command chips (templates/voice_driver.html)
+    'What is my fatigue level', 'What is the weather', 'Where are the black spots', 'Start driving session',
+    'End driving session', 'Tell me a safety tip', 'How long have I been driving', 'Play some music',
+    # Chatbot quick actions (templates/chatbot.html)
+    'What are the black spots near my location?', 'Can you assess the risk level for my planned route?',
+    'Give me tips to avoid drowsiness while driving', 'What are important road safety practices?',
+    'I want to report: pothole on Thika Road',
+    # Fatigue
+    'how tired am i', "i'm feeling sleepy", 'am I too tired to drive', 'my fatigue', 'check my fatigue please',
+    'fatigue level?', "I'm so drowsy right now", 'feeling drowsiness coming on', 'I keep falling asleep',
+    'my eyes are heavy and I am tired', 'is my tiredness dangerous', 'what is my fatigue score today',
+    # Sleep / rest
+    'how much sleep do I need', 'should I take a nap', 'where can I rest', 'I need some rest',
+    'is a power nap enough', 'I slept four hours last night', 'best time to sleep before a night trip',
+    # Black spots / danger
+    'any accident spots on Mombasa road', 'which roads are dangerous', 'is this a high risk area',
+    'show me dangerous roads near Nakuru', 'blackspots on the northern corridor', 'accidents near me',
+    'how many accidents on Thika Road this year', 'is this stretch dangerous at night',
+    # Sessions
+    'start session', 'start my trip', 'begin trip to Mombasa', 'starting my drive now', 'end session',
+    'end trip', 'finish trip', 'stop driving session', 'I have ended my trip', 'start driving',
+    'I want to start a new session', 'end the session please', 'start the engine', 'session status',
+    # Safety tips
+    'give me a safety tip', 'any tips for night driving', 'how to drive safe in rain', 'safe driving advice',
+    'what safety rules apply to matatus', 'tips please', 'any advice for a long trip',
+    # Weather
+    'is it going to rain', 'weather conditions on the highway', 'what is the weather like in Eldoret',
+    'is it raining in Nairobi', 'weather update', 'heavy rain ahead?',
+    # Driving time
+    'how long have I driven', 'total hours driven this week', 'my driving time today', 'hours driven',
+    'how long until I need a break', 'how long is the trip to Kisumu',
+    # Music
+    'play music', 'play a song', 'can you play something', 'some music please', 'play my playlist',
+    # Help / emergency
+    'help', 'what can you do', 'assist me', 'help me', 'emergency', 'save me', 'this is an emergency',
+    'I need help, car broke down', 'call for help',
+    # Greetings / thanks
+    'hello', 'hi', 'hey there', 'hi there, this is John', 'thanks', 'thank you', 'thank you so much',
+    'hello can you hear me',
+    # Substring traps for the old matching
+    'this road is bumpy', 'the white truck ahead is slow', 'which way to the hospital', 'check the tire pressure',
+    'I am interested in the safety report', 'is the restaurant open', 'what is the speed limit here',
+    'my phone display is broken', 'weekend plans', 'attend the meeting', 'the train crossing',
+    'multiple lanes merging', 'the driver behind me is too close', 'traffic is heavy on Waiyaki Way',
+    'the road to Naivasha', 'going to Mombasa tomorrow', 'is the bridge open', 'drain flooding near Kisumu',
+    'among all routes which is fastest', 'snap a photo', 'this is a test', 'shipment delayed',
+    'send my location', 'what time is it', 'ok', 'yes', 'no', '',
+    # Mixed English / Swahili
+    'habari, what is my fatigue level', 'asante sana', 'mvua inanyesha, is it safe to drive',
+    'niko tired sana', 'barabara hatari iko wapi', 'play muziki',
+]
+
+
+# ============================================================================
+# LEGACY IMPLEMENTATIONS (verbatim logic of the old handlers)
+# ============================================================================
+
+LEGACY_CHAT_KEYWORDS = [
+    ('fatigue_level', ['fatigue level', 'my fatigue', 'what is my fatigue']),
+    ('drowsy', ['drowsy', 'sleepy', 'tired', 'sleepiness', 'drowsiness']),
+    ('sleep', ['sleep', 'nap', 'rest']),
+    ('black_spots', ['black spot', 'where are the black', 'dangerous road', 'high risk', 'accident spot']),
+    ('start_session', ['start session', 'start driving', 'begin trip']),
+    ('end_session', ['end session', 'end driving', 'finish trip', 'stop driving']),
+    ('safety_tips', ['safety', 'safety tip', 'safe driving', 'how to drive safe']),
+    ('weather', ['weather', 'what is the weather', 'weather condition']),
+    ('driving_time', ['how long', 'driving time', 'total hours', 'hours driven']),
+    ('music', ['music', 'play music', 'song']),
+    ('help', ['help', 'what can you do', 'assist me']),
+]
+
+
+def legacy_chat(user_message, fatigue, total_hours):
+    """(intent, reply) the old way: every reply formatted, then a substring scan"""
+    response_patterns = [
+        (LEGACY_CHAT_KEYWORDS[0][1], f'Your current fatigue level is {fatigue}%. ' +
+         ('⚠️ HIGH - Please take a break immediately!' if fatigue >= 60 else '✅ You are alert. Keep up safe driving!')),
+        (LEGACY_CHAT_KEYWORDS[1][1], f'I notice you might be getting drowsy. Fatigue at {fatigue}%. Please pull over safely and take a 15-20 minute break. Stay hydrated and stretch!'),
+        (LEGACY_CHAT_KEYWORDS[2][1], f'Optimal sleep before driving: 7-8 hours. Quick power naps (15-20 min) can boost alertness. You\'ve driven {total_hours} hours so far.'),
+        (LEGACY_CHAT_KEYWORDS[3][1], 'Top dangerous roads in Kenya:\n• Nairobi-Mombasa Road (156 accidents)\n• Mombasa Road Junction (145 accidents)\n• Thika Road (101 accidents)\n• Eldoret-Nakuru Road (54 accidents)\nStay alert and reduce speed!'),
+        (LEGACY_CHAT_KEYWORDS[4][1], '✅ Driving session started! Stay safe and remember to take breaks every 2 hours.'),
+        (LEGACY_CHAT_KEYWORDS[5][1], f'✅ Driving session ended! You\'ve driven {total_hours} hours total. Well done on safe driving!'),
+        (LEGACY_CHAT_KEYWORDS[6][1], '🚗 Road Safety Tips:\n1. Always wear seatbelts\n2. Follow speed limits (Urban: 50km/h, Highway: 100km/h)\n3. Avoid distractions\n4. Take breaks every 2 hours\n5. Never drive under influence\n6. Use headlights at night\n7. Check weather conditions'),
+        (LEGACY_CHAT_KEYWORDS[7][1], 'Current weather affects driving safety. Rain reduces traction, fog reduces visibility. Check weather before long trips!'),
+        (LEGACY_CHAT_KEYWORDS[8][1], f'You\'ve been driving {total_hours} hours total. Remember to take a 15-minute break for every 2 hours of driving!'),
+        (LEGACY_CHAT_KEYWORDS[9][1], '🎵 Playing relaxing driving music to keep you alert and focused on the road!'),
+        (LEGACY_CHAT_KEYWORDS[10][1], 'I can help with:\n✅ Fatigue monitoring\n✅ Black spot warnings\n✅ Safety tips\n✅ Route risk assessment\n✅ Session tracking\n✅ Emergency alerts\nJust ask naturally!'),
+    ]
+    for (intent, _), (keywords, response) in zip(LEGACY_CHAT_KEYWORDS, response_patterns):
+        if any(keyword in user_message for keyword in keywords):
+            return intent, response
+    return None, f'I\'m here to help with road safety! You can ask about your fatigue level ({fatigue}%), black spots, safety tips, or session tracking. What would you like to know?'
+
+
+def legacy_voice(command):
+    if 'fatigue' in command or 'tired' in command or 'sleepy' in command:
+        return 'fatigue'
+    elif 'weather' in command or 'rain' in command:
+        return 'weather'
+    elif 'black spot' in command or 'dangerous' in command or 'accident' in command:
+        return 'black_spots'
+    elif 'start' in command and ('session' in command or 'trip' in command or 'drive' in command):
+        return 'start_session'
+    elif 'end' in command and ('session' in command or 'trip' in command):
+        return 'end_session'
+    elif 'how long' in command or 'driving time' in command or 'hours driven' in command:
+        return 'driving_time'
+    elif 'safety' in command or 'tip' in command or 'advice' in command:
+        return 'safety_tip'
+    elif 'emergency' in command or 'help' in command or 'save me' in command:
+        return 'emergency'
+    elif 'music' in command or 'play' in command:
+        return 'music'
+    elif 'hello' in command or 'hi' in command or 'hey' in command:
+        return 'greeting'
+    elif 'thank' in command:
+        return 'thanks'
+    return None
+
+
+WRITE_INTENTS = {'start_session', 'end_session', 'emergency'}
+
+
+def _voice_handler_rate(commands, repeat, matcher):
+    """POST /api/voice/command per second with `matcher` in the handler"""
+    from database import db, Driver
+    with web.app.app_context():
+        db.create_all()
+        driver = Driver.query.filter_by(username='bench').first()
+        if driver is None:
+            driver = Driver(username='bench', email='bench@x', password_hash='x', full_name='Bench', fatigue_level=65)
+            db.session.add(driver)
+            db.session.commit()
+        token = web.generate_token(driver.id)
+    client = web.app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    original, web.voice_matcher = web.voice_matcher, matcher
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for command in commands:
+                client.post('/api/voice/command', json={'command': command}, headers=headers)
+        return len(commands) * repeat / (time.perf_counter() - start)
+    finally:
+        web.voice_matcher = original
+
+
+def _rate(fn, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            fn(message)
+    return len(messages) * repeat / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    messages = [u.lower().strip() for u in UTTERANCES]
+    fatigue, hours = 65, 7.5
+
+    rows = [
+        ('chat reply', lambda m: legacy_chat(m, fatigue, hours), lambda m: web.chatbot_reply(m, fatigue, hours)),
+        ('voice intent', legacy_voice, voice_matcher.match),
+    ]
+    print(f"\n{'='*72}")
+    print(f"Intent matching - {len(messages)} utterances x {args.repeat}")
+    print(f"{'='*72}")
+    print(f"{'':<14}{'legacy msg/s':>14}{'matcher msg/s':>15}{'us/msg':>10}{'changed':>10}")
+    changes = {}
+    for name, legacy, compiled in rows:
+        legacy_rate = _rate(legacy, messages, args.repeat)
+        compiled_rate = _rate(compiled, messages, args.repeat)
+        if name == 'chat reply':
+            pairs = [(m, legacy_chat(m, fatigue, hours)[0], chat_matcher.match(m)) for m in messages]
+        else:
+            pairs = [(m, legacy_voice(m), voice_matcher.match(m)) for m in messages]
+        changes[name] = [p for p in pairs if p[1] != p[2]]
+        print(f"{name:<14}{legacy_rate:>14,.0f}{compiled_rate:>15,.0f}{1e6 / compiled_rate:>10.1f}"
+              f"{len(changes[name]):>10}")
+
+    # Whole requests: does the matcher's cost show up next to auth, the session query and JSON?
+    commands = [m for m in messages if not {legacy_voice(m), voice_matcher.match(m)} & WRITE_INTENTS]
+    repeat = max(1, args.repeat // 20)
+    legacy_rate = _voice_handler_rate(commands, repeat, SimpleNamespace(match=legacy_voice))
+    compiled_rate = _voice_handler_rate(commands, repeat, voice_matcher)
+    print(f"{'voice handler':<14}{legacy_rate:>14,.0f}{compiled_rate:>15,.0f}{1e6 / compiled_rate:>10.1f}"
+          f"{'':>10}   ({len(commands)} read-only commands, req/s)")
+
+    for name, changed in changes.items():
+        print(f"\n{name}: intent changed (legacy -> matcher)")
+        for message, old, new in changed:
+            print(f"  {message!r:48} {old!s:>14} -> {new}")
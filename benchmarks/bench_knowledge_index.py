@@ -0,0 +1,118 @@
+"""
+Knowledge Index Benchmark
+Builds the BM25 knowledge index over a synthetic extracted_data directory
+(generate_training_data.py's three reports, plus --files more whose
+passages are Zipf-distributed words - the reports' own plus a long tail)
+and reports:
+  • full build from the JSON files
+  • save, and load of the saved index (what the refresher does at startup)
+  • update() with nothing changed, and after one new file
+  • snapshot() - the copy the refresher swaps in after a change
+  • search latency (p50 / p99, k=3) for chatbot-style questions
+
+Usage:
+    python benchmarks/bench_knowledge_index.py --files 500 --passages 20
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from knowledge_index import FIELDS, KnowledgeIndex, passages_of
+
+QUESTIONS = [
+    'what causes most accidents', 'why do crashes happen at night', 'is the government doing anything about road safety',
+    'motorcycle crashes', 'what is the target for 2030', 'driver fatigue', 'how dangerous are matatus',
+    'speed limit enforcement', 'road infrastructure improvements', 'accidents on the northern corridor',
+    'young drivers and accidents', 'what should be done about drunk driving',
+]
+
+
+def _write_corpus(directory, files, per_file, seed=11):
+    """generate_training_data's reports plus `files` synthetic ones drawn from a Zipf vocabulary"""
+    subprocess.run([sys.executable, os.path.join(ROOT, 'generate_training_data.py')], cwd=os.path.dirname(directory),
+                   check=True, stdout=subprocess.DEVNULL)
+    words = []
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            data = json.load(f)
+        for field in FIELDS:
+            for text in passages_of(data.get(field)):
+                words += text.split()
+
+    # Real words plus a long tail of rarer ones, Zipf-distributed like report text
+    vocabulary = sorted(set(words)) + [f'term{i}' for i in range(20000)]
+    rng = random.Random(seed)
+    rng.shuffle(vocabulary)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for i in range(files):
+        data = {field: [' '.join(rng.choices(vocabulary, weights, k=rng.randint(5, 14)))
+                        for _ in range(per_file // len(FIELDS))]
+                for field in FIELDS}
+        data['_metadata'] = {'source_file': f'synthetic_report_{i}.pdf'}
+        with open(os.path.join(directory, f'synthetic_{i:05d}.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+
+def _ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--passages', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    data_dir = os.path.join(work, 'extracted_data')
+    index_path = os.path.join(data_dir, '.knowledge_index.json.gz')
+    try:
+        _write_corpus(data_dir, args.files, args.passages)
+
+        index = KnowledgeIndex()
+        build_ms, _ = _ms(lambda: index.update(data_dir))
+        save_ms, _ = _ms(lambda: index.save(index_path))
+        load_ms, loaded = _ms(lambda: KnowledgeIndex.load(index_path))
+        noop_ms, noop = _ms(lambda: loaded.update(data_dir))
+
+        shutil.copy(os.path.join(data_dir, 'trend_analysis_2015_2020.json'), os.path.join(data_dir, 'new_report.json'))
+        add_ms, added = _ms(lambda: loaded.update(data_dir))
+        snapshot_ms, _ = _ms(loaded.snapshot)
+
+        latencies = []
+        for _ in range(args.repeat):
+            for question in QUESTIONS:
+                start = time.perf_counter()
+                loaded.search(question, 3)
+                latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+
+        stats = loaded.stats()
+        print(f"\n{'='*64}")
+        print(f"Knowledge index - {stats['files']} files, {stats['passages']:,} passages, {stats['terms']:,} terms")
+        print(f"{'='*64}")
+        print(f"{'full build':<28}{build_ms:>10.0f} ms")
+        print(f"{'save':<28}{save_ms:>10.0f} ms   ({os.path.getsize(index_path) / 1024:,.0f} KB)")
+        print(f"{'load saved index':<28}{load_ms:>10.0f} ms")
+        print(f"{'update, nothing changed':<28}{noop_ms:>10.1f} ms   {noop}")
+        print(f"{'update, one new file':<28}{add_ms:>10.1f} ms   {added}")
+        print(f"{'snapshot':<28}{snapshot_ms:>10.1f} ms")
+        print(f"{'search p50':<28}{statistics.median(latencies):>10.3f} ms")
+        print(f"{'search p99':<28}{latencies[int(len(latencies) * 0.99)]:>10.3f} ms")
+        print(f"\nTop passage for {QUESTIONS[0]!r}: {loaded.search(QUESTIONS[0], 1)}")
+    finally:
+        shutil.rmtree(work)
@@ -0,0 +1,119 @@
+"""
+Login Storm Load Test
+Fires a burst of concurrent logins (shift change) at a threaded server
+while a probe keeps requesting /api/driver/profile, and reports the
+probe's latency. Compares:
+  • inline   - one hash thread per login, no queue limit (old behaviour)
+  • bounded  - the password_hashing executor defaults (2 threads, queue 32)
+
+Usage:
+    python benchmarks/bench_login_load.py --logins 64 --iterations 600000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def _post(url, payload):
+    req = urllib.request.Request(url, json.dumps(payload).encode(), {'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _child(logins):
+    from werkzeug.serving import make_server
+    from werkzeug.security import generate_password_hash
+    import app as web
+    from database import db, Driver
+    from password_hashing import HASH_METHOD
+
+    with web.app.app_context():
+        db.create_all()
+        shared_hash = generate_password_hash('pw', HASH_METHOD)
+        for n in range(logins + 1):
+            db.session.add(Driver(username=f'd{n}', email=f'd{n}@x', password_hash=shared_hash))
+        db.session.commit()
+        token = web.generate_token(Driver.query.filter_by(username='d0').first().id)
+
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    latencies, stop = [], threading.Event()
+
+    def probe():
+        req = urllib.request.Request(f'{base}/api/driver/profile', headers={'Authorization': f'Bearer {token}'})
+        while not stop.is_set():
+            start = time.perf_counter()
+            urllib.request.urlopen(req).read()
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.02)
+
+    statuses = []
+    storm = [threading.Thread(target=lambda n=n: statuses.append(
+        _post(f'{base}/login', {'username': f'd{n + 1}', 'password': 'pw'}))) for n in range(logins)]
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    for t in storm:
+        t.start()
+    for t in storm:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    server.shutdown()
+
+    print(json.dumps({
+        'ok': statuses.count(200), 'busy': statuses.count(503), 'seconds': elapsed,
+        'p50': statistics.median(latencies),
+        'p95': statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0],
+        'max': max(latencies)
+    }))
+
+
+def run(mode, logins, iterations):
+    env = dict(os.environ, PASSWORD_HASH_ITERATIONS=str(iterations),
+               DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    if mode == 'inline':
+        env.update(PASSWORD_HASH_WORKERS=str(logins), PASSWORD_HASH_QUEUE='0')
+    out = subprocess.run([sys.executable, __file__, '--child', '--logins', str(logins)],
+                         env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--iterations', type=int, default=600000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.logins)
+        sys.exit(0)
+
+    print(f"\n{'='*70}")
+    print(f"Login storm - {args.logins} concurrent logins, PBKDF2 {args.iterations} rounds")
+    print(f"{'='*70}")
+    print(f"{'mode':<10}{'ok':>6}{'503':>6}{'storm s':>10}{'probe p50':>12}{'p95':>10}{'max':>10}")
+    for mode in ('inline', 'bounded'):
+        r = run(mode, args.logins, args.iterations)
+        print(f"{mode:<10}{r['ok']:>6}{r['busy']:>6}{r['seconds']:>10.2f}"
+              f"{r['p50']:>10.1f}ms{r['p95']:>8.1f}ms{r['max']:>8.1f}ms")
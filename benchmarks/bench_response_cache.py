@@ -0,0 +1,98 @@
+"""
+Chatbot Response Cache Benchmark
+POST /api/chat safety questions (chatbot_api) from drivers scattered
+around a few towns, with and without the response cache:
+  • uncached - cache size 0: full black-spot scan per request
+               (the old work plus the cache bookkeeping)
+  • cached   - black-spot candidates kept per geohash cell, exact
+               distances from the driver filtered after the lookup
+Reports requests/s, µs per handle_safety_query / get_safety_recommendations
+call, the cache hit rate, and how many answers differ from the old
+exact-location answer (should be 0).
+
+Usage:
+    python benchmarks/bench_response_cache.py --requests 5000 --drivers 400
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import chatbot_api as bot
+
+TOWNS = [(-1.2921, 36.8219), (-4.0435, 39.6682), (-0.3031, 36.0800), (0.5143, 35.2698), (-1.0396, 37.0900)]
+QUESTIONS = ['any safety advice', 'safety recommendations please', 'how do I drive safely', 'give me safety tips']
+
+
+def uncached_recommendations(latitude=None, longitude=None):
+    """The old get_safety_recommendations: exact location, nothing kept"""
+    recommendations = [
+        "🌙 Night driving: Use headlights, reduce speed, stay alert" if bot.time_of_day() == 'night'
+        else "☀️ Daytime driving: Maintain safe speed and distance"
+    ]
+    if latitude and longitude:
+        high_risk_spots = [s for s in bot.get_nearby_blackspots(latitude, longitude, 50) if s["risk"] == "HIGH"]
+        if high_risk_spots:
+            spot_names = ", ".join([s["location"] for s in high_risk_spots[:2]])
+            recommendations.append(f"⚠️ High-risk areas nearby ({spot_names}): Reduce speed and stay vigilant")
+    recommendations.append("✅ Maintain safe following distance (3+ seconds)")
+    recommendations.append("✅ Avoid phone while driving")
+    recommendations.append("✅ Take breaks every 2 hours on long journeys")
+    return recommendations
+
+
+def _drivers(count, seed=3):
+    """(lat, lon) of drivers within ~40 km of the towns"""
+    rng = random.Random(seed)
+    return [(lat + rng.uniform(-0.35, 0.35), lon + rng.uniform(-0.35, 0.35))
+            for lat, lon in (rng.choice(TOWNS) for _ in range(count))]
+
+
+def _time(fn, calls):
+    start = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--drivers', type=int, default=400)
+    args = parser.parse_args()
+
+    drivers = _drivers(args.drivers)
+    rng = random.Random(5)
+    calls = [rng.choice(drivers) for _ in range(args.requests)]
+
+    # Answers that change because of the cache
+    differ = sum(bot.get_safety_recommendations(*d) != uncached_recommendations(*d) for d in drivers)
+
+    client = bot.app.test_client()
+    payloads = [{'message': rng.choice(QUESTIONS), 'location': {'latitude': lat, 'longitude': lon}} for lat, lon in calls]
+    size = bot.response_cache.max_size
+    results = {}
+    for mode, max_size in (('uncached', 0), ('cached', size)):
+        bot.response_cache.max_size = max_size  # 0: every candidate list is evicted as soon as it is stored
+        bot.response_cache.clear()
+        recommend = _time(bot.get_safety_recommendations, calls) / len(calls) * 1e6
+        bot.response_cache.clear()
+        query = _time(lambda lat, lon: bot.handle_safety_query('', {'latitude': lat, 'longitude': lon}), calls)
+        query = query / len(calls) * 1e6
+        bot.response_cache.clear()
+        bot.response_cache.hits = bot.response_cache.misses = 0
+        chat = _time(lambda payload: client.post('/api/chat', json=payload), [(p,) for p in payloads])
+        results[mode] = (recommend, query, len(calls) / chat, client.get('/api/metrics').get_json()['response_cache'])
+
+    print(f"\n{'='*70}")
+    print(f"Safety answers - {args.requests} requests from {args.drivers} drivers")
+    print(f"{'='*70}")
+    print(f"{'':<10}{'recommendations us':>20}{'safety query us':>17}{'/api/chat req/s':>17}{'hit rate':>10}")
+    for mode, (recommend, query, rate, stats) in results.items():
+        print(f"{mode:<10}{recommend:>20.1f}{query:>17.1f}{rate:>17,.0f}{stats['hit_rate']:>10.1%}")
+    print(f"\nAnswers differing from the exact-location answer: {differ}/{len(drivers)} drivers")
@@ -0,0 +1,206 @@
+"""
+Scraper Pipeline Benchmark
+Wall-clock time to scrape N sources, old pipeline vs the concurrent one:
+  • sequential - the old scrape_all: a fresh requests.get per source,
+                 Gemini extraction inline, a fixed sleep between sources
+  • concurrent - scrape_all: worker threads, one keep-alive session,
+                 per-host politeness interval, bounded Gemini calls,
+                 jittered retries
+Sources are pages on a local HTTP/1.1 server. Each source is on its own
+host (127.0.0.x aliases, like TARGET_URLS' distinct sites) unless
+--same-host. Every fifth page answers 503 (Retry-After: 0) the first
+time, to exercise retries. Gemini is a stand-in that sleeps --llm-latency
+and returns fixed JSON, so no network or API key is used.
+
+--rerun scrapes the same sources a second time with the same scraper,
+as the next scheduled run would: pages send ETag + Last-Modified (every
+third only the body, to exercise the hash comparison) and answer
+conditional requests with 304, so the rerun should make no Gemini calls.
+
+Usage:
+    python benchmarks/bench_scraper.py --sources 6,12,24 --interval 0.5
+    python benchmarks/bench_scraper.py --sources 24 --skip-sequential --rerun
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+PAGE = ('<html><body><main><h1>Road safety report</h1>'
+        + '<p>Speeding caused 35% of crashes on the Nairobi-Mombasa road.</p>' * 40
+        + '</main></body></html>').encode()
+ETAG = '"road-safety-report-v1"'
+LAST_MODIFIED = 'Mon, 06 Jan 2025 08:00:00 GMT'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            first = self.path not in self.server.seen
+            self.server.seen.add(self.path)
+        if first and self.path[-1] in '05':
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        validators = not self.path.endswith(('0', '3', '6', '9'))  # Every third page: body hash only
+        if validators and (self.headers.get('If-None-Match') == ETAG
+                           or self.headers.get('If-Modified-Since') == LAST_MODIFIED):
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            with self.server.lock:
+                self.server.not_modified += 1
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(PAGE)))
+        if validators:
+            self.send_header('ETag', ETAG)
+            self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(PAGE)
+        with self.server.lock:
+            self.server.body_bytes += len(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+class _FakeGemini:
+    """generate_content that takes `latency` seconds and tracks peak concurrency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.active = self.peak = self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self.lock:
+            self.active += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        return type('Response', (), {'text': json.dumps({'key_findings': ['Speeding caused 35% of crashes']})})()
+
+
+def _serve(latency):
+    server = ThreadingHTTPServer(('', 0), _Handler)
+    server.daemon_threads = True
+    server.latency, server.connections, server.seen, server.lock = latency, 0, set(), threading.Lock()
+    server.not_modified = server.body_bytes = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _sources(server, count, same_host):
+    port = server.server_address[1]
+    return [{'url': f'http://127.0.0.{1 if same_host else i + 1}:{port}/page/{i}',
+             'name': f'source_{i}', 'description': f'Source {i}'} for i in range(count)]
+
+
+def sequential_scrape_all(scraper, sources, delay):
+    """The old scrape_all/scrape_url path: requests.get per source, then Gemini, then sleep"""
+    import requests
+    all_data = []
+    for i, url_config in enumerate(sources, 1):
+        try:
+            response = requests.get(url_config['url'], headers={'User-Agent': 'bench'}, timeout=30)
+            response.raise_for_status()
+            markdown = scraper.html_to_markdown(scraper.extract_main_content(response.content))
+            data = json.loads(scraper.model.generate_content(markdown).text)
+            all_data.append(data)
+        except requests.exceptions.RequestException:
+            pass
+        if i < len(sources):
+            time.sleep(delay)
+    return all_data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sources', default='6,12,24')
+    parser.add_argument('--interval', type=float, default=0.5, help='politeness interval / old fixed delay (s)')
+    parser.add_argument('--page-latency', type=float, default=0.2)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--llm-concurrency', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--same-host', action='store_true')
+    parser.add_argument('--skip-sequential', action='store_true')
+    parser.add_argument('--rerun', action='store_true', help='scrape again, revalidating against the HTTP cache')
+    args = parser.parse_args()
+
+    os.environ.setdefault('GEMINI_API_KEY', 'bench-not-used')
+    os.environ['LLM_CONCURRENCY'] = str(args.llm_concurrency)
+    os.environ.setdefault('SCRAPE_RETRY_BACKOFF', '0.2')
+    os.chdir(tempfile.mkdtemp())  # scrape_url writes scraped_data/<name>.json here
+    import scraper as scraper_module
+
+    rows = []
+    for count in (int(n) for n in args.sources.split(',')):
+        row = {'sources': count}
+        for mode in ('sequential', 'concurrent'):
+            if mode == 'sequential' and args.skip_sequential:
+                continue
+            server = _serve(args.page_latency)
+            scraper = scraper_module.RoadAccidentScraper()
+            scraper.model = _FakeGemini(args.llm_latency)
+            sources = _sources(server, count, args.same_host)
+            start = time.perf_counter()
+            if mode == 'sequential':
+                data = sequential_scrape_all(scraper, sources, args.interval)
+            else:
+                data = scraper.scrape_all(delay=args.interval, workers=args.workers, sources=sources)
+            row[mode] = (time.perf_counter() - start, len(data), server.connections, scraper.model.peak)
+            if mode == 'concurrent' and args.rerun:
+                first = (scraper.model.calls, server.body_bytes)
+                start = time.perf_counter()
+                data = scraper.scrape_all(delay=args.interval, workers=args.workers, sources=sources)
+                row['rerun'] = (time.perf_counter() - start, len(data), first,
+                                (scraper.model.calls - first[0], server.body_bytes - first[1]), server.not_modified)
+            server.shutdown()
+        rows.append(row)
+
+    print(f"\n{'='*78}")
+    print(f"Scraping - page {args.page_latency}s, Gemini {args.llm_latency}s, interval {args.interval}s, "
+          f"{args.workers} workers, {args.llm_concurrency} Gemini slots{', one host' if args.same_host else ''}")
+    print(f"{'='*78}")
+    print(f"{'':>8}{'sequential':>26}{'concurrent':>34}")
+    print(f"{'sources':>8}{'s':>8}{'ok':>6}{'conns':>8}{'s':>10}{'ok':>6}{'conns':>8}{'peak Gemini':>13}")
+    for row in rows:
+        line = f"{row['sources']:>8}"
+        if 'sequential' in row:
+            seconds, ok, connections, _ = row['sequential']
+            line += f"{seconds:>8.1f}{ok:>6}{connections:>8}"
+        else:
+            line += f"{'-':>8}{'-':>6}{'-':>8}"
+        seconds, ok, connections, peak = row['concurrent']
+        line += f"{seconds:>10.1f}{ok:>6}{connections:>8}{peak:>13}"
+        print(line)
+
+    if args.rerun:
+        print(f"\n{'Rerun against the HTTP cache':<30}{'s':>8}{'ok':>6}{'Gemini calls':>14}{'body KB':>10}{'304s':>6}")
+        for row in rows:
+            seconds, ok, first, rerun, not_modified = row['rerun']
+            print(f"{str(row['sources']) + ' sources, first run':<30}{row['concurrent'][0]:>8.1f}{row['concurrent'][1]:>6}"
+                  f"{first[0]:>14}{first[1] / 1024:>10.0f}{'-':>6}")
+            print(f"{'rerun':>30}{seconds:>8.1f}{ok:>6}{rerun[0]:>14}{rerun[1] / 1024:>10.0f}{not_modified:>6}")
@@ -0,0 +1,122 @@
+"""
+Single-Writer Throughput Benchmark
+Sustained drowsiness-assessment writes from several worker processes
+(each with several threads, like gunicorn gthread workers), comparing:
+  • direct   - every worker commits to SQLite itself (tuned WAL engine)
+  • writer   - workers send write intents to db_writer.DatabaseWriter
+
+Usage:
+    python benchmarks/bench_single_writer.py --workers 4 --threads 8 --writes 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from database import db, configure_engine, Driver
+import write_ops
+
+SECRET = 'bench-secret'
+
+
+def _make_app(url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SECRET_KEY'] = SECRET
+    configure_engine(app)
+    db.init_app(app)
+    return app
+
+
+def _run_writer(url, socket_path):
+    from db_writer import DatabaseWriter
+    DatabaseWriter(_make_app(url), socket_path, SECRET.encode()).serve_forever()
+
+
+def _worker(url, socket_path, threads, writes, driver_ids, results):
+    write_ops.WRITER_SOCKET = socket_path
+    write_ops._writer_client = None
+    app = _make_app(url)
+    errors = []
+
+    def hammer(driver_id):
+        with app.app_context():
+            for i in range(writes):
+                try:
+                    write_ops.perform_write(
+                        'record_assessment', driver_id=driver_id, fatigue_level=i % 100,
+                        alert_sent=False, recommendation='bench'
+                    )
+                except Exception as e:
+                    errors.append(str(e))
+            db.session.remove()
+
+    pool = [threading.Thread(target=hammer, args=(d,)) for d in driver_ids[:threads]]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put(len(errors))
+
+
+def run(mode, workers, threads, writes):
+    tmp = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    socket_path = os.path.join(tmp, 'writer.sock') if mode == 'writer' else None
+
+    app = _make_app(url)
+    with app.app_context():
+        db.create_all()
+        for n in range(workers * threads):
+            db.session.add(Driver(username=f'b{n}', email=f'b{n}', password_hash='x'))
+        db.session.commit()
+        driver_ids = [d.id for d in Driver.query.order_by(Driver.id)]
+
+    writer = None
+    if mode == 'writer':
+        writer = Process(target=_run_writer, args=(url, socket_path), daemon=True)
+        writer.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+
+    results = Queue()
+    procs = [
+        Process(target=_worker, args=(url, socket_path, threads, writes,
+                                      driver_ids[w * threads:(w + 1) * threads], results))
+        for w in range(workers)
+    ]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+    errors = sum(results.get() for _ in procs)
+
+    if writer:
+        writer.terminate()
+    total = workers * threads * writes
+    return (total - errors) / elapsed, total - errors, errors, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help='Writes per thread')
+    args = parser.parse_args()
+
+    print(f"\n{'='*70}")
+    print(f"Sustained writes - {args.workers} workers x {args.threads} threads x {args.writes} writes")
+    print(f"{'='*70}")
+    print(f"{'mode':<12}{'writes/s':>10}{'committed':>12}{'errors':>10}{'seconds':>10}")
+    for mode in ('direct', 'writer'):
+        rate, committed, errors, elapsed = run(mode, args.workers, args.threads, args.writes)
+        print(f"{mode:<12}{rate:>10.0f}{committed:>12}{errors:>10}{elapsed:>10.2f}")
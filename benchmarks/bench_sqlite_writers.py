@@ -0,0 +1,97 @@
+"""
+SQLite Concurrent Writer Benchmark
+Compares write throughput with several writer processes (like 4 gunicorn
+workers) using the default rollback journal vs. the tuned engine layer
+in database.py (WAL, synchronous=NORMAL, busy_timeout, cache/mmap).
+
+Each write mirrors assess_drowsiness: read the driver, insert a
+health_record, update the driver's fatigue level, commit.
+
+Usage:
+    python benchmarks/bench_sqlite_writers.py --writers 4 --writes 500
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from database import db, engine_options, _set_sqlite_pragmas
+
+
+def _make_engine(url, tuned):
+    if tuned:
+        if not event.contains(Engine, 'connect', _set_sqlite_pragmas):
+            event.listen(Engine, 'connect', _set_sqlite_pragmas)
+        return create_engine(url, **engine_options(url))
+    # Stock behaviour: rollback journal, pysqlite's default 5 s lock timeout
+    return create_engine(url)
+
+
+def _writer(args):
+    url, tuned, writes, driver_id = args
+    engine = _make_engine(url, tuned)
+    ok = locked = 0
+    for i in range(writes):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text('SELECT fatigue_level FROM driver WHERE id = :id'), {'id': driver_id}).fetchone()
+                conn.execute(text(
+                    "INSERT INTO health_record (driver_id, timestamp, assessment_type, fatigue_level, alert_sent) "
+                    "VALUES (:id, CURRENT_TIMESTAMP, 'drowsiness', :f, 0)"
+                ), {'id': driver_id, 'f': i % 100})
+                conn.execute(text('UPDATE driver SET fatigue_level = :f WHERE id = :id'), {'id': driver_id, 'f': i % 100})
+            ok += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    engine.dispose()
+    return ok, locked
+
+
+def run(tuned, writers, writes):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    url = f'sqlite:///{path}'
+
+    setup = _make_engine(url, tuned)
+    db.metadata.create_all(setup)
+    with setup.begin() as conn:
+        if not tuned:
+            conn.exec_driver_sql('PRAGMA journal_mode=DELETE')
+        for n in range(writers):
+            conn.execute(text(
+                "INSERT INTO driver (username, email, password_hash, fatigue_level) VALUES (:u, :u, 'x', 0)"
+            ), {'u': f'bench{n}'})
+    setup.dispose()
+
+    start = time.perf_counter()
+    with Pool(writers) as pool:
+        results = pool.map(_writer, [(url, tuned, writes, n + 1) for n in range(writers)])
+    elapsed = time.perf_counter() - start
+
+    committed = sum(ok for ok, _ in results)
+    locked = sum(lk for _, lk in results)
+    return committed / elapsed, committed, locked, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--writes', type=int, default=500, help='Transactions per writer')
+    args = parser.parse_args()
+
+    print(f"\n{'='*70}")
+    print(f"SQLite write throughput - {args.writers} writers x {args.writes} transactions")
+    print(f"{'='*70}")
+    print(f"{'mode':<28}{'tx/s':>10}{'committed':>12}{'locked':>10}{'seconds':>10}")
+    for label, tuned in [('default (rollback journal)', False), ('tuned (WAL + pragmas)', True)]:
+        rate, committed, locked, elapsed = run(tuned, args.writers, args.writes)
+        print(f"{label:<28}{rate:>10.0f}{committed:>12}{locked:>10}{elapsed:>10.2f}")
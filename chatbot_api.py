@@ -6,11 +6,16 @@ Provides real-time safety guidance via voice and text
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import functools
 import json
 import os
 import math
 from datetime import datetime
 from predict_risk import AccidentPredictor
+from intent_classifier import load_classifier
+from intent_matcher import query_matcher
+from knowledge_index import format_passages, knowledge_index, relevant_passages
+from response_cache import ResponseCache, cell_centre, cell_radius_km, state_bucket, time_of_day
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -19,14 +24,46 @@ CORS(app)  # Enable CORS for frontend access
 # Initialize predictor
 predictor = AccidentPredictor()
 
+# Classifier intents below this confidence fall back to the keyword rules
+INTENT_MIN_CONFIDENCE = float(os.getenv('INTENT_MIN_CONFIDENCE', 0.6))
+
+# Black-spot candidates keyed by location cell - see response_cache.py
+response_cache = ResponseCache()
+
 # ============================================================================
 # DATA SOURCES - Load from training data
 # ============================================================================
 
+BLACK_SPOTS_PATH = 'training_data/black_spots.json'
+LOCATIONS_PATH = 'training_data/locations.json'
+
+def reference_data(path):
+    """Decorator: re-run the loader only when path's modification time changes; a reload clears response_cache"""
+    def decorate(loader):
+        loaded = {}
+
+        @functools.wraps(loader)
+        def load():
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None  # Missing file - the loader's built-in data
+            if loaded and loaded['mtime'] == mtime:
+                return loaded['data']
+            data = loader()
+            if loaded:
+                response_cache.clear()
+                print(f"🔄 Reloaded {path} - response cache cleared")
+            loaded.update(mtime=mtime, data=data)
+            return data
+        return load
+    return decorate
+
+@reference_data(BLACK_SPOTS_PATH)
 def load_black_spots():
     """Load black spots from training data"""
     try:
-        with open('training_data/black_spots.json', 'r') as f:
+        with open(BLACK_SPOTS_PATH, 'r') as f:
             return json.load(f)
     except:
         return {
@@ -44,10 +81,11 @@ def load_black_spots():
             ]
         }
 
+@reference_data(LOCATIONS_PATH)
 def load_locations_db():
     """Load locations and their characteristics"""
     try:
-        with open('training_data/locations.json', 'r') as f:
+        with open(LOCATIONS_PATH, 'r') as f:
             return json.load(f)
     except:
         return {
@@ -62,6 +100,11 @@ def load_locations_db():
             }
         }
 
+def check_reference_data():
+    """Reload reference files that changed (clearing response_cache) before reading cached black-spot candidates"""
+    load_black_spots()
+    load_locations_db()
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -99,6 +142,31 @@ def get_nearby_blackspots(latitude, longitude, radius_km=50):
     nearby.sort(key=lambda x: x["distance_km"])
     return nearby
 
+def blackspots_within(latitude, longitude, radius_km):
+    """The black spots within radius of a point, unsorted (file order keeps distance ties stable)"""
+    return [
+        spot for spot in load_black_spots().get("black_spots", [])
+        if calculate_distance(latitude, longitude, spot["latitude"], spot["longitude"]) <= radius_km
+    ]
+
+def nearby_blackspots_cached(latitude, longitude, radius_km=50):
+    """get_nearby_blackspots(), scanning only the spots cached as candidates for the location's cell"""
+    cell = state_bucket(latitude, longitude)
+    candidates = response_cache.get_or_set(
+        ('blackspot_candidates', cell, radius_km),
+        lambda: blackspots_within(*cell_centre(cell), radius_km + cell_radius_km(cell))
+    )
+    nearby = []
+    for spot in candidates:
+        distance = calculate_distance(latitude, longitude, spot["latitude"], spot["longitude"])
+        if distance <= radius_km:
+            nearby.append({
+                **spot,
+                "distance_km": round(distance, 1)
+            })
+    nearby.sort(key=lambda x: x["distance_km"])
+    return nearby
+
 def get_mock_weather(location):
     """Get mock weather data (in real system, use weather API)"""
     weather_conditions = {
@@ -118,19 +186,23 @@ def get_mock_weather(location):
     return {"temp": 24, "condition": "Partly Cloudy", "visibility": "Good", "rain": False}
 
 def get_safety_recommendations(latitude=None, longitude=None, destination=None):
-    """Generate safety recommendations based on location and time"""
+    """Generate safety recommendations based on location and time (black-spot candidates cached per cell)"""
+    check_reference_data()
+    return build_safety_recommendations(latitude, longitude, time_of_day())
+
+def build_safety_recommendations(latitude, longitude, period):
+    """Safety recommendations for a location (None: no location) and time_of_day period"""
     recommendations = []
     
     # Time-based recommendations
-    hour = datetime.now().hour
-    if hour >= 18 or hour <= 6:
+    if period == 'night':
         recommendations.append("🌙 Night driving: Use headlights, reduce speed, stay alert")
     else:
         recommendations.append("☀️ Daytime driving: Maintain safe speed and distance")
     
     # Location-based recommendations
-    if latitude and longitude:
-        nearby_spots = get_nearby_blackspots(latitude, longitude, 50)
+    if latitude is not None and longitude is not None:
+        nearby_spots = nearby_blackspots_cached(latitude, longitude, 50)
         if nearby_spots:
             high_risk_spots = [s for s in nearby_spots if s["risk"] == "HIGH"]
             if high_risk_spots:
@@ -145,22 +217,23 @@ def get_safety_recommendations(latitude=None, longitude=None, destination=None):
     return recommendations
 
 def parse_user_query(query):
-    """Parse user query to extract intent and entities"""
-    query_lower = query.lower()
-    
-    intent = "general"
-    if any(word in query_lower for word in ["weather", "rain", "condition", "visibility"]):
-        intent = "weather"
-    elif any(word in query_lower for word in ["black spot", "danger", "risk", "accident", "unsafe"]):
-        intent = "blackspots"
-    elif any(word in query_lower for word in ["to", "heading", "going", "drive", "route"]):
-        intent = "route_info"
-    elif any(word in query_lower for word in ["safe", "safety", "recommendation", "advice"]):
-        intent = "safety"
-    elif any(word in query_lower for word in ["speed", "limit", "how fast"]):
-        intent = "speed"
-    
-    return intent
+    """Parse user query to extract intent - the intent classifier, or the keyword rules when it is unsure"""
+    classifier = load_classifier()
+    if classifier is not None:
+        intent, confidence = classifier.predict(query)
+        if confidence >= INTENT_MIN_CONFIDENCE:
+            return intent
+    return query_matcher.match(query) or "general"
+
+def parse_user_queries(queries):
+    """parse_user_query for many messages, scored by the classifier in one batch"""
+    classifier = load_classifier()
+    if classifier is None:
+        return [query_matcher.match(q) or "general" for q in queries]
+    return [
+        intent if confidence >= INTENT_MIN_CONFIDENCE else (query_matcher.match(q) or "general")
+        for q, (intent, confidence) in zip(queries, classifier.predict_batch(queries))
+    ]
 
 # ============================================================================
 # API ROUTES
@@ -409,10 +482,13 @@ def handle_route_query(query, location_data):
 
 def handle_safety_query(query, location_data):
     """Handle safety recommendation queries"""
-    recommendations = get_safety_recommendations(
-        location_data.get('latitude') if location_data else None,
-        location_data.get('longitude') if location_data else None
-    )
+    latitude = location_data.get('latitude') if location_data else None
+    longitude = location_data.get('longitude') if location_data else None
+    return build_safety_answer(latitude, longitude)
+
+def build_safety_answer(latitude, longitude):
+    """The safety query answer for a location"""
+    recommendations = get_safety_recommendations(latitude, longitude)
     
     response = "🛡️ Safety Recommendations:\n"
     for i, rec in enumerate(recommendations, 1):
@@ -439,7 +515,15 @@ def handle_speed_query(query):
     }
 
 def handle_general_query(query, location_data):
-    """Handle general queries"""
+    """Handle general queries - quoted from the extracted reports when they cover the question"""
+    passages = relevant_passages(query)
+    if passages:
+        return {
+            "response": format_passages(passages),
+            "intent": "knowledge",
+            "passages": passages
+        }
+    
     response = "👋 Hello! I'm your road safety assistant. I can help with:\n"
     response += "• 🌤️ Weather conditions\n"
     response += "• ⚠️ Black spots and dangerous areas\n"
@@ -466,6 +550,35 @@ def health():
         "version": "1.0"
     })
 
+@app.route('/api/knowledge/search', methods=['POST'])
+def knowledge_search():
+    """Top-k report passages for a free-text question"""
+    try:
+        data = request.json
+        question = data.get('question', '').strip()
+        k = min(int(data.get('k', 3)), 20)
+        
+        if not question:
+            return jsonify({"error": "Empty question"}), 400
+        
+        index = knowledge_index()
+        return jsonify({
+            "question": question,
+            "results": index.search(question, k),
+            "index": index.stats()
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Process-local response cache counters"""
+    return jsonify({
+        "pid": os.getpid(),
+        "response_cache": response_cache.stats()
+    })
+
 @app.route('/', methods=['GET'])
 def index():
     """API info"""
@@ -478,7 +591,9 @@ def index():
             "/api/blackspots": "POST - Get nearby black spots",
             "/api/predict-route-risk": "POST - Predict route risk",
             "/api/recommendations": "POST - Get safety recommendations",
-            "/api/health": "GET - Health check"
+            "/api/knowledge/search": "POST - Search extracted road-safety reports",
+            "/api/health": "GET - Health check",
+            "/api/metrics": "GET - Response cache hit rate"
         }
     })
 
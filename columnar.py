@@ -0,0 +1,64 @@
+"""
+Columnar Response Format
+Opt-in compact layout for list endpoints (?format=columnar):
+
+    {"columns": ["id", "timestamp", ...], "rows": [[1, 1718000000000, ...], ...]}
+
+Key names are sent once instead of once per row, and datetimes become
+epoch milliseconds (UTC) instead of ISO strings. Rows are built straight
+from SQL result tuples - no ORM objects, no per-row dicts.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime
+
+_EPOCH = datetime(1970, 1, 1)
+_MS = timedelta(milliseconds=1)
+
+
+def wants_columnar(args):
+    """True when the request asked for ?format=columnar"""
+    return args.get('format') == 'columnar'
+
+
+def epoch_ms(value):
+    """Naive-UTC datetime -> integer epoch milliseconds (None stays None)"""
+    return None if value is None else (value - _EPOCH) // _MS
+
+
+def columnar_rows(rows, time_indexes=()):
+    """
+    Convert result tuples to JSON-ready lists.
+
+    time_indexes are the positions holding datetimes; every other value is
+    passed through as-is.
+    """
+    if not time_indexes:
+        return [list(row) for row in rows]
+    out = []
+    for row in rows:
+        values = list(row)
+        for i in time_indexes:
+            if values[i] is not None:
+                values[i] = (values[i] - _EPOCH) // _MS
+        out.append(values)
+    return out
+
+
+def columnar_payload(columns, rows, **extra):
+    """
+    Build a columnar response body.
+
+    columns is a list of (name, sql_column) pairs matching the selected
+    columns, in order - the names the row format would have used as keys.
+    """
+    time_indexes = [
+        i for i, (_, column) in enumerate(columns)
+        if isinstance(column.type, DateTime)
+    ]
+    return {
+        **extra,
+        'format': 'columnar',
+        'columns': [name for name, _ in columns],
+        'rows': columnar_rows(rows, time_indexes)
+    }
@@ -0,0 +1,155 @@
+"""
+Response Compression
+Negotiated gzip / brotli for JSON and text responses (drivers are on
+metered mobile links). Installed as an after_request hook:
+
+  • the client's Accept-Encoding picks the coding (brotli preferred when
+    the optional `brotli` package is installed)
+  • bodies under COMPRESS_MIN_SIZE bytes, and COMPRESS_EXCLUDE_PATHS
+    (tiny polling endpoints such as /api/voice/status), are sent as-is
+  • streamed responses are compressed as they are generated, flushed to
+    the client every COMPRESS_STREAM_FLUSH_BYTES of input
+  • Server-Sent Events are never compressed
+
+Compressed responses get a weak ETag (the bytes differ from the
+identity encoding) and Vary: Accept-Encoding.
+
+Configuration:
+    COMPRESS_MIN_SIZE=1024
+    COMPRESS_LEVEL=6             gzip level 1-9
+    COMPRESS_BROTLI_QUALITY=4    brotli quality 0-11
+    COMPRESS_STREAM_FLUSH_BYTES=16384
+    COMPRESS_EXCLUDE_PATHS=/api/voice/status
+"""
+
+import gzip
+import os
+import threading
+import time
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+STREAM_FLUSH_BYTES = int(os.getenv('COMPRESS_STREAM_FLUSH_BYTES', 16384))
+EXCLUDE_PATHS = {p.strip() for p in os.getenv('COMPRESS_EXCLUDE_PATHS', '/api/voice/status').split(',') if p.strip()}
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/html',
+                      'text/plain', 'text/css', 'text/csv')
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+# endpoint -> counters, for /api/metrics (per process)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(endpoint, bytes_in, bytes_out, seconds):
+    with _stats_lock:
+        entry = _stats.setdefault(endpoint, {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_ms': 0.0})
+        entry['responses'] += 1
+        entry['bytes_in'] += bytes_in
+        entry['bytes_out'] += bytes_out
+        entry['cpu_ms'] += seconds * 1000
+
+
+def compression_stats():
+    """Per-endpoint bytes before/after compression and time spent compressing"""
+    with _stats_lock:
+        return {
+            endpoint: {**entry, 'cpu_ms': round(entry['cpu_ms'], 2),
+                       'ratio': round(entry['bytes_out'] / entry['bytes_in'], 3) if entry['bytes_in'] else None}
+            for endpoint, entry in _stats.items()
+        }
+
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _stream_compressor(encoding):
+    """(compress(chunk), flush(), finish()) for a streamed body"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compress_stream(chunks, encoding, endpoint):
+    """
+    Compress a streamed body, flushing whenever STREAM_FLUSH_BYTES of input
+    have gone in - flushing every small chunk would ruin the ratio, never
+    flushing would hold the whole stream back.
+    """
+    compress, flush, finish = _stream_compressor(encoding)
+    bytes_in = bytes_out = unflushed = 0
+    seconds = 0.0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if not chunk:
+            continue
+        start = time.perf_counter()
+        out = compress(chunk)
+        unflushed += len(chunk)
+        if unflushed >= STREAM_FLUSH_BYTES:
+            out += flush()
+            unflushed = 0
+        seconds += time.perf_counter() - start
+        bytes_in += len(chunk)
+        bytes_out += len(out)
+        if out:
+            yield out
+    tail = finish()
+    _record(endpoint, bytes_in, bytes_out + len(tail), seconds)
+    yield tail
+
+
+def _should_skip(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return True
+    if 'Content-Encoding' in response.headers or request.method == 'HEAD':
+        return True
+    if request.path in EXCLUDE_PATHS:
+        return True
+    return response.mimetype not in COMPRESSIBLE_TYPES
+
+
+def init_compression(app):
+    """Install the compression after_request hook on app"""
+
+    @app.after_request
+    def _compress(response):
+        if _should_skip(response):
+            return response
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is None:
+            return response
+
+        endpoint = request.endpoint or request.path
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, endpoint)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < MIN_SIZE:
+                return response
+            start = time.perf_counter()
+            compressed = compress_body(data, encoding)
+            _record(endpoint, len(data), len(compressed), time.perf_counter() - start)
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
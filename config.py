@@ -79,3 +79,13 @@ CONTENT_SELECTORS = [
 # Output configuration
 OUTPUT_DIR = "scraped_data"
 AGGREGATED_OUTPUT = "road_accident_data_aggregated.json"
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", ".http_cache")  # Fetched pages + ETag/Last-Modified (http_cache.py)
+
+# Concurrent scraping (scraper.RoadAccidentScraper.scrape_all)
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", 8))              # Sources in flight at once
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 2))            # Gemini calls in flight at once
+HOST_MIN_INTERVAL = float(os.getenv("HOST_MIN_INTERVAL", 2.0))    # Seconds between requests to the same host
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", 30))
+MAX_RETRIES = int(os.getenv("SCRAPE_MAX_RETRIES", 3))             # Retries after the first attempt
+RETRY_BACKOFF = float(os.getenv("SCRAPE_RETRY_BACKOFF", 1.0))     # Base seconds; doubles per retry, full jitter
+RETRY_BACKOFF_MAX = float(os.getenv("SCRAPE_RETRY_BACKOFF_MAX", 30.0))
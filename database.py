@@ -4,12 +4,18 @@ Kenya Road Safety - Database Configuration
 Manages all SQLAlchemy models and database operations
 """
 
+import os
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import case, cast, event, func
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError
+from password_hashing import hash_password, verify_password
 from datetime import datetime
+from db_routing import RoutingSession
 
-# Initialize SQLAlchemy
-db = SQLAlchemy()
+# Initialize SQLAlchemy (SELECTs in @replica_reads handlers go to read replicas)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # ============================================================================
 # DATABASE MODELS
@@ -36,12 +42,12 @@ class Driver(db.Model):
     health_records = db.relationship('HealthRecord', backref='driver', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set password (on the hashing executor; may raise HashingBusy)"""
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        """Verify password"""
-        return check_password_hash(self.password_hash, password)
+        """Verify password (on the hashing executor; may raise HashingBusy)"""
+        return verify_password(self.password_hash, password)
     
     def to_dict(self):
         """Convert to dictionary"""
@@ -112,6 +118,8 @@ class HealthRecord(db.Model):
     tiredness_level = db.Column(db.Integer)
     recommendation = db.Column(db.String(500))
     alert_sent = db.Column(db.Boolean, default=False)
+    latitude = db.Column(db.Float)   # Where the assessment was taken, when the client sent it
+    longitude = db.Column(db.Float)
     
     def to_dict(self):
         """Convert to dictionary"""
@@ -128,16 +136,366 @@ class HealthRecord(db.Model):
             'sleep_hours': self.sleep_hours,
             'tiredness_level': self.tiredness_level,
             'recommendation': self.recommendation,
-            'alert_sent': self.alert_sent
+            'alert_sent': self.alert_sent,
+            'latitude': self.latitude,
+            'longitude': self.longitude
         }
 
 
+class HealthRecordSummary(db.Model):
+    """Downsampled drowsiness readings for one driver over a minute or an hour"""
+    __table_args__ = (
+        db.UniqueConstraint('driver_id', 'resolution', 'bucket_start', name='uq_health_summary_bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    resolution = db.Column(db.String(10), nullable=False)  # minute, hour
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    samples = db.Column(db.Integer, default=0)
+    fatigue_min = db.Column(db.Integer)
+    fatigue_max = db.Column(db.Integer)
+    fatigue_sum = db.Column(db.Float, default=0)
+    alert_count = db.Column(db.Integer, default=0)
+    yawn_count = db.Column(db.Integer, default=0)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'bucket_start': self.bucket_start.isoformat(),
+            'resolution': self.resolution,
+            'samples': self.samples,
+            'fatigue_min': self.fatigue_min,
+            'fatigue_max': self.fatigue_max,
+            'fatigue_mean': round(self.fatigue_sum / self.samples, 1) if self.samples else None,
+            'alert_count': self.alert_count,
+            'yawn_count': self.yawn_count
+        }
+
+
+class RetentionWatermark(db.Model):
+    """Highest row id a retention tier has already folded into summaries"""
+    tier = db.Column(db.String(20), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ============================================================================
+# INDEXES - designed from the queries app.py actually issues
+# ============================================================================
+
+# Per-driver history, statistics and rollup backfill: WHERE driver_id = ? ORDER BY timestamp DESC
+db.Index('ix_health_record_driver_timestamp', HealthRecord.driver_id, HealthRecord.timestamp)
+
+# Admin alert feed: WHERE alert_sent AND timestamp >= ? ORDER BY timestamp DESC.
+# Partial, so the index only holds the small fraction of rows that raised an alert.
+db.Index(
+    'ix_health_record_alerts_timestamp', HealthRecord.timestamp,
+    sqlite_where=HealthRecord.alert_sent == True,
+    postgresql_where=HealthRecord.alert_sent == True
+)
+
+# Session history: WHERE driver_id = ? ORDER BY start_time DESC
+db.Index('ix_driving_session_driver_start', DrivingSession.driver_id, DrivingSession.start_time)
+
+# voice_command / voice_emergency / voice_status: WHERE driver_id = ? AND end_time IS NULL.
+# Partial, so it stays tiny no matter how many finished sessions pile up.
+db.Index(
+    'ix_driving_session_open', DrivingSession.driver_id,
+    sqlite_where=DrivingSession.end_time.is_(None),
+    postgresql_where=DrivingSession.end_time.is_(None)
+)
+
+
+class DailyMetrics(db.Model):
+    """Per-driver, per-day rollup kept as exact running sums and counts"""
+    __table_args__ = (
+        db.UniqueConstraint('driver_id', 'date', name='uq_daily_metrics_driver_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    total_driving_hours = db.Column(db.Float, default=0)
+    total_distance = db.Column(db.Float, default=0)
+    sessions_count = db.Column(db.Integer, default=0)
+    average_fatigue = db.Column(db.Integer, default=0)  # Derived: fatigue_sum / fatigue_samples
+    max_fatigue = db.Column(db.Integer, default=0)
+    fatigue_sum = db.Column(db.Float, default=0)
+    fatigue_samples = db.Column(db.Integer, default=0)
+    health_records_count = db.Column(db.Integer, default=0)
+    total_alerts = db.Column(db.Integer, default=0)
+    total_breaks = db.Column(db.Integer, default=0)
+    # Columns below are maintained by driver_health_api.py, which shares this table
+    total_break_duration = db.Column(db.Float, default=0)
+    incidents = db.Column(db.Integer, default=0)
+    overall_health_score = db.Column(db.Integer, default=0)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'date': self.date.isoformat(),
+            'total_driving_hours': round(self.total_driving_hours or 0, 2),
+            'total_distance': round(self.total_distance or 0, 2),
+            'sessions_count': self.sessions_count or 0,
+            'average_fatigue': round(self.fatigue_sum / self.fatigue_samples, 1) if self.fatigue_samples else 0,
+            'max_fatigue': self.max_fatigue or 0,
+            'assessments': self.fatigue_samples or 0,
+            'health_records_count': self.health_records_count or 0,
+            'total_alerts': self.total_alerts or 0,
+            'total_breaks': self.total_breaks or 0
+        }
+
+
+class FatigueHeatCell(db.Model):
+    """Drowsiness assessments binned by geohash cell, local day and hour of day (see heatmap.py)"""
+    __table_args__ = (
+        # Level, then cell: bounding-box queries are geohash prefix ranges within one level
+        db.UniqueConstraint('level', 'cell', 'day', 'hour', name='uq_fatigue_heat_cell'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    level = db.Column(db.SmallInteger, nullable=False)  # Geohash precision = len(cell)
+    cell = db.Column(db.String(12), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    hour = db.Column(db.SmallInteger, nullable=False)  # 0-23
+    assessments = db.Column(db.Integer, default=0)
+    fatigue_sum = db.Column(db.Float, default=0)
+    alerts = db.Column(db.Integer, default=0)
+
+
+# ============================================================================
+# DAILY METRICS ROLLUP
+# ============================================================================
+
+def _increment_daily_metrics(driver_id, day, fatigue=None, **deltas):
+    """
+    Apply additive deltas to one (driver, day) rollup row inside the current transaction.
+
+    Every column is updated with a SQL expression (col = col + delta) so that
+    concurrent workers never lose each other's increments. The row is created
+    on first use; a racing insert from another worker is caught and retried as
+    an update.
+    """
+    table = DailyMetrics.__table__
+    values = {name: table.c[name] + delta for name, delta in deltas.items() if delta}
+    if fatigue is not None:
+        fatigue = int(fatigue)
+        new_sum = table.c.fatigue_sum + fatigue
+        new_samples = table.c.fatigue_samples + 1
+        values['fatigue_sum'] = new_sum
+        values['fatigue_samples'] = new_samples
+        values['average_fatigue'] = cast(new_sum / new_samples, db.Integer)
+        values['max_fatigue'] = case(
+            (table.c.max_fatigue < fatigue, fatigue),
+            else_=table.c.max_fatigue
+        )
+    if not values:
+        return
+
+    # Core statement: skips the ORM bulk-update machinery, which costs more
+    # than the UPDATE itself on the hot assessment path
+    update = table.update().where(table.c.driver_id == driver_id, table.c.date == day).values(values)
+    if db.session.execute(update).rowcount:
+        return
+
+    metrics = DailyMetrics(
+        driver_id=driver_id,
+        date=day,
+        total_driving_hours=deltas.get('total_driving_hours', 0),
+        total_distance=deltas.get('total_distance', 0),
+        sessions_count=deltas.get('sessions_count', 0),
+        health_records_count=deltas.get('health_records_count', 0),
+        total_alerts=deltas.get('total_alerts', 0),
+        total_breaks=deltas.get('total_breaks', 0),
+        fatigue_sum=fatigue or 0,
+        fatigue_samples=1 if fatigue is not None else 0,
+        average_fatigue=fatigue or 0,
+        max_fatigue=fatigue or 0
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(metrics)
+    except IntegrityError:
+        # Another worker created the row first - fall back to the update path
+        db.session.execute(update)
+
+
+def record_assessment_metrics(record):
+    """Roll a new HealthRecord into its driver's daily metrics"""
+    timestamp = record.timestamp or datetime.utcnow()
+    is_assessment = record.assessment_type == 'drowsiness' and record.fatigue_level is not None
+    _increment_daily_metrics(
+        record.driver_id,
+        timestamp.date(),
+        fatigue=record.fatigue_level if is_assessment else None,
+        health_records_count=1,
+        total_alerts=1 if record.alert_sent else 0
+    )
+
+
+def record_session_metrics(session):
+    """Roll a finished DrivingSession into its driver's daily metrics"""
+    end_time = session.end_time or datetime.utcnow()
+    _increment_daily_metrics(
+        session.driver_id,
+        end_time.date(),
+        sessions_count=1,
+        total_driving_hours=session.duration_hours or 0,
+        total_distance=session.distance_km or 0,
+        total_breaks=session.breaks_taken or 0
+    )
+
+
+def get_daily_metrics(driver_id, start_date, end_date=None):
+    """Return the rollup rows for a driver between two dates (inclusive), oldest first"""
+    query = DailyMetrics.query.filter(
+        DailyMetrics.driver_id == driver_id,
+        DailyMetrics.date >= start_date
+    )
+    if end_date is not None:
+        query = query.filter(DailyMetrics.date <= end_date)
+    return query.order_by(DailyMetrics.date).all()
+
+
+def summarize_daily_metrics(metrics):
+    """Combine several daily rollup rows into one summary with an exact fatigue mean"""
+    fatigue_sum = sum(m.fatigue_sum or 0 for m in metrics)
+    fatigue_samples = sum(m.fatigue_samples or 0 for m in metrics)
+    return {
+        'driving_hours': round(sum(m.total_driving_hours or 0 for m in metrics), 2),
+        'distance_km': round(sum(m.total_distance or 0 for m in metrics), 2),
+        'sessions': sum(m.sessions_count or 0 for m in metrics),
+        'alerts': sum(m.total_alerts or 0 for m in metrics),
+        'breaks': sum(m.total_breaks or 0 for m in metrics),
+        'average_fatigue': round(fatigue_sum / fatigue_samples, 1) if fatigue_samples else 0,
+        'max_fatigue': max((m.max_fatigue or 0 for m in metrics), default=0),
+        'days_active': len(metrics)
+    }
+
+
+def total_daily_metrics(driver_id):
+    """A driver's all-time totals, summed over the rollup in SQL (raw rows may be downsampled away)"""
+    totals = db.session.query(
+        func.coalesce(func.sum(DailyMetrics.total_driving_hours), 0),
+        func.coalesce(func.sum(DailyMetrics.sessions_count), 0),
+        func.coalesce(func.sum(DailyMetrics.total_alerts), 0),
+        func.coalesce(func.sum(DailyMetrics.health_records_count), 0),
+        func.coalesce(func.sum(DailyMetrics.fatigue_sum), 0),
+        func.coalesce(func.sum(DailyMetrics.fatigue_samples), 0)
+    ).filter(DailyMetrics.driver_id == driver_id).one()
+    driving_hours, sessions, alerts, health_records, fatigue_sum, fatigue_samples = totals
+    return {
+        'driving_hours': round(driving_hours, 2),
+        'sessions': sessions,
+        'alerts': alerts,
+        'health_records': health_records,
+        'average_fatigue': round(fatigue_sum / fatigue_samples, 1) if fatigue_samples else 0
+    }
+
+
+def rebuild_daily_metrics(driver_id=None):
+    """
+    Recompute the rollup from raw sessions and health records.
+
+    Used once to backfill databases that predate the rollup, or to repair it.
+    """
+    query = DailyMetrics.query
+    if driver_id is not None:
+        query = query.filter_by(driver_id=driver_id)
+    query.delete(synchronize_session=False)
+
+    sessions = DrivingSession.query.filter(DrivingSession.end_time.isnot(None))
+    records = HealthRecord.query
+    if driver_id is not None:
+        sessions = sessions.filter_by(driver_id=driver_id)
+        records = records.filter_by(driver_id=driver_id)
+
+    for session in sessions.yield_per(1000):
+        record_session_metrics(session)
+    for record in records.yield_per(1000):
+        record_assessment_metrics(record)
+    db.session.commit()
+
+
+# ============================================================================
+# ENGINE CONFIGURATION - connection pragmas and pool sizing per backend
+# ============================================================================
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer; synchronous=NORMAL is durable across app crashes under WAL
+# and only fsyncs at checkpoints; busy_timeout makes a blocked writer wait
+# for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 10000)),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', 32768)),  # Negative = KiB, per connection
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 268435456)),     # 256 MiB of memory-mapped reads
+    'temp_store': 'MEMORY',
+}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Engine 'connect' hook - tune each raw SQLite connection once"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+def engine_options(database_uri):
+    """
+    SQLAlchemy create_engine() options suited to the backend in database_uri.
+
+    SQLite: a small pool per worker - only one connection can write at a
+    time anyway, and the driver-level timeout matches busy_timeout.
+    PostgreSQL: a larger pool with pre-ping and recycling so connections
+    dropped by the server or a proxy are replaced transparently.
+    """
+    url = make_url(database_uri)
+
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}
+        return {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 5)),
+            'pool_timeout': 30,
+            'connect_args': {
+                'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+                'check_same_thread': False
+            }
+        }
+
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800
+    }
+
+
+def configure_engine(app):
+    """Set engine options on app and install the SQLite pragma hook. Call before db.init_app(app)."""
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    if not event.contains(Engine, 'connect', _set_sqlite_pragmas):
+        event.listen(Engine, 'connect', _set_sqlite_pragmas)
+
+
 # ============================================================================
 # DATABASE INITIALIZATION
 # ============================================================================
 
 def init_db(app):
     """Initialize database with Flask app context"""
+    from migrations import run_migrations
+    
     with app.app_context():
         db.create_all()
+        run_migrations(db.engine)
         print("✅ Database initialized")
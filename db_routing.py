@@ -0,0 +1,224 @@
+"""
+🔀 READ/WRITE DATABASE ROUTING
+Kenya Road Safety - Replica-aware sessions
+
+GET handlers decorated with @replica_reads run their SELECTs against a
+read replica; everything else (flushes, UPDATE/INSERT/DELETE, handlers
+without the decorator) keeps using the primary.
+
+Staleness policy - read-your-writes per driver: after a driver's data is
+committed, that driver's reads stay on the primary for
+READ_YOUR_WRITES_SECONDS so they never see a replica that has not caught
+up yet. Other drivers and the admin feeds keep reading from replicas.
+The write mark is the driver's bump time in driver_versions' shared
+memory-mapped file, so every web worker, the ASGI app and the writer
+process on the host see it, whichever of them handled the write. Drivers
+sharing a slot only read from the primary a little more often. Marks are
+per host: with several app hosts, keep each driver on one host.
+
+Configuration:
+    DATABASE_REPLICA_URLS=postgresql://replica1/...,postgresql://replica2/...
+    READ_YOUR_WRITES_SECONDS=5
+
+Without replica URLs every read goes to the primary, as before.
+
+Local check with two SQLite files:
+    python db_routing.py
+"""
+
+import itertools
+import os
+import time
+from functools import wraps
+from flask import g, current_app, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+
+# Callbacks run with a driver id after that driver's changes commit
+_write_listeners = []
+
+
+# ============================================================================
+# READ-YOUR-WRITES TRACKING
+# ============================================================================
+
+def on_driver_write(fn):
+    """Register fn(driver_id) to run whenever a driver's changes are committed"""
+    _write_listeners.append(fn)
+    return fn
+
+
+def note_write(driver_id):
+    """Bump driver_id's shared version, pinning its reads to the primary in every worker"""
+    if driver_id is None:
+        return
+    from driver_versions import get_versions  # driver_versions imports this module
+    get_versions().bump(driver_id)
+    for listener in _write_listeners:
+        listener(driver_id)
+
+
+def wrote_recently(driver_id):
+    """True while driver_id is inside its read-your-writes window (as seen by any worker)"""
+    if driver_id is None:
+        return False
+    from driver_versions import get_versions
+    _, bumped_at = get_versions().get(driver_id)
+    return time.time() - bumped_at < READ_YOUR_WRITES_SECONDS
+
+
+def _written_driver_ids(session):
+    """Driver ids touched by the objects in a flush (works for both apps' models)"""
+    ids = set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        ids.add(obj.id if getattr(obj, '__tablename__', None) == 'driver' else getattr(obj, 'driver_id', None))
+    ids.discard(None)
+    return ids
+
+
+# ============================================================================
+# SESSION
+# ============================================================================
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that sends SELECTs to the request's replica.
+
+    Pass as db = SQLAlchemy(session_options={'class_': RoutingSession}).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('db_read_engine')
+            if replica is not None and getattr(clause, 'is_select', False):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_writes(session, flush_context):
+    session.info.setdefault('written_drivers', set()).update(_written_driver_ids(session))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _mark_writes(session):
+    if session.get_nested_transaction() is not None:
+        return  # A SAVEPOINT was released; the outer transaction is still open
+    for driver_id in session.info.pop('written_drivers', ()):
+        note_write(driver_id)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_writes(session):
+    # Also fired when a SAVEPOINT rolls back; only the outer rollback discards the marks
+    if session.get_nested_transaction() is None:
+        session.info.pop('written_drivers', None)
+
+
+# ============================================================================
+# REPLICAS
+# ============================================================================
+
+class ReplicaSet:
+    """Read-only engines for one app, handed out round-robin"""
+
+    def __init__(self, urls):
+        from database import engine_options
+        self.engines = [create_engine(url, **engine_options(url)) for url in urls]
+        self._next = itertools.cycle(self.engines)
+
+    def pick(self):
+        return next(self._next)
+
+
+def configure_replicas(app, urls=None):
+    """
+    Create replica engines for app from urls or DATABASE_REPLICA_URLS.
+
+    Call after configure_engine(app) so the SQLite pragma hook applies to
+    replica connections too.
+    """
+    if urls is None:
+        urls = [u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    urls = [u.replace('postgres://', 'postgresql://', 1) for u in urls]
+    app.extensions['db_replicas'] = ReplicaSet(urls) if urls else None
+    if urls:
+        print(f"✅ Read replicas configured: {len(urls)}")
+
+
+def replica_reads(f):
+    """
+    Route the handler's SELECTs to a replica.
+
+    Place under @token_required so the driver id is the first argument;
+    that driver reads from the primary while inside its write window.
+    Handlers without a driver id (admin feeds) always use a replica.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        replicas = current_app.extensions.get('db_replicas')
+        driver_id = args[0] if args else None
+        if replicas is not None and not wrote_recently(driver_id):
+            g.db_read_engine = replicas.pick()
+        return f(*args, **kwargs)
+    return decorated
+
+
+# ============================================================================
+# LOCAL CHECK - two SQLite files
+# ============================================================================
+
+if __name__ == '__main__':
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    from flask import Flask
+    from database import db, configure_engine, Driver
+    # Use the imported module, not __main__, so write marks are shared with the session events
+    import db_routing as routing
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DRIVER_VERSION_FILE'] = os.path.join(tmp, 'versions.bin')  # Inherited by the other "worker" below
+    primary, replica = os.path.join(tmp, 'primary.db'), os.path.join(tmp, 'replica.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{primary}'
+    configure_engine(app)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Driver(username='replica-check', email='rc@example.com', password_hash='x', fatigue_level=10))
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+    # The "replica" is a snapshot taken now; later primary writes never reach it
+    shutil.copy(primary, replica)
+    routing.configure_replicas(app, [f'sqlite:///{replica}'])
+
+    @routing.replica_reads
+    def read_fatigue(driver_id):
+        return db.session.get(Driver, driver_id).fatigue_level
+
+    with app.app_context():
+        driver = Driver.query.filter_by(username='replica-check').first()
+        driver.fatigue_level = 80
+        db.session.commit()
+        driver_id = driver.id
+
+    with app.app_context():
+        print(f"   inside write window  -> {read_fatigue(driver_id)} (primary, expected 80)")
+
+    other_worker = subprocess.run(
+        [sys.executable, '-c', f'import db_routing; print(db_routing.wrote_recently({driver_id}))'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout.strip()
+    print(f"   another process      -> wrote_recently = {other_worker} (expected True)")
+
+    routing.READ_YOUR_WRITES_SECONDS = 0
+    with app.app_context():
+        print(f"   after write window   -> {read_fatigue(driver_id)} (replica, expected 10)")
@@ -0,0 +1,147 @@
+"""
+🗄️ SINGLE-WRITER DATABASE PROCESS
+Kenya Road Safety - SQLite depot deployments
+
+SQLite allows one writer at a time, so N gunicorn workers committing on
+their own only queue up on the database lock. This process owns all
+writes instead: workers send named write operations (see write_ops.py)
+over a local Unix socket, the writer groups whatever has arrived into
+one transaction, commits once and acknowledges every operation.
+Reads stay direct in each worker.
+
+Each operation runs inside its own SAVEPOINT, so one failing operation
+is reported back to its caller without aborting the rest of the batch.
+
+Run alongside the web workers:
+    DB_WRITER_SOCKET=/tmp/krs-writer.sock python db_writer.py
+    DB_WRITER_SOCKET=/tmp/krs-writer.sock gunicorn app:app --workers 4
+"""
+
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Listener
+from database import db
+from write_ops import WRITE_OPS, apply_write
+
+BATCH_MAX = int(os.getenv('DB_WRITER_BATCH_MAX', 500))
+# 0 = group commit: each batch is simply everything that queued up while the
+# previous one was committing, so light load adds no latency
+BATCH_WINDOW = float(os.getenv('DB_WRITER_BATCH_WINDOW_MS', 0)) / 1000
+
+
+class DatabaseWriter:
+    """Accepts write intents from many workers and applies them in grouped transactions"""
+
+    def __init__(self, app, address, authkey):
+        self.app = app
+        self.address = address
+        self.authkey = authkey
+        self.intents = queue.Queue()
+        self.stats = {'batches': 0, 'operations': 0, 'failed': 0}
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    def _serve_connection(self, conn):
+        """Read intents from one worker connection until it closes"""
+        send_lock = threading.Lock()
+        try:
+            while True:
+                request_id, op, payload = conn.recv()
+                self.intents.put((conn, send_lock, request_id, op, payload))
+        except (EOFError, OSError):
+            conn.close()
+
+    def _accept_loop(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Bad authkey or a client that hung up mid-handshake
+                print(f"⚠️  Rejected writer connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # Batching
+    # ------------------------------------------------------------------
+
+    def _next_batch(self):
+        """Block for one intent, then gather whatever else arrives within BATCH_WINDOW"""
+        batch = [self.intents.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.intents.get(timeout=remaining) if remaining > 0 else self.intents.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply_batch(self, batch):
+        """Run every intent in one transaction; returns [(ok, result_or_error), ...]"""
+        outcomes = []
+        for _, _, _, op, payload in batch:
+            if op not in WRITE_OPS:
+                outcomes.append((False, f"Unknown write operation '{op}'"))
+                continue
+            try:
+                with db.session.begin_nested():
+                    outcomes.append((True, apply_write(op, payload)))
+            except Exception as e:
+                outcomes.append((False, f'{type(e).__name__}: {e}'))
+
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            outcomes = [(False, f'Batch commit failed: {e}')] * len(batch)
+        finally:
+            db.session.expunge_all()
+        return outcomes
+
+    @staticmethod
+    def _acknowledge(batch, outcomes):
+        for (conn, send_lock, request_id, _, _), (ok, result) in zip(batch, outcomes):
+            try:
+                with send_lock:
+                    conn.send((request_id, ok, result))
+            except (OSError, EOFError):
+                pass  # Worker went away; its reader thread cleans up
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        threading.Thread(target=self._accept_loop, args=(listener,), daemon=True).start()
+        print(f"✅ DB writer listening on {self.address} (batch ≤ {BATCH_MAX}, window {BATCH_WINDOW * 1000:.0f} ms)")
+
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                outcomes = self._apply_batch(batch)
+                self._acknowledge(batch, outcomes)
+                self.stats['batches'] += 1
+                self.stats['operations'] += len(batch)
+                self.stats['failed'] += sum(1 for ok, _ in outcomes if not ok)
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == '__main__':
+    address = os.getenv('DB_WRITER_SOCKET')
+    if not address:
+        raise SystemExit("Set DB_WRITER_SOCKET to the Unix socket path the web workers use")
+
+    from app import app
+
+    writer = DatabaseWriter(app, address, app.config['SECRET_KEY'].encode())
+    try:
+        writer.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n🛑 DB writer stopped - {writer.stats}")
@@ -10,19 +10,26 @@ Features:
   • Smart recommendations
 """
 
-from flask import Flask, request, jsonify, session
+from flask import Flask, Response, request, jsonify, session, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, cast, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
 import os
 import math
 import base64
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 import jwt
 from predict_risk import AccidentPredictor
 import sqlite3
+from db_routing import RoutingSession, configure_replicas, replica_reads
+from columnar import wants_columnar, columnar_payload
+from compression import init_compression
+from fleet_monitor import init_fleet_monitor
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -34,8 +41,10 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///drivers.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-key-2024'
 
-# Initialize database
-db = SQLAlchemy(app)
+# Initialize database (GET routes can read from replicas, see db_routing.py)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+configure_replicas(app)
+init_compression(app)
 
 # Initialize predictor
 predictor = AccidentPredictor()
@@ -108,16 +117,30 @@ class HealthRecord(db.Model):
     alert_sent = db.Column(db.Boolean, default=False)
     driver_response = db.Column(db.String(100))  # acknowledged, dismissed, took_break
 
+# Admin alert feed: WHERE alert_sent AND timestamp BETWEEN ? AND ? ORDER BY timestamp DESC
+db.Index(
+    'ix_health_record_alerts_timestamp', HealthRecord.timestamp,
+    sqlite_where=HealthRecord.alert_sent == True,
+    postgresql_where=HealthRecord.alert_sent == True
+)
+
 class DailyMetrics(db.Model):
     """Daily driver metrics summary"""
+    __table_args__ = (
+        db.UniqueConstraint('driver_id', 'date', name='uq_daily_metrics_driver_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     total_driving_hours = db.Column(db.Float, default=0)
     total_distance = db.Column(db.Float, default=0)
     sessions_count = db.Column(db.Integer, default=0)
-    average_fatigue = db.Column(db.Integer, default=0)
+    average_fatigue = db.Column(db.Integer, default=0)  # fatigue_sum / fatigue_samples
     max_fatigue = db.Column(db.Integer, default=0)
+    fatigue_sum = db.Column(db.Float, default=0)  # Exact running sum of assessment scores
+    fatigue_samples = db.Column(db.Integer, default=0)
+    health_records_count = db.Column(db.Integer, default=0)
     total_alerts = db.Column(db.Integer, default=0)
     total_breaks = db.Column(db.Integer, default=0)
     total_break_duration = db.Column(db.Float, default=0)
@@ -289,6 +312,7 @@ def drowsiness_assessment(driver_id):
         )
         
         db.session.add(health_record)
+        record_daily_assessment(driver_id, fatigue_score, health_record.alert_sent)
         
         # Update driver fatigue level
         driver = Driver.query.get(driver_id)
@@ -452,6 +476,9 @@ def end_session(driver_id, session_id):
         session = DrivingSession.query.get(session_id)
         if not session or session.driver_id != driver_id:
             return jsonify({"error": "Session not found"}), 404
+        if session.end_time is not None:
+            # Ending it again would count its hours and distance twice
+            return jsonify({"error": "Session already ended"}), 409
         
         # Calculate session duration
         session.end_time = datetime.utcnow()
@@ -486,20 +513,74 @@ def end_session(driver_id, session_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def update_daily_metrics(driver_id, session):
-    """Update daily metrics for driver"""
+def increment_today_metrics(driver_id, fatigue=None, **deltas):
+    """
+    Add deltas to today's metrics row for driver inside the current transaction.
+
+    Columns are updated with SQL expressions (col = col + delta), as
+    database.py's rollup does, so concurrent requests never overwrite each
+    other's increments. The row is created on first use; a racing insert is
+    caught and retried as an update.
+    """
     today = datetime.utcnow().date()
-    metrics = DailyMetrics.query.filter_by(driver_id=driver_id, date=today).first()
+    table = DailyMetrics.__table__
+    values = {name: func.coalesce(table.c[name], 0) + delta for name, delta in deltas.items() if delta}
+    if fatigue is not None:
+        fatigue = int(fatigue)
+        new_sum = func.coalesce(table.c.fatigue_sum, 0) + fatigue
+        new_samples = func.coalesce(table.c.fatigue_samples, 0) + 1
+        values['fatigue_sum'] = new_sum
+        values['fatigue_samples'] = new_samples
+        values['average_fatigue'] = cast(new_sum / new_samples, db.Integer)
+        values['max_fatigue'] = case(
+            (func.coalesce(table.c.max_fatigue, 0) < fatigue, fatigue),
+            else_=func.coalesce(table.c.max_fatigue, 0)
+        )
+    if not values:
+        return
     
-    if not metrics:
-        metrics = DailyMetrics(driver_id=driver_id, date=today)
-        db.session.add(metrics)
+    update = table.update().where(table.c.driver_id == driver_id, table.c.date == today).values(values)
+    if db.session.execute(update).rowcount:
+        return
     
-    metrics.total_driving_hours += session.duration_hours
-    metrics.total_distance += session.distance_km
-    metrics.sessions_count += 1
-    metrics.average_fatigue = (metrics.average_fatigue + session.average_fatigue) // 2
-    metrics.max_fatigue = max(metrics.max_fatigue, session.max_fatigue)
+    metrics = DailyMetrics(
+        driver_id=driver_id, date=today,
+        total_driving_hours=deltas.get('total_driving_hours', 0),
+        total_distance=deltas.get('total_distance', 0),
+        sessions_count=deltas.get('sessions_count', 0),
+        health_records_count=deltas.get('health_records_count', 0),
+        total_alerts=deltas.get('total_alerts', 0),
+        total_breaks=deltas.get('total_breaks', 0),
+        fatigue_sum=fatigue or 0,
+        fatigue_samples=1 if fatigue is not None else 0,
+        average_fatigue=fatigue or 0,
+        max_fatigue=fatigue or 0
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(metrics)
+    except IntegrityError:
+        # Another request created the row first - fall back to the update path
+        db.session.execute(update)
+
+def record_daily_assessment(driver_id, fatigue_score, alert_sent):
+    """Add one drowsiness assessment to today's running fatigue sum and alert count"""
+    increment_today_metrics(
+        driver_id,
+        fatigue=fatigue_score,
+        health_records_count=1,
+        total_alerts=1 if alert_sent else 0
+    )
+
+def update_daily_metrics(driver_id, session):
+    """Update daily metrics for driver"""
+    increment_today_metrics(
+        driver_id,
+        sessions_count=1,
+        total_driving_hours=session.duration_hours or 0,
+        total_distance=session.distance_km or 0,
+        total_breaks=session.breaks_taken or 0
+    )
 
 # ============================================================================
 # DRIVER PROFILE & HEALTH ROUTES
@@ -507,6 +588,7 @@ def update_daily_metrics(driver_id, session):
 
 @app.route('/api/driver/profile', methods=['GET'])
 @token_required
+@replica_reads
 def get_profile(driver_id):
     """Get driver profile"""
     try:
@@ -563,6 +645,7 @@ def get_profile(driver_id):
 
 @app.route('/api/driver/health-history', methods=['GET'])
 @token_required
+@replica_reads
 def get_health_history(driver_id):
     """Get driver health records history"""
     try:
@@ -590,6 +673,7 @@ def get_health_history(driver_id):
 
 @app.route('/api/driver/driving-sessions', methods=['GET'])
 @token_required
+@replica_reads
 def get_driving_sessions(driver_id):
     """Get driving sessions history"""
     try:
@@ -622,10 +706,23 @@ def get_driving_sessions(driver_id):
 # ADMIN & MONITORING ROUTES
 # ============================================================================
 
+# Live pushes for the control room instead of polling the two feeds below
+init_fleet_monitor(app, Driver)
+
 @app.route('/api/admin/active-drivers', methods=['GET'])
+@replica_reads
 def get_active_drivers():
-    """Get all currently active drivers (for admin dashboard)"""
+    """Get all currently active drivers (for admin dashboard; ?format=columnar supported)"""
     try:
+        if wants_columnar(request.args):
+            columns = [
+                ('id', Driver.id), ('username', Driver.username), ('full_name', Driver.full_name),
+                ('vehicle_type', Driver.vehicle_type), ('current_fatigue', Driver.fatigue_level),
+                ('health_status', Driver.health_status), ('status', Driver.status)
+            ]
+            rows = db.session.query(*(column for _, column in columns)).filter(Driver.status == 'on_trip').all()
+            return jsonify(columnar_payload(columns, rows, count=len(rows))), 200
+        
         active_drivers = Driver.query.filter_by(status='on_trip').all()
         
         return jsonify({
@@ -644,30 +741,150 @@ def get_active_drivers():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Alert severity by fatigue score, as in generate_recommendation: (min, max exclusive)
+ALERT_SEVERITY = {'critical': (80, None), 'warning': (60, 80)}
+
+# Rows fetched per round trip when streaming the alert feed
+ALERT_STREAM_BATCH = int(os.getenv('ALERT_STREAM_BATCH', 500))
+
+
+def _alert_severity(fatigue_level):
+    if fatigue_level is None:
+        return None
+    for name, (low, high) in ALERT_SEVERITY.items():
+        if fatigue_level >= low and (high is None or fatigue_level < high):
+            return name
+    return None
+
+
+def _alert_severity_column():
+    """_alert_severity as a SQL CASE, so the columnar feed derives it in the query"""
+    whens = []
+    for name, (low, high) in ALERT_SEVERITY.items():
+        bounds = [HealthRecord.fatigue_level >= low]
+        if high is not None:
+            bounds.append(HealthRecord.fatigue_level < high)
+        whens.append((db.and_(*bounds), name))
+    return case(*whens, else_=None)
+
+
+def _parse_time(value):
+    """ISO 8601 -> naive UTC datetime (how timestamps are stored)"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _alert_filters(args):
+    """
+    WHERE clauses for the alert feed from the query string:
+
+        since / until   ISO 8601 window (default: the last `hours`, 24)
+        severity        critical, warning (comma-separated)
+        fleet           vehicle type(s): Car, Truck, Bus (comma-separated)
+
+    Raises ValueError on a bad value.
+    """
+    until = _parse_time(args['until']) if args.get('until') else None
+    if args.get('since'):
+        since = _parse_time(args['since'])
+    else:
+        since = (until or datetime.utcnow()) - timedelta(hours=float(args.get('hours', 24)))
+
+    filters = [HealthRecord.alert_sent == True, HealthRecord.timestamp >= since]
+    if until is not None:
+        filters.append(HealthRecord.timestamp < until)
+
+    if args.get('severity'):
+        ranges = []
+        for name in args['severity'].lower().split(','):
+            if name not in ALERT_SEVERITY:
+                raise ValueError(f"Unknown severity '{name}' (use {', '.join(ALERT_SEVERITY)})")
+            low, high = ALERT_SEVERITY[name]
+            bounds = [HealthRecord.fatigue_level >= low]
+            if high is not None:
+                bounds.append(HealthRecord.fatigue_level < high)
+            ranges.append(db.and_(*bounds))
+        filters.append(db.or_(*ranges))
+
+    if args.get('fleet'):
+        filters.append(Driver.vehicle_type.in_([f.strip() for f in args['fleet'].split(',') if f.strip()]))
+    return filters
+
+
+def _alert_dict(alert):
+    return {
+        "id": alert.id,
+        "driver_id": alert.driver_id,
+        "driver_name": alert.driver.full_name,
+        "fleet": alert.driver.vehicle_type,
+        "timestamp": alert.timestamp.isoformat(),
+        "fatigue_level": alert.fatigue_level,
+        "severity": _alert_severity(alert.fatigue_level),
+        "recommendation": alert.recommendation,
+        "response": alert.driver_response
+    }
+
+
+def _wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+
 @app.route('/api/admin/health-alerts', methods=['GET'])
+@replica_reads
 def get_health_alerts():
-    """Get all recent health alerts"""
+    """
+    Recent health alerts, newest first, filtered by since/until/hours,
+    severity and fleet (see _alert_filters).
+
+    ?format=ndjson (or Accept: application/x-ndjson) streams one alert per
+    line from a server-side cursor, so exports of any size run in flat
+    memory; ?format=columnar is also supported.
+    """
     try:
-        # Get alerts from last 24 hours
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        alerts = HealthRecord.query.filter(
-            HealthRecord.timestamp >= yesterday,
-            HealthRecord.alert_sent == True
-        ).order_by(HealthRecord.timestamp.desc()).all()
-        
+        filters = _alert_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if wants_columnar(request.args):
+            columns = [
+                ('id', HealthRecord.id), ('driver_id', HealthRecord.driver_id), ('driver_name', Driver.full_name),
+                ('fleet', Driver.vehicle_type), ('timestamp', HealthRecord.timestamp),
+                ('fatigue_level', HealthRecord.fatigue_level), ('severity', _alert_severity_column()),
+                ('recommendation', HealthRecord.recommendation), ('response', HealthRecord.driver_response)
+            ]
+            rows = db.session.query(*(column for _, column in columns)).join(
+                Driver, Driver.id == HealthRecord.driver_id
+            ).filter(*filters).order_by(HealthRecord.timestamp.desc()).all()
+            return jsonify(columnar_payload(columns, rows, count=len(rows))), 200
+
+        # One query: the driver comes back on the same row as its alert
+        alerts = HealthRecord.query.join(HealthRecord.driver).options(
+            contains_eager(HealthRecord.driver).load_only(Driver.full_name, Driver.vehicle_type)
+        ).filter(*filters).order_by(HealthRecord.timestamp.desc())
+
+        if _wants_ndjson():
+            def generate():
+                try:
+                    for alert in alerts.yield_per(ALERT_STREAM_BATCH):
+                        yield json.dumps(_alert_dict(alert)) + '\n'
+                except Exception as e:
+                    # Headers are long gone - tell the client in-band
+                    print(f"❌ Alert stream failed: {e}")
+                    yield json.dumps({"error": str(e)}) + '\n'
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        alerts = alerts.all()
         return jsonify({
             "count": len(alerts),
-            "alerts": [{
-                "id": a.id,
-                "driver_id": a.driver_id,
-                "driver_name": a.driver.full_name,
-                "timestamp": a.timestamp.isoformat(),
-                "fatigue_level": a.fatigue_level,
-                "recommendation": a.recommendation,
-                "response": a.driver_response
-            } for a in alerts]
+            "alerts": [_alert_dict(a) for a in alerts]
         }), 200
-    
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -717,6 +934,7 @@ def track_driving_location(driver_id):
 
 @app.route('/api/driver/statistics', methods=['GET'])
 @token_required
+@replica_reads
 def get_statistics(driver_id):
     """Get driver statistics and analytics"""
     try:
@@ -733,7 +951,8 @@ def get_statistics(driver_id):
         total_hours_week = sum(m.total_driving_hours for m in week_metrics)
         total_distance_week = sum(m.total_distance for m in week_metrics)
         total_alerts_week = sum(m.total_alerts for m in week_metrics)
-        avg_fatigue_week = sum(m.average_fatigue for m in week_metrics) / len(week_metrics) if week_metrics else 0
+        fatigue_samples_week = sum(m.fatigue_samples or 0 for m in week_metrics)
+        avg_fatigue_week = sum(m.fatigue_sum or 0 for m in week_metrics) / fatigue_samples_week if fatigue_samples_week else 0
         
         # Get all health records for trend analysis
         health_records = HealthRecord.query.filter_by(driver_id=driver_id).order_by(
@@ -823,7 +1042,8 @@ def index():
             },
             "admin": {
                 "/api/admin/active-drivers": "GET - Get active drivers",
-                "/api/admin/health-alerts": "GET - Get health alerts"
+                "/api/admin/health-alerts": "GET - Get health alerts (?since, until, hours, severity, fleet, format=ndjson)",
+                "/api/admin/fleet/stream": "GET - Live driver status, fatigue and alert events (SSE, X-Admin-Key)"
             }
         }
     })
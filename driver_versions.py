@@ -0,0 +1,139 @@
+"""
+Per-Driver Versions & Conditional GET
+Every committed write to a driver's data replaces that driver's version
+token, so profile/statistics responses can carry an ETag and a repeat
+request with If-None-Match is answered 304 before any query runs.
+
+Versions live in a small memory-mapped file shared by all web workers
+(and the writer process) on the host:
+
+    header  16 random bytes - the epoch, replaced by invalidate_all()
+    slots   SLOTS x (8-byte random token, 8-byte bump time)
+
+Drivers share slots modulo SLOTS; a collision only costs an extra 200.
+Tokens are random rather than counters, so two workers bumping the same
+slot at once can never hand out a version a client has already seen.
+The bump time doubles as db_routing's read-your-writes mark
+(note_write / wrote_recently).
+
+Configuration:
+    DRIVER_VERSION_FILE=/tmp/krs-driver-versions.bin
+    DRIVER_VERSION_SLOTS=65536
+"""
+
+import mmap
+import os
+import secrets
+import struct
+import tempfile
+import time
+from datetime import datetime
+from functools import wraps
+from flask import g, make_response, request
+from db_routing import READ_YOUR_WRITES_SECONDS
+
+VERSION_FILE = os.getenv('DRIVER_VERSION_FILE', os.path.join(tempfile.gettempdir(), 'krs-driver-versions.bin'))
+SLOTS = int(os.getenv('DRIVER_VERSION_SLOTS', 65536))
+
+_HEADER = 16
+_SLOT = struct.Struct('<Qd')
+
+
+class DriverVersions:
+    """Shared-memory version tokens, one slot per driver id (mod slots)"""
+
+    def __init__(self, path=VERSION_FILE, slots=SLOTS):
+        self.slots = slots
+        size = _HEADER + slots * _SLOT.size
+        if not os.path.exists(path):
+            self._create(path, size)
+        with open(path, 'r+b') as f:
+            if os.fstat(f.fileno()).st_size != size:
+                raise RuntimeError(f"{path} was made for a different slot count; delete it or set DRIVER_VERSION_SLOTS")
+            self._map = mmap.mmap(f.fileno(), size)
+
+    @staticmethod
+    def _create(path, size):
+        """Build the file under a temp name and link it in, so workers never see it half-written"""
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(secrets.token_bytes(_HEADER))
+            f.truncate(size)
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass  # Another worker won the race; use its file
+        finally:
+            os.unlink(tmp)
+
+    def _offset(self, driver_id):
+        return _HEADER + (int(driver_id) % self.slots) * _SLOT.size
+
+    def bump(self, driver_id):
+        """Give driver_id a new version - call after its changes are committed"""
+        offset = self._offset(driver_id)
+        self._map[offset:offset + _SLOT.size] = _SLOT.pack(secrets.randbits(64), time.time())
+
+    def get(self, driver_id):
+        """(token, bump time) for driver_id; (0, 0.0) if never bumped"""
+        return _SLOT.unpack_from(self._map, self._offset(driver_id))
+
+    def epoch(self):
+        return self._map[:_HEADER].hex()[:12]
+
+    def invalidate_all(self):
+        """Change every ETag at once (after bulk jobs that bypass the write paths)"""
+        self._map[:_HEADER] = secrets.token_bytes(_HEADER)
+
+
+_versions = None
+
+
+def get_versions():
+    global _versions
+    if _versions is None:
+        _versions = DriverVersions()
+    return _versions
+
+
+# ============================================================================
+# CONDITIONAL GET
+# ============================================================================
+
+def conditional_get(resource, cache_control, daily=False):
+    """
+    ETag + Cache-Control for a per-driver GET handler.
+
+    Place under @token_required (and above @replica_reads) so the driver
+    id is the first argument. A matching If-None-Match returns 304
+    without calling the handler. daily=True folds the UTC date into the
+    ETag for responses that also change when the day rolls over.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(driver_id, *args, **kwargs):
+            versions = get_versions()
+            # Read the version before the handler queries, so a write landing
+            # mid-request can only make the ETag older than the data, never newer
+            token, bumped_at = versions.get(driver_id)
+            etag = f'{resource}-{versions.epoch()}-{token:016x}'
+            if daily:
+                etag += f'-{datetime.utcnow():%Y%m%d}'
+
+            # Weak comparison: compression.py weakens ETags on compressed responses
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(driver_id, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                # A replica may not have this version's rows yet - don't let it be cached
+                if g.get('db_read_engine') is not None and time.time() - bumped_at < READ_YOUR_WRITES_SECONDS:
+                    response.headers['Cache-Control'] = 'no-store'
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return decorated
+    return decorator
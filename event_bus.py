@@ -0,0 +1,381 @@
+"""
+📣 EVENT BUS
+Kenya Road Safety - publish/subscribe for committed changes
+
+Alerts from assessments, emergencies and trip state changes are
+published as events once the transaction that produced them commits, so
+consumers (the SSE fleet monitor, notifications, geofencing, ...)
+subscribe instead of being called from the request path.
+
+Topics (published automatically from RoutingSession commits):
+    driver.created  {driver_id, name, vehicle_type, status}
+    driver.status   {driver_id, status, previous_status, name, vehicle_type}
+    driver.fatigue  {driver_id, fatigue_level, previous_fatigue, name, vehicle_type}
+    alert           {driver_id, record_id, type, timestamp, fatigue_level, recommendation}
+
+Subscribing to 'driver' receives every driver.* topic. Anything else can
+be published with bus.publish(topic, data); data must be JSON-serialisable.
+
+    sub = bus.subscribe('alert', maxsize=100, policy='drop_oldest')
+    event = sub.get(timeout=1)      # Event(topic, data, origin, created) or None
+
+    @bus.handler('alert')           # runs on its own thread, never the request's
+    def notify(event): ...
+
+publish() only enqueues: a dispatcher thread per process hands events to
+the subscriptions, so the committing request never waits on a consumer.
+
+Each subscriber has its own bounded queue and overflow policy:
+    drop_oldest  discard the oldest queued event (live views)
+    drop_newest  discard the incoming event
+    block        the dispatcher waits up to block_timeout for room, then
+                 drops - this delays delivery to the other subscribers,
+                 never the request that published
+Dropped events are counted per subscriber (see stats()).
+
+Cross-worker transport: events are also appended - by a background
+thread, off the request path - to a small SQLite log shared by every
+process on the host. Each process tails the log and delivers the other
+processes' events to its own subscribers, so commits made in another
+web worker or in the db_writer process reach every subscriber.
+
+Configuration:
+    EVENT_BUS_LOG=/tmp/krs-events.db   empty = in-process only
+    EVENT_BUS_POLL_SECONDS=0.2         how often the log is tailed
+    EVENT_BUS_RETENTION_SECONDS=600    how long log rows are kept
+    EVENT_BUS_QUEUE_SIZE=1000          default per-subscriber bound
+"""
+
+import json
+import os
+import queue
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+from sqlalchemy import event as sa_event, inspect
+from db_routing import RoutingSession
+
+LOG_PATH = os.getenv('EVENT_BUS_LOG', os.path.join(tempfile.gettempdir(), 'krs-events.db'))
+POLL_SECONDS = float(os.getenv('EVENT_BUS_POLL_SECONDS', 0.2))
+RETENTION_SECONDS = float(os.getenv('EVENT_BUS_RETENTION_SECONDS', 600))
+QUEUE_SIZE = int(os.getenv('EVENT_BUS_QUEUE_SIZE', 1000))
+
+POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+Event = namedtuple('Event', 'topic data origin created')
+
+
+# ============================================================================
+# SUBSCRIPTIONS
+# ============================================================================
+
+class Subscription:
+    """A bounded queue of events for one consumer"""
+
+    def __init__(self, bus, topics, maxsize, policy, block_timeout):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}' (use {', '.join(POLICIES)})")
+        self.bus = bus
+        self.topics = tuple(topics)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.delivered = 0
+        self.dropped = 0
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def matches(self, topic):
+        return not self.topics or any(topic == t or topic.startswith(t + '.') for t in self.topics)
+
+    def offer(self, event):
+        """Queue event, applying the overflow policy; False if it was dropped"""
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._queue) >= self.maxsize:
+                if self.policy == 'block':
+                    self._cond.wait_for(lambda: len(self._queue) < self.maxsize or self.closed, self.block_timeout)
+                if self.policy == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif len(self._queue) >= self.maxsize or self.closed:
+                    self.dropped += 1
+                    return False
+            self._queue.append(event)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Next event, or None after timeout seconds (or once closed and drained)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self.closed, timeout)
+            if not self._queue:
+                return None
+            event = self._queue.popleft()
+            self.delivered += 1
+            self._cond.notify_all()  # Room for a blocked publisher
+            return event
+
+    def close(self):
+        self.bus.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        return {'topics': list(self.topics) or ['*'], 'policy': self.policy, 'queued': len(self._queue),
+                'maxsize': self.maxsize, 'delivered': self.delivered, 'dropped': self.dropped}
+
+
+# ============================================================================
+# CROSS-WORKER LOG
+# ============================================================================
+
+class _EventLog:
+    """Append-only SQLite table shared by the processes on one host"""
+
+    def __init__(self, path):
+        self.path = path
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'origin TEXT NOT NULL, topic TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)'
+        )
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # Events are advisory; losing the last few on power loss is fine
+        return conn
+
+    def writer(self, outbox):
+        """Drain outbox into the log, one transaction per batch; prune old rows now and then"""
+        conn = self._connect()
+        pruned_at = 0.0
+        while True:
+            batch = [outbox.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(outbox.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany(
+                        'INSERT INTO events (origin, topic, data, created) VALUES (?, ?, ?, ?)',
+                        [(e.origin, e.topic, json.dumps(e.data), e.created) for e in batch]
+                    )
+                    if time.time() - pruned_at > 60:
+                        pruned_at = time.time()
+                        conn.execute('DELETE FROM events WHERE created < ?', (pruned_at - RETENTION_SECONDS,))
+            except sqlite3.Error as e:
+                print(f"⚠️  Event log write failed, {len(batch)} events not shared with other workers: {e}")
+
+    def tail(self, origin, deliver):
+        """Deliver other processes' events, starting from the end of the log"""
+        conn = self._connect()
+        last = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+        while True:
+            time.sleep(POLL_SECONDS)
+            try:
+                rows = conn.execute(
+                    'SELECT id, origin, topic, data, created FROM events WHERE id > ? ORDER BY id LIMIT 1000', (last,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"⚠️  Event log read failed: {e}")
+                continue
+            for row_id, row_origin, topic, data, created in rows:
+                last = row_id
+                if row_origin != origin:
+                    deliver(Event(topic, json.loads(data), row_origin, created))
+
+
+# ============================================================================
+# BUS
+# ============================================================================
+
+class EventBus:
+    """Fan-out of published events to every matching subscription"""
+
+    def __init__(self, log_path=LOG_PATH):
+        self.log = _EventLog(log_path) if log_path else None
+        self._subscriptions = []
+        self._handlers = []
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """
+        Start the background threads (dispatcher, log writer, log tail, handlers).
+
+        Called on first use; threads are per process, so after a fork
+        (gunicorn --preload) the child starts its own.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.origin = f'{self._pid}-{secrets.token_hex(3)}'
+            self._outbox = queue.SimpleQueue()
+            self._inbox = queue.SimpleQueue()
+            threading.Thread(target=self._dispatch, daemon=True).start()
+            if self.log is not None:
+                threading.Thread(target=self.log.writer, args=(self._outbox,), daemon=True).start()
+                threading.Thread(target=self.log.tail, args=(self.origin, self._deliver), daemon=True).start()
+            for subscription, fn in self._handlers:
+                threading.Thread(target=self._run_handler, args=(subscription, fn), daemon=True).start()
+
+    def subscribe(self, *topics, maxsize=QUEUE_SIZE, policy='drop_oldest', block_timeout=1.0):
+        """Queue events for topics (all topics when none are given)"""
+        subscription = Subscription(self, topics, maxsize, policy, block_timeout)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def handler(self, *topics, maxsize=QUEUE_SIZE, policy='drop_oldest', block_timeout=1.0):
+        """Decorator: call fn(event) on a dedicated thread for each matching event"""
+        def register(fn):
+            subscription = Subscription(self, topics, maxsize, policy, block_timeout)
+            with self._lock:
+                self._subscriptions.append(subscription)
+                self._handlers.append((subscription, fn))
+            if self._pid is not None:
+                # Already running in this process - start this handler's thread now
+                threading.Thread(target=self._run_handler, args=(subscription, fn), daemon=True).start()
+            return fn
+        return register
+
+    @staticmethod
+    def _run_handler(subscription, fn):
+        while not subscription.closed:
+            event = subscription.get()
+            if event is None:
+                continue
+            try:
+                fn(event)
+            except Exception as e:
+                print(f"❌ Event handler {fn.__name__} failed on {event.topic}: {e}")
+
+    def publish(self, topic, data):
+        """Queue an event for this process's subscribers (and the log); never blocks"""
+        self.start()
+        event = Event(topic, data, self.origin, time.time())
+        self._inbox.put(event)
+        if self.log is not None:
+            self._outbox.put(event)
+
+    def _dispatch(self):
+        """Dispatcher thread: deliver published events in order, off the publishing thread"""
+        while True:
+            self._deliver(self._inbox.get())
+
+    def _deliver(self, event):
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.matches(event.topic)]
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+    def stats(self):
+        with self._lock:
+            return [s.stats() for s in self._subscriptions]
+
+
+bus = EventBus()
+
+
+# ============================================================================
+# COMMITTED CHANGES
+# ============================================================================
+
+def _loaded(obj, name):
+    """Attribute value if it is loaded (never triggers a lazy load), else None"""
+    return inspect(obj).dict.get(name)
+
+
+def _flush_events(session):
+    """(topic, data) for the driver and alert changes in a flush (works for both apps' models)"""
+    events = []
+    # Drivers first, so an alert's fatigue event precedes the alert itself
+    for obj in list(session.dirty) + list(session.new):
+        table = getattr(obj, '__tablename__', None)
+        if table == 'driver':
+            who = {'driver_id': obj.id, 'name': _loaded(obj, 'full_name'), 'vehicle_type': _loaded(obj, 'vehicle_type')}
+            if obj in session.new:
+                events.append(('driver.created', dict(who, status=_loaded(obj, 'status'))))
+                continue
+            attrs = inspect(obj).attrs
+            status = attrs.status.history
+            if status.added:
+                events.append(('driver.status', dict(
+                    who, status=status.added[0], previous_status=status.deleted[0] if status.deleted else None
+                )))
+            fatigue = attrs.fatigue_level.history
+            if fatigue.added:
+                events.append(('driver.fatigue', dict(
+                    who, fatigue_level=fatigue.added[0], previous_fatigue=fatigue.deleted[0] if fatigue.deleted else None
+                )))
+        elif table == 'health_record' and obj in session.new and _loaded(obj, 'alert_sent'):
+            timestamp = _loaded(obj, 'timestamp')
+            events.append(('alert', {
+                'driver_id': obj.driver_id,
+                'record_id': obj.id,
+                'type': _loaded(obj, 'assessment_type'),
+                'timestamp': timestamp.isoformat() if timestamp else None,
+                'fatigue_level': _loaded(obj, 'fatigue_level'),
+                'recommendation': _loaded(obj, 'recommendation')
+            }))
+    return events
+
+
+@sa_event.listens_for(RoutingSession, 'after_flush')
+def _collect_events(session, flush_context):
+    events = _flush_events(session)
+    if events:
+        session.info.setdefault('bus_events', []).extend(events)
+
+
+@sa_event.listens_for(RoutingSession, 'after_transaction_create')
+def _mark_savepoint(session, transaction):
+    if transaction.nested:
+        session.info.setdefault('bus_marks', {})[transaction] = len(session.info.get('bus_events', ()))
+
+
+@sa_event.listens_for(RoutingSession, 'after_transaction_end')
+def _unmark_savepoint(session, transaction):
+    if transaction.nested:
+        session.info.get('bus_marks', {}).pop(transaction, None)
+
+
+@sa_event.listens_for(RoutingSession, 'after_commit')
+def _publish_events(session):
+    if session.get_nested_transaction() is not None:
+        return  # A SAVEPOINT was released; the outer transaction is still open
+    for topic, data in session.info.pop('bus_events', ()):
+        bus.publish(topic, data)
+
+
+@sa_event.listens_for(RoutingSession, 'after_rollback')
+def _discard_events(session):
+    savepoint = session.get_nested_transaction()
+    if savepoint is None:
+        session.info.pop('bus_events', None)
+        return
+    # Only the events flushed inside the rolled-back SAVEPOINT are discarded
+    # (db_writer.py runs each operation of a batch in its own)
+    mark = session.info.get('bus_marks', {}).get(savepoint)
+    if mark is not None and 'bus_events' in session.info:
+        del session.info['bus_events'][mark:]
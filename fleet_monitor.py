@@ -0,0 +1,279 @@
+"""
+📡 LIVE FLEET MONITOR
+Kenya Road Safety - Server-Sent Events for the control room
+
+GET /api/admin/fleet/stream pushes changes as they are committed:
+
+    snapshot  every driver currently on a trip (first event of a stream)
+    status    a driver started or ended a trip
+    fatigue   a driver's fatigue crossed a band
+              (normal < 60 <= warning < 80 <= critical)
+    alert     an alert-raising health record (drowsiness, emergency) was saved
+
+Events come from the write path through the event bus (event_bus.py):
+committed driver status/fatigue changes and new alert records. The
+database is read once per process, to seed the driver list, and never
+polled.
+
+Every event carries an id. A reconnect sending Last-Event-ID (browsers do
+this automatically) gets the events it missed replayed from a ring
+buffer; if it fell further behind than the buffer, or the server
+restarted, it gets a fresh snapshot instead. Idle streams get a comment
+line every SSE_HEARTBEAT_SECONDS so proxies keep them open.
+
+Each worker keeps its own copy of the state; the bus's cross-worker log
+brings it the commits made by other workers and by the db_writer process.
+Under the ASGI server (asgi.py) streams are coroutines (astream) instead
+of generators holding a worker thread.
+
+Configuration:
+    ADMIN_API_KEY=...          required; send as X-Admin-Key header or ?key=
+    SSE_HEARTBEAT_SECONDS=15
+    SSE_REPLAY_EVENTS=1000
+"""
+
+import asyncio
+import hmac
+import itertools
+import json
+import os
+import secrets
+import threading
+from collections import deque
+from datetime import datetime
+from flask import Response, jsonify, request
+from event_bus import bus
+
+ADMIN_API_KEY = os.getenv('ADMIN_API_KEY')
+HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+REPLAY_EVENTS = int(os.getenv('SSE_REPLAY_EVENTS', 1000))
+
+# (floor, band), highest first - same cut-offs as the assessment alert levels
+FATIGUE_BANDS = ((80, 'critical'), (60, 'warning'), (0, 'normal'))
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def fatigue_band(level):
+    for floor, band in FATIGUE_BANDS:
+        if (level or 0) >= floor:
+            return band
+
+
+# ============================================================================
+# MONITOR
+# ============================================================================
+
+class FleetMonitor:
+    """Current per-driver state plus a ring buffer of numbered events"""
+
+    def __init__(self, replay=REPLAY_EVENTS):
+        # Event ids are "<epoch>-<n>"; the epoch changes per process so a
+        # Last-Event-ID from before a restart is never mistaken for a recent one
+        self.epoch = secrets.token_hex(3)
+        self._drivers = {}
+        self._events = deque(maxlen=replay)  # (n, frame)
+        self._last = 0
+        self._seeded = False
+        self._cond = threading.Condition()
+        self._waiters = set()  # (event loop, asyncio.Event) of async streams
+
+    def _driver(self, driver_id):
+        return self._drivers.setdefault(driver_id, {
+            'driver_id': driver_id, 'name': None, 'vehicle_type': None,
+            'status': None, 'fatigue_level': None, 'fatigue_band': None
+        })
+
+    @property
+    def seeded(self):
+        return self._seeded
+
+    def seed(self, rows):
+        """
+        Load (id, full_name, vehicle_type, status, fatigue_level) rows once.
+
+        Values already set by published changes are newer than the query,
+        so only missing ones are filled in.
+        """
+        with self._cond:
+            if self._seeded:
+                return
+            for driver_id, name, vehicle_type, status, fatigue_level in rows:
+                state = self._driver(driver_id)
+                for key, value in (('name', name), ('vehicle_type', vehicle_type), ('status', status),
+                                   ('fatigue_level', fatigue_level)):
+                    if state[key] is None:
+                        state[key] = value
+                if state['fatigue_band'] is None:
+                    state['fatigue_band'] = fatigue_band(state['fatigue_level'])
+            self._seeded = True
+
+    def apply(self, topic, data):
+        """Update the state from one event bus event and emit the resulting SSE events"""
+        with self._cond:
+            state = self._driver(data['driver_id'])
+            for key in ('name', 'vehicle_type'):
+                if data.get(key) is not None:
+                    state[key] = data[key]
+
+            if topic == 'driver.created':
+                state['status'] = data.get('status')
+            elif topic == 'driver.status' and data['status'] != state['status']:
+                previous = state['status']
+                state['status'] = data['status']
+                self._emit('status', dict(state, previous_status=previous))
+            elif topic == 'driver.fatigue':
+                state['fatigue_level'] = data['fatigue_level']
+                if state['fatigue_band'] is None and data.get('previous_fatigue') is not None:
+                    state['fatigue_band'] = fatigue_band(data['previous_fatigue'])
+                band = fatigue_band(data['fatigue_level'])
+                previous = state['fatigue_band']
+                state['fatigue_band'] = band
+                # A driver we knew nothing about is only news if they are not fine
+                if band != previous and (previous is not None or band != 'normal'):
+                    self._emit('fatigue', dict(state, previous_band=previous))
+            elif topic == 'alert':
+                severity = 'critical' if data.get('type') == 'emergency' else fatigue_band(data.get('fatigue_level'))
+                self._emit('alert', dict(
+                    data, severity=severity, name=state['name'], vehicle_type=state['vehicle_type']
+                ))
+            self._notify()
+
+    def _emit(self, kind, data):
+        self._last += 1
+        self._events.append((self._last, self._frame(self._last, kind, data)))
+
+    def _notify(self):
+        """Wake every stream (call with the lock held)"""
+        self._cond.notify_all()
+        for loop, wake in self._waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:  # Loop already closed
+                pass
+
+    def _frame(self, n, kind, data):
+        data = json.dumps(data, default=_json_default, ensure_ascii=False)
+        return f"id: {self.epoch}-{n}\nevent: {kind}\ndata: {data}\n\n"
+
+    def _snapshot(self):
+        drivers = [dict(d) for d in self._drivers.values() if d['status'] == 'on_trip']
+        return self._frame(self._last, 'snapshot', {'count': len(drivers), 'drivers': drivers})
+
+    def _since(self, cursor):
+        """Frames after event number cursor (a snapshot if they are no longer buffered)"""
+        if cursor == self._last:
+            return []
+        oldest = self._events[0][0] if self._events else self._last + 1
+        if cursor is None or cursor < oldest - 1 or cursor > self._last:
+            return [self._snapshot()]
+        return [frame for _, frame in itertools.islice(self._events, cursor - oldest + 1, None)]
+
+    def _parse_event_id(self, last_event_id):
+        epoch, _, n = (last_event_id or '').partition('-')
+        if epoch == self.epoch and n.isdigit():
+            return int(n)
+        return None
+
+    def stream(self, last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+        """Generator of SSE frames: snapshot or replay, then live events and heartbeats"""
+        with self._cond:
+            frames = self._since(self._parse_event_id(last_event_id))
+            cursor = self._last
+        yield "retry: 3000\n\n"  # Client reconnect delay, ms
+        yield from frames
+
+        while True:
+            with self._cond:
+                if cursor == self._last:
+                    self._cond.wait(heartbeat)
+                frames = self._since(cursor)
+                cursor = self._last
+            if frames:
+                yield from frames
+            else:
+                yield f": heartbeat {datetime.utcnow().isoformat()}\n\n"
+
+    async def astream(self, last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+        """stream() for an event loop: waits on an asyncio.Event instead of holding a thread"""
+        wake = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wake)
+        with self._cond:
+            frames = self._since(self._parse_event_id(last_event_id))
+            cursor = self._last
+            self._waiters.add(waiter)
+        try:
+            yield "retry: 3000\n\n"
+            for frame in frames:
+                yield frame
+
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()  # Before reading, so an event landing now wakes us again
+                with self._cond:
+                    frames = self._since(cursor)
+                    cursor = self._last
+                if frames:
+                    for frame in frames:
+                        yield frame
+                else:
+                    yield f": heartbeat {datetime.utcnow().isoformat()}\n\n"
+        finally:
+            with self._cond:
+                self._waiters.discard(waiter)
+
+
+monitor = FleetMonitor()
+
+
+# The monitor's state must not miss events, so a full queue holds the bus dispatcher back briefly
+@bus.handler('driver', 'alert', maxsize=10000, policy='block')
+def _apply_event(event):
+    monitor.apply(event.topic, event.data)
+
+
+# ============================================================================
+# ROUTE
+# ============================================================================
+
+def admin_key_error(key):
+    """(message, status) when key does not open the fleet stream, else None"""
+    if not ADMIN_API_KEY:
+        return 'Fleet monitor disabled: ADMIN_API_KEY is not set', 503
+    if not hmac.compare_digest((key or '').encode(), ADMIN_API_KEY.encode()):
+        return 'Invalid admin key', 401
+    return None
+
+
+SEED_COLUMNS = ('id', 'full_name', 'vehicle_type', 'status', 'fatigue_level')
+
+
+def init_fleet_monitor(app, driver_model):
+    """Register GET /api/admin/fleet/stream on app; driver_model seeds the driver list"""
+
+    @app.route('/api/admin/fleet/stream', methods=['GET'])
+    def fleet_stream():
+        """Live fleet status, fatigue crossings and alerts (Server-Sent Events)"""
+        error = admin_key_error(request.headers.get('X-Admin-Key') or request.args.get('key'))
+        if error:
+            message, status = error
+            return jsonify({'success': False, 'message': message}), status
+
+        bus.start()  # Tail other workers' events before seeding, so none fall in between
+        if not monitor.seeded:
+            model = driver_model
+            monitor.seed(model.query.with_entities(*(getattr(model, c) for c in SEED_COLUMNS)).all())
+
+        # EventSource sends Last-Event-ID itself; ?lastEventId= is for clients that cannot set headers
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+        response = Response(monitor.stream(last_event_id), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+        return response
+
+    return fleet_stream
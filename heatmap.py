@@ -0,0 +1,352 @@
+"""
+Fleet Fatigue Heatmap
+Where drivers get tired: drowsiness assessments that carry a location are
+binned, as they are written, into (geohash cell, local day, hour of day)
+rows of FatigueHeatCell holding running counts, fatigue sums and alert
+counts. Bins are kept at a few geohash precisions (levels) so that a
+country-wide tile does not have to sum street-level bins. Tiles are
+served from those bins only - HealthRecord is never scanned on the read
+path.
+
+A tile request covers a bounding box and a day range (optionally a set of
+hours of the day). The bins are selected with a few geohash prefix range
+scans and coarsened to the tile precision in SQL; numpy folds the
+(cell, hour) sums into per-cell totals and 24-hour profiles. Every cell
+overlapping the box is returned with its whole-cell totals, in the
+columnar layout (see columnar.py):
+
+    {"columns": ["cell", "lat", "lon", "assessments", "average_fatigue",
+                 "alerts", "hourly_assessments"], "rows": [...]}
+
+hourly_assessments is 24 counts, index 0 = 00:00-00:59 local time. A
+tile reads the coarsest level at least as fine as its own precision.
+
+Geohash precision vs cell size (at the equator):
+    4 = 39 x 20 km   5 = 4.9 x 4.9 km   6 = 1.2 x 0.6 km   7 = 153 x 153 m
+
+Configuration:
+    HEATMAP_LEVELS=4,6           precisions bins are stored at
+    HEATMAP_UTC_OFFSET_HOURS=3   local time for day / hour of day (EAT)
+    HEATMAP_MAX_CELLS=4096       tiles are coarsened to stay under this
+
+Backfill from stored assessments:
+    python heatmap.py --rebuild
+"""
+
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from database import db, HealthRecord, FatigueHeatCell
+
+LEVELS = sorted({int(p) for p in os.getenv('HEATMAP_LEVELS', '4,6').split(',') if p.strip()})
+PRECISION = LEVELS[-1]  # Finest level
+UTC_OFFSET = timedelta(hours=float(os.getenv('HEATMAP_UTC_OFFSET_HOURS', 3)))
+MAX_CELLS = int(os.getenv('HEATMAP_MAX_CELLS', 4096))
+MAX_PREFIX_RANGES = 32
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+_LOOKUP = np.zeros(128, dtype=np.int64)  # ASCII code -> 5-bit value
+_LOOKUP[[ord(c) for c in _BASE32]] = np.arange(32)
+
+
+class HeatmapError(ValueError):
+    """Bad tile request parameters"""
+
+
+# ============================================================================
+# GEOHASH
+# ============================================================================
+
+def geohash_encode(latitude, longitude, precision=PRECISION):
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bits = value = 0
+    even = True  # Bits alternate longitude, latitude, starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value, lon_lo = (value << 1) | 1, mid
+            else:
+                value, lon_hi = value << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value, lat_lo = (value << 1) | 1, mid
+            else:
+                value, lat_hi = value << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geohash_bounds(cell):
+    """(lat_lo, lat_hi, lon_lo, lon_hi) of a geohash cell"""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in cell:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def geohash_centres(cells):
+    """(lat, lon) arrays of the centres of equal-length geohash cells, vectorised"""
+    precision = len(cells[0])
+    codes = np.frombuffer(''.join(cells).encode(), dtype=np.uint8).reshape(len(cells), precision)
+    values = _LOOKUP[codes]
+    bits = ((values[:, :, None] >> np.arange(4, -1, -1)) & 1).reshape(len(cells), 5 * precision)
+    lon_bits, lat_bits = bits[:, 0::2], bits[:, 1::2]
+    lon = lon_bits @ (0.5 ** np.arange(1, lon_bits.shape[1] + 1))
+    lat = lat_bits @ (0.5 ** np.arange(1, lat_bits.shape[1] + 1))
+    lat_step, lon_step = cell_size(precision)
+    return lat * 180 - 90 + lat_step / 2, lon * 360 - 180 + lon_step / 2
+
+
+def cell_size(precision):
+    """(degrees of latitude, degrees of longitude) spanned by one cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(bbox, precision):
+    """Every cell of the given precision that overlaps bbox (min_lon, min_lat, max_lon, max_lat)"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lat_step, lon_step = cell_size(precision)
+    # Snap to the cell grid so every overlapped cell is visited exactly once
+    lat0 = np.floor((min_lat + 90) / lat_step) * lat_step - 90
+    lon0 = np.floor((min_lon + 180) / lon_step) * lon_step - 180
+    cells = set()
+    for lat in np.arange(lat0 + lat_step / 2, max_lat + lat_step / 2, lat_step):
+        for lon in np.arange(lon0 + lon_step / 2, max_lon + lon_step / 2, lon_step):
+            cells.add(geohash_encode(min(lat, 89.999999), min(lon, 179.999999), precision))
+    return sorted(cells)
+
+
+def _cells_in(bbox, precision):
+    lat_step, lon_step = cell_size(precision)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return (np.floor(max_lat / lat_step) - np.floor(min_lat / lat_step) + 1) * \
+           (np.floor(max_lon / lon_step) - np.floor(min_lon / lon_step) + 1)
+
+
+# ============================================================================
+# WRITE PATH
+# ============================================================================
+
+def _local(timestamp):
+    return timestamp + UTC_OFFSET
+
+
+def record_assessment_location(record):
+    """
+    Add a located drowsiness assessment to its heat cells, inside the current transaction.
+
+    Same pattern as the daily metrics rollup: an additive UPDATE, and an
+    INSERT (retried as the UPDATE if another worker won the race) the
+    first time the bin is used.
+    """
+    if record.latitude is None or record.longitude is None or record.fatigue_level is None:
+        return
+    local = _local(record.timestamp or datetime.utcnow())
+    finest = geohash_encode(record.latitude, record.longitude, PRECISION)
+    fatigue = int(record.fatigue_level)
+    alert = 1 if record.alert_sent else 0
+
+    table = FatigueHeatCell.__table__
+    for level in LEVELS:
+        cell = finest[:level]
+        update = table.update().where(
+            table.c.level == level, table.c.cell == cell, table.c.day == local.date(), table.c.hour == local.hour
+        ).values(
+            assessments=table.c.assessments + 1,
+            fatigue_sum=table.c.fatigue_sum + fatigue,
+            alerts=table.c.alerts + alert
+        )
+        if db.session.execute(update).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(FatigueHeatCell(
+                    level=level, cell=cell, day=local.date(), hour=local.hour,
+                    assessments=1, fatigue_sum=fatigue, alerts=alert
+                ))
+        except IntegrityError:
+            db.session.execute(update)
+
+
+def rebuild_heatmap():
+    """
+    Recompute every bin from the located drowsiness assessments in HealthRecord.
+
+    Bins are summed in memory and inserted in bulk; needed after changing
+    HEATMAP_LEVELS or HEATMAP_UTC_OFFSET_HOURS.
+    """
+    records = db.session.query(
+        HealthRecord.latitude, HealthRecord.longitude, HealthRecord.timestamp,
+        HealthRecord.fatigue_level, HealthRecord.alert_sent
+    ).filter(
+        HealthRecord.assessment_type == 'drowsiness',
+        HealthRecord.latitude.isnot(None),
+        HealthRecord.longitude.isnot(None),
+        HealthRecord.fatigue_level.isnot(None)
+    )
+    bins = {}
+    count = 0
+    for latitude, longitude, timestamp, fatigue_level, alert_sent in records.yield_per(5000):
+        local = _local(timestamp or datetime.utcnow())
+        finest = geohash_encode(latitude, longitude, PRECISION)
+        for level in LEVELS:
+            totals = bins.setdefault((level, finest[:level], local.date(), local.hour), [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += fatigue_level
+            totals[2] += 1 if alert_sent else 0
+        count += 1
+
+    FatigueHeatCell.query.delete(synchronize_session=False)
+    rows = [
+        {'level': level, 'cell': cell, 'day': day, 'hour': hour,
+         'assessments': n, 'fatigue_sum': total, 'alerts': alerts}
+        for (level, cell, day, hour), (n, total, alerts) in bins.items()
+    ]
+    for i in range(0, len(rows), 5000):
+        db.session.execute(FatigueHeatCell.__table__.insert(), rows[i:i + 5000])
+    db.session.commit()
+    return count
+
+
+# ============================================================================
+# TILES
+# ============================================================================
+
+def parse_tile_args(args):
+    """
+    bbox=min_lon,min_lat,max_lon,max_lat (required), from/to=YYYY-MM-DD
+    (local days, default the last 30), hours=22-5 or 0,1,2 (local hours,
+    default all), precision=1..max(HEATMAP_LEVELS) (default: as fine as
+    MAX_CELLS allows).
+    """
+    try:
+        bbox = [float(v) for v in args['bbox'].split(',')]
+    except (KeyError, ValueError):
+        raise HeatmapError('bbox=min_lon,min_lat,max_lon,max_lat is required')
+    if len(bbox) != 4 or not (-180 <= bbox[0] < bbox[2] <= 180 and -90 <= bbox[1] < bbox[3] <= 90):
+        raise HeatmapError('bbox must be min_lon,min_lat,max_lon,max_lat within -180..180 / -90..90')
+
+    try:
+        today = _local(datetime.utcnow()).date()
+        end = datetime.strptime(args['to'], '%Y-%m-%d').date() if args.get('to') else today
+        start = datetime.strptime(args['from'], '%Y-%m-%d').date() if args.get('from') else end - timedelta(days=29)
+    except ValueError:
+        raise HeatmapError('from / to must be YYYY-MM-DD')
+    if start > end:
+        raise HeatmapError('from must not be after to')
+
+    hours = None
+    if args.get('hours'):
+        try:
+            if '-' in args['hours']:
+                first, last = (int(h) for h in args['hours'].split('-'))
+                hours = [(first + i) % 24 for i in range((last - first) % 24 + 1)]  # 22-5 wraps midnight
+            else:
+                hours = [int(h) for h in args['hours'].split(',')]
+        except ValueError:
+            raise HeatmapError('hours must be a range like 22-5 or a list like 0,1,2')
+        if any(not 0 <= h <= 23 for h in hours):
+            raise HeatmapError('hours must be between 0 and 23')
+
+    if args.get('precision'):
+        try:
+            precision = int(args['precision'])
+        except ValueError:
+            precision = 0
+        if not 1 <= precision <= PRECISION:
+            raise HeatmapError(f'precision must be between 1 and {PRECISION}')
+    else:
+        precision = next((p for p in range(PRECISION, 0, -1) if _cells_in(bbox, p) <= MAX_CELLS), 1)
+    return tuple(bbox), start, end, hours, precision
+
+
+def _prefix_ranges(bbox, precision):
+    """The coarsest-useful set of geohash prefixes covering bbox (at most MAX_PREFIX_RANGES)"""
+    for p in range(precision, 0, -1):
+        if _cells_in(bbox, p) <= MAX_PREFIX_RANGES:
+            return covering_cells(bbox, p)
+    return ['']  # Whole world
+
+
+def heatmap_tile(bbox, start, end, hours=None, precision=PRECISION):
+    """
+    Sum the stored bins for days / hours into the cells of the given
+    precision that overlap bbox (each with its whole-cell totals).
+    """
+    table = FatigueHeatCell.__table__
+    level = min(l for l in LEVELS if l >= precision)
+    prefixes = _prefix_ranges(bbox, precision)
+    # Prefix ranges ('abc' <= cell < 'abc~') can use the (level, cell, day, hour) unique index
+    spatial = db.or_(*(db.and_(table.c.cell >= p, table.c.cell < p + '~') for p in prefixes))
+    # Coarsening happens in the database: one row back per (tile cell, hour)
+    prefix = db.func.substr(table.c.cell, 1, precision).label('prefix')
+    query = db.select(
+        prefix, table.c.hour, db.func.sum(table.c.assessments), db.func.sum(table.c.fatigue_sum),
+        db.func.sum(table.c.alerts)
+    ).where(
+        table.c.level == level, spatial, table.c.day >= start, table.c.day <= end
+    ).group_by(prefix, table.c.hour)
+    if hours is not None:
+        query = query.where(table.c.hour.in_(hours))
+    rows = db.session.execute(query).all()
+
+    columns = ['cell', 'lat', 'lon', 'assessments', 'average_fatigue', 'alerts', 'hourly_assessments']
+    tile = {'format': 'columnar', 'precision': precision, 'columns': columns, 'rows': []}
+    if not rows:
+        return tile
+
+    cells, hour, count, fatigue_sum, alerts = zip(*rows)
+    keys, index = np.unique(np.array(cells), return_inverse=True)
+    hour = np.array(hour, dtype=np.int64)
+    count = np.array(count, dtype=np.int64)
+    totals = np.bincount(index, weights=count, minlength=len(keys))
+    sums = np.bincount(index, weights=np.array(fatigue_sum, dtype=np.float64), minlength=len(keys))
+    alert_totals = np.bincount(index, weights=np.array(alerts, dtype=np.int64), minlength=len(keys))
+    hourly = np.zeros((len(keys), 24), dtype=np.int64)
+    np.add.at(hourly, (index, hour), count)
+
+    # The prefix ranges overshoot the box: drop cells that do not overlap it
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lat, lon = geohash_centres(keys.tolist())
+    lat_step, lon_step = cell_size(precision)
+    overlaps = ((lat + lat_step / 2 > min_lat) & (lat - lat_step / 2 < max_lat) &
+                (lon + lon_step / 2 > min_lon) & (lon - lon_step / 2 < max_lon))
+
+    for i in np.flatnonzero(overlaps & (totals > 0)):
+        tile['rows'].append([
+            str(keys[i]), round(float(lat[i]), 6), round(float(lon[i]), 6), int(totals[i]),
+            round(sums[i] / totals[i], 1), int(alert_totals[i]), hourly[i].tolist()
+        ])
+    return tile
+
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if '--rebuild' not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    with app.app_context():
+        print(f"✅ Heatmap rebuilt from {rebuild_heatmap()} located assessments")
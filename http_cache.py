@@ -0,0 +1,127 @@
+"""
+On-disk HTTP Cache for the scraper
+Pages are kept per URL: the body plus the ETag / Last-Modified the server
+sent with it. The next fetch sends If-None-Match / If-Modified-Since, and
+a 304 means the cached body is still current.
+
+Each entry also records the SHA-256 of the body whose extraction last
+succeeded (mark_extracted). unchanged() is true when the current body
+(revalidated by a 304, or re-downloaded with the same hash) is that one,
+so the scraper can skip content extraction, Markdown conversion and the
+Gemini call.
+
+An entry is two files named by the URL's SHA-256: <key>.json (metadata)
+and <key>.body (raw bytes). Both are written atomically, so a crashed
+run leaves either the old entry or the new one.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from config import HTTP_CACHE_DIR
+
+
+class HttpCache:
+    """URL -> (body, validators, extraction state) on disk"""
+
+    def __init__(self, directory=HTTP_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.revalidated = 0  # 304s
+        self.unchanged_bodies = 0  # 200s with the cached body's hash
+        self.changed = 0
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, f'{key}.json'), os.path.join(self.directory, f'{key}.body')
+
+    @staticmethod
+    def _write(path, data):
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, url):
+        """The metadata of url's entry, or None (also for a half-missing entry)"""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if os.path.exists(body_path) else None
+
+    def body(self, url):
+        with open(self._paths(url)[1], 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def conditional_headers(entry):
+        """If-None-Match / If-Modified-Since for a cached entry"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, body, headers=None):
+        """Save a freshly downloaded (200) body and its validators"""
+        headers = headers or {}
+        previous = self.get(url) or {}
+        digest = hashlib.sha256(body).hexdigest()
+        entry = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'sha256': digest,
+            'extracted_sha256': previous.get('extracted_sha256'),
+            'status': 200,
+            'fetched_at': datetime.now().isoformat(),
+        }
+        meta_path, body_path = self._paths(url)
+        if digest != previous.get('sha256'):
+            self._write(body_path, body)
+        self._write(meta_path, json.dumps(entry, indent=2).encode())
+        with self._lock:
+            if digest == previous.get('sha256'):
+                self.unchanged_bodies += 1
+            else:
+                self.changed += 1
+        return entry
+
+    def revalidate(self, url, headers=None):
+        """Record a 304 for url (refreshing validators the server re-sent) and return the cached body"""
+        headers = headers or {}
+        entry = self.get(url)
+        entry['etag'] = headers.get('ETag') or entry.get('etag')
+        entry['last_modified'] = headers.get('Last-Modified') or entry.get('last_modified')
+        entry['status'] = 304
+        entry['fetched_at'] = datetime.now().isoformat()
+        self._write(self._paths(url)[0], json.dumps(entry, indent=2).encode())
+        with self._lock:
+            self.revalidated += 1
+        return self.body(url)
+
+    def unchanged(self, url):
+        """True if url's current body is the one last extracted successfully"""
+        entry = self.get(url)
+        return bool(entry and entry.get('extracted_sha256') and entry['extracted_sha256'] == entry['sha256'])
+
+    def mark_extracted(self, url):
+        """Remember that url's current body has been extracted"""
+        entry = self.get(url)
+        if entry is not None:
+            entry['extracted_sha256'] = entry['sha256']
+            self._write(self._paths(url)[0], json.dumps(entry, indent=2).encode())
+
+    def stats(self):
+        return {
+            'revalidated_304': self.revalidated,
+            'unchanged_200': self.unchanged_bodies,
+            'changed': self.changed,
+        }
@@ -0,0 +1,178 @@
+"""
+🏷️ CHAT INTENT CLASSIFIER
+Kenya Road Safety - hashed character n-grams + a linear model
+
+A message is lower-cased, squeezed to letters/digits separated by single
+spaces, padded with a space each side, and cut into character n-grams
+(2-4 by default). Each n-gram is hashed (32-bit FNV-1a) into one of
+2**14 buckets. The feature vector is the bucket counts divided by
+sqrt(number of n-grams); scores are x @ W + b, softmax gives the
+confidence. Hashing needs no vocabulary, and character n-grams cope
+with typos, plurals and Swahili/English mixes.
+
+Everything is NumPy: the hashes of all n-grams of a message (or a whole
+batch, concatenated) are computed with array ops, and scoring is a
+gather-and-sum over W's rows.
+
+The model is trained offline by train_intent_classifier.py and stored as
+arrays in models/intent_classifier.npz (weights, bias, labels, n-gram
+range, bucket count).
+
+Usage:
+    from intent_classifier import load_classifier
+    classifier = load_classifier()          # None if the model file is missing
+    intent, confidence = classifier.predict("how fast can I go on Thika Road")
+"""
+
+import os
+import re
+import numpy as np
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'intent_classifier.npz')
+DEFAULT_BUCKETS = 2 ** 14
+DEFAULT_NGRAMS = (2, 4)
+
+_FNV_OFFSET = np.uint32(2166136261)
+_FNV_PRIME = np.uint32(16777619)
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """' what s the limit ' for "What's the LIMIT?" - the string n-grams are cut from"""
+    return f" {_NON_WORD.sub(' ', text.lower()).strip()} "
+
+
+def ngram_buckets(text, ngrams=DEFAULT_NGRAMS, buckets=DEFAULT_BUCKETS):
+    """
+    Bucket ids of every character n-gram of text (duplicates kept).
+
+    One FNV pass for all lengths: after k bytes the running hash is the
+    hash of the k-gram, so each length is a prefix of the same array.
+    """
+    raw = normalize(text).encode()
+    low, high = ngrams
+    count = len(raw) - low + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint32)
+    data = np.frombuffer(raw + b'\0' * (high - low), dtype=np.uint8).astype(np.uint32)
+    h = np.full(count, _FNV_OFFSET, dtype=np.uint32)
+    ids = []
+    for k in range(high):
+        h = (h ^ data[k:k + count]) * _FNV_PRIME  # Not in place: earlier lengths keep views of h
+        if k + 1 >= low:
+            ids.append(h[:len(raw) - k])
+    return np.concatenate(ids) % np.uint32(buckets)
+
+
+def _fnv(data, n, count):
+    """FNV-1a of data[i:i+n] for i < count, all at once"""
+    h = np.full(count, _FNV_OFFSET, dtype=np.uint32)
+    for k in range(n):
+        h ^= data[k:k + count]
+        h *= _FNV_PRIME
+    return h
+
+
+def batch_buckets(texts, ngrams=DEFAULT_NGRAMS, buckets=DEFAULT_BUCKETS):
+    """
+    (bucket ids, message index) for every n-gram of every text.
+
+    The texts are hashed as one buffer; n-grams that would straddle two
+    messages are dropped.
+    """
+    parts = [normalize(t).encode() for t in texts]
+    data = np.frombuffer(b''.join(parts), dtype=np.uint8).astype(np.uint32)
+    owner = np.repeat(np.arange(len(parts)), [len(p) for p in parts])
+
+    ids, rows = [], []
+    for n in range(ngrams[0], ngrams[1] + 1):
+        count = len(data) - n + 1
+        if count <= 0:
+            continue
+        keep = owner[:count] == owner[n - 1:n - 1 + count]
+        ids.append(_fnv(data, n, count)[keep])
+        rows.append(owner[:count][keep])
+    if not ids:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int64)
+    return np.concatenate(ids) % np.uint32(buckets), np.concatenate(rows)
+
+
+def feature_matrix(texts, ngrams=DEFAULT_NGRAMS, buckets=DEFAULT_BUCKETS):
+    """Dense (len(texts), buckets) float32 features - for training"""
+    ids, rows = batch_buckets(texts, ngrams, buckets)
+    x = np.zeros((len(texts), buckets), dtype=np.float32)
+    np.add.at(x, (rows, ids), 1.0)
+    x /= np.sqrt(np.maximum(np.bincount(rows, minlength=len(texts)), 1))[:, None]
+    return x
+
+
+def softmax(scores):
+    scores = scores - scores.max(axis=-1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class IntentClassifier:
+    """Linear scorer over hashed n-gram buckets"""
+
+    def __init__(self, weights, bias, labels, ngrams=DEFAULT_NGRAMS):
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)  # (buckets, classes)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.labels = [str(label) for label in labels]
+        self.ngrams = tuple(int(n) for n in ngrams)
+        self.buckets = self.weights.shape[0]
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with np.load(path) as model:
+            return cls(model['weights'], model['bias'], model['labels'], model['ngrams'])
+
+    def save(self, path=MODEL_PATH):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            labels=np.array(self.labels), ngrams=np.array(self.ngrams))
+
+    def scores(self, text):
+        ids = ngram_buckets(text, self.ngrams, self.buckets)
+        return np.add.reduce(self.weights[ids]) / np.sqrt(max(len(ids), 1)) + self.bias
+
+    def probabilities(self, text):
+        return softmax(self.scores(text))
+
+    def predict(self, text):
+        """(intent, confidence) for one message"""
+        scores = self.scores(text)
+        best = int(scores.argmax())
+        return self.labels[best], float(1.0 / np.exp(scores - scores[best]).sum())
+
+    def predict_batch(self, texts):
+        """[(intent, confidence), ...] for many messages, scored together"""
+        n = len(texts)
+        if not n:
+            # np.bincount of no rows is int64, which the in-place division below can't hold
+            return []
+        ids, rows = batch_buckets(texts, self.ngrams, self.buckets)
+        gathered = self.weights[ids]
+        scores = np.stack(
+            [np.bincount(rows, weights=gathered[:, c], minlength=n) for c in range(len(self.labels))], axis=1
+        )
+        scores /= np.sqrt(np.maximum(np.bincount(rows, minlength=n), 1))[:, None]
+        p = softmax(scores + self.bias)
+        best = p.argmax(axis=1)
+        return [(self.labels[b], float(p[i, b])) for i, b in enumerate(best)]
+
+
+_classifier = None
+_loaded = False
+
+
+def load_classifier(path=MODEL_PATH):
+    """The shared classifier, loaded on first use (None if the model file is missing)"""
+    global _classifier, _loaded
+    if not _loaded:
+        _loaded = True
+        try:
+            _classifier = IntentClassifier.load(path)
+            print(f"✅ Intent classifier loaded: {len(_classifier.labels)} intents, {_classifier.buckets} buckets")
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️  Intent classifier unavailable ({e}) - using keyword rules. Run train_intent_classifier.py")
+    return _classifier
@@ -0,0 +1,216 @@
+"""
+🧭 INTENT MATCHER
+Kenya Road Safety - compiled keyword rules for the chatbot and voice commands
+
+Rules are compiled once, at import, into a trie over words, and the trie
+into a single regex: at every word start it finds the longest keyword
+(greedy optional continuations, so 'driving time' before 'driving').
+Keywords inside that match - 'driving' in 'driving time' - come from a
+memo of the trie walked over the matched text. Every keyword found is
+reported, overlapping ones included, so rule order alone decides which
+intent wins.
+
+Keywords match whole words, never the inside of one: 'hi' no longer fires
+on "this", nor 'rest' on "interested". A trailing * on the last word
+matches any word starting with it ('accident*' -> accidents, 'driv*' ->
+driving). Phrases are word sequences ('black spot*').
+
+A rule is (intent, groups). Each group is a list of alternative keywords,
+and every group must match:
+
+    ('start_session', [['start', 'begin'], ['session', 'trip', 'driv*']])
+
+A plain list of keywords is a single group. Rules are tried in order and
+the first one satisfied wins; no rule satisfied gives None.
+"""
+
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Regex pieces matching TOKEN_RE's idea of a word
+_WORD_START = r'(?<![a-z0-9])'
+_WORD_END = r'(?![a-z0-9])'
+_GAP = r'[^a-z0-9]+'
+
+_MEMO_SIZE = 4096
+
+
+def tokenize(text):
+    """Lower-cased word tokens - the same for messages and keywords"""
+    return TOKEN_RE.findall(text.lower())
+
+
+class _Node:
+    __slots__ = ('words', 'prefixes', 'prefix_lengths', 'hits')
+
+    def __init__(self):
+        self.words = {}           # exact next word -> _Node
+        self.prefixes = {}        # 'driv' of 'driv*' -> _Node
+        self.prefix_lengths = ()  # distinct len() of the prefixes
+        self.hits = ()            # (rule index, group bit) for keywords ending here
+
+
+class IntentMatcher:
+    """First satisfied rule of an ordered rule list, matched in one pass"""
+
+    def __init__(self, rules):
+        self.intents = []
+        self._required = []  # Per rule: bitmask with one bit per group
+        self._root = _Node()
+        self._max_words = 1
+
+        for index, (intent, groups) in enumerate(rules):
+            if groups and isinstance(groups[0], str):
+                groups = [groups]
+            self.intents.append(intent)
+            self._required.append((1 << len(groups)) - 1)
+            for bit, keywords in enumerate(groups):
+                for keyword in keywords:
+                    self._add(keyword, (index, 1 << bit))
+
+        # Lookahead, so matches may overlap: one (longest) match per word start
+        self._regex = re.compile(f'{_WORD_START}(?=({self._pattern(self._root)}))')
+        self._memo = {}  # Matched text -> every (rule index, group bit) inside it
+
+    def _add(self, keyword, hit):
+        wildcard = keyword.endswith('*')
+        words = tokenize(keyword)
+        if not words:
+            raise ValueError(f'Empty keyword: {keyword!r}')
+        self._max_words = max(self._max_words, len(words))
+
+        node = self._root
+        for position, word in enumerate(words):
+            if wildcard and position == len(words) - 1:
+                node = node.prefixes.setdefault(word, _Node())
+            else:
+                node = node.words.setdefault(word, _Node())
+        node.hits += (hit,)
+
+        # Refresh the parent's prefix lengths (only wildcard words have them)
+        parent = self._root
+        for word in words[:-1]:
+            parent = parent.words[word]
+        parent.prefix_lengths = tuple(sorted({len(p) for p in parent.prefixes}))
+
+    def _pattern(self, node):
+        """Regex for the keywords below node; exact words (which may continue) before wildcards"""
+        branches = {}  # First letter -> branches, so the engine rejects most of them on one character
+        for word, child in node.words.items():
+            branch = re.escape(word[1:]) + _WORD_END
+            if child.words or child.prefixes:
+                more = f'{_GAP}{self._pattern(child)}'
+                branch += f'(?:{more})?' if child.hits else more
+            branches.setdefault(word[0], []).append(branch)
+        for prefix in node.prefixes:
+            branches.setdefault(prefix[0], []).append(re.escape(prefix[1:]) + '[a-z0-9]*')
+        return '(?:' + '|'.join(
+            f'{re.escape(first)}(?:{"|".join(rest)})' for first, rest in branches.items()
+        ) + ')'
+
+    def _hits(self, matched_text):
+        """Every (rule index, group bit) of the keywords inside matched_text, memoized"""
+        hits = self._memo.get(matched_text)
+        if hits is None:
+            if len(self._memo) >= _MEMO_SIZE:
+                self._memo.clear()
+            hits = self._memo[matched_text] = tuple(
+                (index, bits) for index, bits in self._walk(matched_text).items()
+            )
+        return hits
+
+    def _walk(self, text):
+        """{rule index: bitmask} by walking the trie from every token of text"""
+        tokens = tokenize(text)
+        found = {}
+        for start in range(len(tokens)):
+            frontier = (self._root,)
+            for token in tokens[start:start + self._max_words]:
+                following = []
+                for node in frontier:
+                    child = node.words.get(token)
+                    if child is not None:
+                        following.append(child)
+                    for length in node.prefix_lengths:
+                        child = node.prefixes.get(token[:length])
+                        if child is not None:
+                            following.append(child)
+                if not following:
+                    break
+                for node in following:
+                    for index, bit in node.hits:
+                        found[index] = found.get(index, 0) | bit
+                frontier = following
+        return found
+
+    def matched(self, text):
+        """{rule index: bitmask of satisfied groups} for text"""
+        found = {}
+        for matched_text in self._regex.findall(text.lower()):
+            for index, bits in self._hits(matched_text):
+                found[index] = found.get(index, 0) | bits
+        return found
+
+    def match(self, text):
+        """The intent of the first rule text satisfies, or None"""
+        matches = self._regex.findall(text.lower())
+        if not matches:
+            return None
+        required = self._required
+        found, best = {}, len(required)
+        for matched_text in matches:
+            for index, bits in self._hits(matched_text):
+                bits |= found.get(index, 0)
+                found[index] = bits
+                if bits == required[index] and index < best:
+                    best = index
+        return self.intents[best] if best < len(required) else None
+
+
+# ============================================================================
+# RULES
+# ============================================================================
+
+# /api/chatbot/chat - responses in app.CHAT_RESPONSES
+CHAT_RULES = [
+    ('fatigue_level', ['fatigue level', 'my fatigue', 'what is my fatigue']),
+    ('drowsy', ['drowsy', 'drowsiness', 'sleepy', 'sleepiness', 'tired', 'tiredness', 'asleep']),
+    ('sleep', ['sleep', 'sleeping', 'nap', 'naps', 'napping', 'rest', 'resting', 'rested']),
+    ('black_spots', ['black spot*', 'blackspot*', 'where are the black', 'dangerous road*', 'high risk', 'accident spot*']),
+    ('start_session', ['start session', 'start driving', 'begin trip']),
+    ('end_session', ['end session', 'end driving', 'finish trip', 'stop driving']),
+    ('safety_tips', ['safety', 'safe driving', 'how to drive safe*']),
+    ('weather', ['weather', 'what is the weather', 'weather condition*']),
+    ('driving_time', ['how long', 'driving time', 'total hours', 'hours driven']),
+    ('music', ['music', 'play music', 'song*']),
+    ('help', ['help', 'what can you do', 'assist me']),
+]
+
+# /api/voice/command - handled by the branches of app.voice_command
+VOICE_RULES = [
+    ('fatigue', ['fatigue', 'tired', 'tiredness', 'sleepy']),
+    ('weather', ['weather', 'rain*']),
+    ('black_spots', ['black spot*', 'blackspot*', 'dangerous', 'accident*']),
+    ('start_session', [['start*'], ['session*', 'trip*', 'drive', 'driving']]),
+    ('end_session', [['end', 'ended', 'ending'], ['session*', 'trip*']]),
+    ('driving_time', ['how long', 'driving time', 'hours driven']),
+    ('safety_tip', ['safety', 'tip*', 'advice']),
+    ('emergency', ['emergency', 'help', 'save me']),
+    ('music', ['music', 'play']),
+    ('greeting', ['hello', 'hi', 'hey']),
+    ('thanks', ['thank*']),
+]
+
+# chatbot_api.parse_user_query - fallback when the intent classifier is unsure
+QUERY_RULES = [
+    ('weather', ['weather', 'rain*', 'condition*', 'visibility']),
+    ('blackspots', ['black spot*', 'blackspot*', 'danger*', 'risk*', 'accident*', 'unsafe']),
+    ('route_info', ['heading', 'going', 'drive', 'driving', 'route*']),
+    ('safety', ['safe', 'safety', 'recommendation*', 'advice']),
+    ('speed', ['speed*', 'limit*', 'how fast']),
+]
+
+chat_matcher = IntentMatcher(CHAT_RULES)
+voice_matcher = IntentMatcher(VOICE_RULES)
+query_matcher = IntentMatcher(QUERY_RULES)
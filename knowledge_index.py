@@ -0,0 +1,395 @@
+"""
+📚 ROAD SAFETY KNOWLEDGE INDEX
+Kenya Road Safety - BM25 search over the extracted road-safety reports
+
+Every extracted_data/*.json file (pdf_extractor.py, generate_training_data.py)
+is cut into passages: one per key finding, cause, safety initiative and
+recommendation. Passages are tokenized the way intent_matcher tokenizes
+(lower-case words), stop words dropped and plurals folded ('accidents' ->
+'accident', 'fatalities' -> 'fatality'), into an inverted index:
+term -> {passage id: term frequency}.
+
+search() scores only the passages in the postings of the question's
+terms, with Okapi BM25 (k1=1.2, b=0.75).
+
+The index is saved to KNOWLEDGE_INDEX_PATH as gzipped JSON (data only -
+loading it can't run code) together with each file's mtime and size.
+update() indexes only the files that are new or changed since then (a
+changed or deleted file's passages are dropped first), so startup loads
+one file instead of re-reading and re-tokenizing every document.
+
+Requests never build: knowledge_index() returns the latest finished index,
+and a background thread (one per process, started on first use) loads the
+saved index, syncs it with DATA_DIR every REFRESH_SECONDS and swaps in a
+snapshot when something changed. Until the first load finishes the index
+is empty and the reports simply aren't quoted. Run this module at deploy
+time to have the saved index current before the workers start.
+
+Usage:
+    python knowledge_index.py                               # update + save, print stats
+    python knowledge_index.py "why do crashes happen at night"
+"""
+
+import gzip
+import heapq
+import json
+import math
+import os
+import sys
+import threading
+import time
+from intent_matcher import tokenize
+
+DATA_DIR = os.getenv('KNOWLEDGE_DATA_DIR', 'extracted_data')
+INDEX_PATH = os.getenv('KNOWLEDGE_INDEX_PATH', os.path.join(DATA_DIR, '.knowledge_index.json.gz'))
+REFRESH_SECONDS = float(os.getenv('KNOWLEDGE_REFRESH_SECONDS', 60))
+MIN_SCORE = float(os.getenv('KNOWLEDGE_MIN_SCORE', 3.0))
+DEFAULT_TOP_K = 3
+
+INDEX_VERSION = 2  # Bump when passages or terms change, so saved indexes are rebuilt
+FIELDS = {
+    'key_findings': 'finding',
+    'causes': 'cause',
+    'safety_initiatives': 'initiative',
+    'recommendations': 'recommendation',
+}
+K1, B = 1.2, 0.75
+
+STOP_WORDS = frozenset('''
+a about after all also am an and any are as at be been before being but by can could did do does doing
+during for from had has have how i if in into is it its me more most my no not of on or our over should
+so such than that the their them then there these they this those through to too under up very was we
+were what when where which while who why will with would you your
+'''.split())
+
+
+def terms(text):
+    """Index terms of text: words minus stop words, plurals folded"""
+    found = []
+    for word in tokenize(text):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+        found.append(word)
+    return found
+
+
+def _label(key):
+    return str(key).replace('_', ' ').strip().capitalize()
+
+
+def _flatten(value):
+    """One line of text for a nested value ('Cause: speeding; Share: 30')"""
+    if isinstance(value, dict):
+        return '; '.join(f'{_label(k)}: {_flatten(v)}' for k, v in value.items() if v not in (None, '', [], {}))
+    if isinstance(value, list):
+        return ', '.join(_flatten(v) for v in value if v not in (None, '', [], {}))
+    return str(value).strip()
+
+
+def passages_of(value):
+    """
+    Passage texts of one field's value.
+
+    A list gives one passage per item; a dict gives one per key
+    ({'speeding': 35.2} -> 'Speeding: 35.2'); a plain string is one passage.
+    """
+    if value in (None, '', [], {}):
+        return []
+    if isinstance(value, list):
+        return [text for text in (_flatten(item) for item in value) if text]
+    if isinstance(value, dict):
+        return [f'{_label(key)}: {_flatten(item)}' for key, item in value.items() if item not in (None, '', [], {})]
+    return [_flatten(value)]
+
+
+class KnowledgeIndex:
+    """Incrementally maintained BM25 inverted index over extracted report passages"""
+
+    def __init__(self):
+        self.passages = {}      # id -> {'text', 'field', 'source'}
+        self.lengths = {}       # id -> number of terms
+        self.postings = {}      # term -> {id: term frequency}
+        self.files = {}         # file name -> {'mtime', 'size', 'ids'}
+        self.next_id = 0
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def add_document(self, name, data, mtime=0, size=0):
+        """Index the passages of one extraction file's parsed JSON"""
+        ids = []
+        source = (data.get('_metadata') or {}).get('source_file') or name
+        for field, kind in FIELDS.items():
+            for text in passages_of(data.get(field)):
+                counts = {}
+                for term in terms(text):
+                    counts[term] = counts.get(term, 0) + 1
+                if not counts:
+                    continue
+                pid = self.next_id
+                self.next_id += 1
+                self.passages[pid] = {'text': text, 'field': kind, 'source': source}
+                self.lengths[pid] = sum(counts.values())
+                self.total_length += self.lengths[pid]
+                for term, tf in counts.items():
+                    self.postings.setdefault(term, {})[pid] = tf
+                ids.append(pid)
+        self.files[name] = {'mtime': mtime, 'size': size, 'ids': ids}
+        return len(ids)
+
+    def remove_document(self, name):
+        """Drop every passage of one file"""
+        entry = self.files.pop(name, None)
+        if entry is None:
+            return 0
+        for pid in entry['ids']:
+            passage = self.passages.pop(pid)
+            self.total_length -= self.lengths.pop(pid)
+            for term in set(terms(passage['text'])):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(pid, None)
+                    if not posting:
+                        del self.postings[term]
+        return len(entry['ids'])
+
+    def update(self, directory=DATA_DIR):
+        """
+        Bring the index up to date with directory's *.json files.
+
+        Only new, changed (mtime or size) and deleted files are touched. A
+        file that can't be parsed, or isn't a JSON object, is recorded with
+        no passages, so it is only read again once it changes.
+        Returns (files indexed, files dropped).
+        """
+        try:
+            names = sorted(n for n in os.listdir(directory) if n.endswith('.json') and not n.startswith('.'))
+        except OSError:
+            names = []
+
+        current = {}
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            current[name] = (stat.st_mtime_ns, stat.st_size)
+
+        indexed = dropped = 0
+        with self._lock:
+            for name in [n for n in self.files if n not in current]:
+                self.remove_document(name)
+                dropped += 1
+            for name, (mtime, size) in current.items():
+                entry = self.files.get(name)
+                if entry is not None and entry['mtime'] == mtime and entry['size'] == size:
+                    continue
+                try:
+                    with open(os.path.join(directory, name), encoding='utf-8') as f:
+                        data = json.load(f)
+                except OSError as e:
+                    # Gone or unreadable for now - try again next update
+                    print(f"⚠️  Knowledge index: skipping {name} ({e})")
+                    continue
+                except ValueError as e:
+                    print(f"⚠️  Knowledge index: skipping {name} until it changes ({e})")
+                    data = None
+                self.remove_document(name)
+                if isinstance(data, dict):
+                    self.add_document(name, data, mtime, size)
+                else:
+                    self.files[name] = {'mtime': mtime, 'size': size, 'ids': []}
+                indexed += 1
+        return indexed, dropped
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, question, k=DEFAULT_TOP_K):
+        """Top-k passages for question, best first: [{'text', 'field', 'source', 'score'}, ...]"""
+        query = set(terms(question))
+        with self._lock:
+            n = len(self.passages)
+            if not n or not query:
+                return []
+            average = self.total_length / n
+            scores = {}
+            for term in query:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for pid, tf in posting.items():
+                    norm = K1 * (1 - B + B * self.lengths[pid] / average)
+                    scores[pid] = scores.get(pid, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+            # Several reports repeat the same sentence; keep its best-scoring copy
+            results, seen = [], set()
+            for pid, score in heapq.nlargest(4 * k, scores.items(), key=lambda item: item[1]):
+                passage = self.passages[pid]
+                if passage['text'].lower() in seen:
+                    continue
+                seen.add(passage['text'].lower())
+                results.append({**passage, 'score': round(score, 3)})
+                if len(results) == k:
+                    break
+        return results
+
+    def snapshot(self):
+        """A copy for readers: later update()s of this index don't touch it"""
+        copy = KnowledgeIndex()
+        with self._lock:
+            copy.passages = dict(self.passages)
+            copy.lengths = dict(self.lengths)
+            copy.postings = {term: dict(posting) for term, posting in self.postings.items()}
+            copy.files = dict(self.files)
+            copy.next_id = self.next_id
+            copy.total_length = self.total_length
+        return copy
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path=INDEX_PATH):
+        """Write the index as gzipped JSON (atomically: readers never see half a file)"""
+        with self._lock:
+            # JSON keys are strings, so passages are rows and postings [[ids], [tfs]]
+            state = {
+                'version': INDEX_VERSION,
+                'next_id': self.next_id,
+                'files': self.files,
+                'passages': [[pid, p['text'], p['field'], p['source'], self.lengths[pid]]
+                             for pid, p in self.passages.items()],
+                'postings': {term: [list(posting), list(posting.values())]
+                             for term, posting in self.postings.items()},
+            }
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(gzip.compress(json.dumps(state, separators=(',', ':')).encode(), compresslevel=1))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        """The saved index, or an empty one if there is none (or it is unreadable, or from another INDEX_VERSION)"""
+        index = cls()
+        try:
+            with open(path, 'rb') as f:
+                state = json.loads(gzip.decompress(f.read()))
+            if not isinstance(state, dict) or state.get('version') != INDEX_VERSION:
+                return index
+            for pid, text, field, source, length in state['passages']:
+                index.passages[pid] = {'text': text, 'field': field, 'source': source}
+                index.lengths[pid] = length
+            index.postings = {term: dict(zip(ids, tfs)) for term, (ids, tfs) in state['postings'].items()}
+            index.files = state['files']
+            index.next_id = state['next_id']
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"⚠️  Knowledge index {path} unreadable, rebuilding ({e})")
+            return cls()
+        index.total_length = sum(index.lengths.values())
+        return index
+
+    def stats(self):
+        return {
+            'files': len(self.files),
+            'passages': len(self.passages),
+            'terms': len(self.postings),
+        }
+
+
+# ============================================================================
+# SHARED INDEX
+# ============================================================================
+
+_index = KnowledgeIndex()  # What requests search: replaced by the refresher, never updated in place
+_refresher_pid = None
+_shared_lock = threading.Lock()
+
+
+def sync(index, directory=DATA_DIR, path=INDEX_PATH):
+    """update() index from directory and save it if anything changed; returns (files indexed, files dropped)"""
+    indexed, dropped = index.update(directory)
+    if indexed or dropped:
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"⚠️  Knowledge index not saved: {e}")
+        print(f"📚 Knowledge index: {indexed} file(s) indexed, {dropped} dropped - {index.stats()}")
+    return indexed, dropped
+
+
+def _refresh_loop():
+    """Background thread: publish the saved index, then keep it in sync with DATA_DIR"""
+    global _index
+    working = KnowledgeIndex.load(INDEX_PATH)
+    _index = working.snapshot()
+    while True:
+        try:
+            if any(sync(working)):
+                _index = working.snapshot()
+        except Exception as e:
+            print(f"⚠️  Knowledge index refresh failed: {e}")
+        time.sleep(REFRESH_SECONDS)
+
+
+def start_refresher():
+    """Start this process's refresh thread (once; again in a forked child, as gunicorn --preload forks)"""
+    global _refresher_pid
+    if _refresher_pid == os.getpid():
+        return
+    with _shared_lock:
+        if _refresher_pid == os.getpid():
+            return
+        _refresher_pid = os.getpid()
+        threading.Thread(target=_refresh_loop, daemon=True).start()
+
+
+def knowledge_index():
+    """The shared index: the latest one the background refresher finished (empty until it has loaded)"""
+    start_refresher()
+    return _index
+
+
+def search(question, k=DEFAULT_TOP_K):
+    """Top-k passages for question from the shared index"""
+    return knowledge_index().search(question, k)
+
+
+def relevant_passages(question, k=DEFAULT_TOP_K, min_score=MIN_SCORE):
+    """search() results scoring at least min_score - [] when the reports don't cover the question"""
+    return [r for r in search(question, k) if r['score'] >= min_score]
+
+
+def format_passages(results):
+    """Chatbot reply text quoting passages and their sources"""
+    return '📚 From Kenya road-safety reports:\n' + '\n'.join(f"• {r['text']} ({r['source']})" for r in results)
+
+
+def knowledge_answer(question, k=DEFAULT_TOP_K, min_score=MIN_SCORE):
+    """Chatbot reply quoting the top passages, or None if nothing scores min_score"""
+    results = relevant_passages(question, k, min_score)
+    return format_passages(results) if results else None
+
+
+if __name__ == '__main__':
+    index = KnowledgeIndex.load(INDEX_PATH)
+    sync(index)
+    print(f"✅ {INDEX_PATH}: {index.stats()}")
+    if len(sys.argv) > 1:
+        question = ' '.join(sys.argv[1:])
+        start = time.perf_counter()
+        results = index.search(question)
+        print(f"\n🔎 {question!r} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+        for r in results:
+            print(f"  {r['score']:6.2f}  [{r['field']}] {r['text']}  ({r['source']})")
@@ -0,0 +1,275 @@
+"""
+Database Migration Runner
+Applies ordered schema migrations to existing SQLite and PostgreSQL databases
+
+Usage:
+    python migrations.py             # apply pending migrations
+    python migrations.py --status    # list applied / pending migrations
+    python migrations.py --explain   # check each endpoint query uses its index
+"""
+
+import sys
+from datetime import datetime
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from database import (
+    db, HealthRecord, DrivingSession, DailyMetrics, HealthRecordSummary, RetentionWatermark, FatigueHeatCell
+)
+from pagination import keyset_query
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def _columns(conn, table):
+    """Names of the columns currently on a table"""
+    return {col['name'] for col in inspect(conn).get_columns(table)}
+
+
+def _add_column_if_missing(conn, table, column, ddl_type):
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists"""
+    if column not in _columns(conn, table):
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl_type}'))
+        print(f"   + {table}.{column}")
+
+
+def _create_index(engine, index):
+    """
+    Create one model-declared index if it does not exist yet.
+
+    On PostgreSQL the index is built CONCURRENTLY (outside a transaction) so
+    writes to large tables are not blocked while it builds.
+    """
+    with engine.connect() as conn:
+        existing = {ix['name'] for ix in inspect(conn).get_indexes(index.table.name)}
+        # The inspection autobegan a transaction; end it so the isolation level can change
+        conn.rollback()
+        if index.name in existing:
+            return
+
+        ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+        if conn.dialect.name == 'postgresql':
+            ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS', 1)
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            conn.exec_driver_sql(ddl)
+        else:
+            conn.exec_driver_sql(ddl)
+            conn.commit()
+        print(f"   + index {index.name}")
+
+
+def _model_index(table, name):
+    """Look up an index declared in database.py by name"""
+    return next(ix for ix in table.indexes if ix.name == name)
+
+
+# ============================================================================
+# MIGRATIONS - append only, never reorder
+# ============================================================================
+
+def m0001_health_record_columns(engine):
+    """Add tiredness_level / sleep_hours to health_record (was fix_database.py)"""
+    with engine.begin() as conn:
+        _add_column_if_missing(conn, 'health_record', 'tiredness_level', 'INTEGER')
+        _add_column_if_missing(conn, 'health_record', 'sleep_hours', 'FLOAT')
+
+
+def m0002_daily_metrics_rollup(engine):
+    """Create daily_metrics, or add exact-sum columns to the legacy driver_health_api table"""
+    with engine.begin() as conn:
+        if not inspect(conn).has_table('daily_metrics'):
+            DailyMetrics.__table__.create(conn)
+            print("   + table daily_metrics")
+            return
+        _add_column_if_missing(conn, 'daily_metrics', 'fatigue_sum', 'FLOAT DEFAULT 0')
+        _add_column_if_missing(conn, 'daily_metrics', 'fatigue_samples', 'INTEGER DEFAULT 0')
+        _add_column_if_missing(conn, 'daily_metrics', 'health_records_count', 'INTEGER DEFAULT 0')
+
+
+def m0003_query_indexes(engine):
+    """Composite and partial indexes for the history, session and alert queries"""
+    for table, name in [
+        (HealthRecord.__table__, 'ix_health_record_driver_timestamp'),
+        (HealthRecord.__table__, 'ix_health_record_alerts_timestamp'),
+        (DrivingSession.__table__, 'ix_driving_session_driver_start'),
+        (DrivingSession.__table__, 'ix_driving_session_open'),
+    ]:
+        _create_index(engine, _model_index(table, name))
+
+
+def m0004_health_record_retention(engine):
+    """Summary and watermark tables for HealthRecord downsampling"""
+    with engine.begin() as conn:
+        for table in (HealthRecordSummary.__table__, RetentionWatermark.__table__):
+            if not inspect(conn).has_table(table.name):
+                table.create(conn)
+                print(f"   + table {table.name}")
+
+
+def m0005_fatigue_heatmap(engine):
+    """Assessment location columns and the fatigue heatmap bins"""
+    with engine.begin() as conn:
+        _add_column_if_missing(conn, 'health_record', 'latitude', 'FLOAT')
+        _add_column_if_missing(conn, 'health_record', 'longitude', 'FLOAT')
+        if not inspect(conn).has_table(FatigueHeatCell.__tablename__):
+            FatigueHeatCell.__table__.create(conn)
+            print(f"   + table {FatigueHeatCell.__tablename__}")
+
+
+MIGRATIONS = [
+    ('0001_health_record_columns', m0001_health_record_columns),
+    ('0002_daily_metrics_rollup', m0002_daily_metrics_rollup),
+    ('0003_query_indexes', m0003_query_indexes),
+    ('0004_health_record_retention', m0004_health_record_retention),
+    ('0005_fatigue_heatmap', m0005_fatigue_heatmap),
+]
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def _ensure_migrations_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} '
+            '(id VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)'
+        ))
+
+
+def applied_migrations(engine):
+    """IDs of migrations already recorded in the database"""
+    _ensure_migrations_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text(f'SELECT id FROM {MIGRATIONS_TABLE}'))}
+
+
+def run_migrations(engine):
+    """Apply every pending migration in order. Safe to run repeatedly."""
+    done = applied_migrations(engine)
+    pending = [(mid, fn) for mid, fn in MIGRATIONS if mid not in done]
+
+    for migration_id, migration in pending:
+        print(f"🔧 Applying {migration_id}: {migration.__doc__}")
+        migration(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                text(f'INSERT INTO {MIGRATIONS_TABLE} (id, applied_at) VALUES (:id, :at)'),
+                {'id': migration_id, 'at': datetime.utcnow()}
+            )
+
+    return [mid for mid, _ in pending]
+
+
+# ============================================================================
+# EXPLAIN CHECK - one entry per endpoint query, with the index it must use
+# ============================================================================
+
+def endpoint_queries():
+    """
+    (endpoint, statement, index, seek column) for the statements the endpoints send.
+
+    The history pages come from pagination.keyset_query() with a cursor,
+    and must seek their index on the time column as well - a cursor
+    predicate the planner cannot range-seek fails the check.
+    """
+    now = datetime.utcnow()
+    page = {'limit': 50, 'before': (now, 1), 'after': None, 'from': None, 'to': None}
+    health = select(HealthRecord).where(HealthRecord.driver_id == 1)
+    sessions = select(DrivingSession).where(DrivingSession.driver_id == 1)
+    return [
+        ('get_health_history (page after a cursor)',
+         keyset_query(health, HealthRecord.timestamp, HealthRecord.id, page),
+         'ix_health_record_driver_timestamp', 'timestamp'),
+        ('get_statistics (health records)', health, 'ix_health_record_driver_timestamp', None),
+        ('get_statistics (sessions)', sessions, 'ix_driving_session_driver_start', None),
+        ('get_sessions (page after a cursor)',
+         keyset_query(sessions, DrivingSession.start_time, DrivingSession.id, {**page, 'limit': 20}),
+         'ix_driving_session_driver_start', 'start_time'),
+        ('voice_command / voice_emergency / voice_status',
+         sessions.where(DrivingSession.end_time.is_(None)).limit(1),
+         'ix_driving_session_open', None),
+        ('admin health-alerts feed',
+         select(HealthRecord)
+         .where(HealthRecord.alert_sent == True, HealthRecord.timestamp >= now)
+         .order_by(HealthRecord.timestamp.desc()),
+         'ix_health_record_alerts_timestamp', 'timestamp'),
+    ]
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN <statement>, executed with bound parameters like the endpoint's own query"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = 'EXPLAIN ' if compiler.dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN '
+    return prefix + compiler.process(element.statement, **kw)
+
+
+def _index_condition_uses(plan_lines, index_name, column):
+    """True if the plan seeks index_name on column (SQLite 'USING INDEX ... (col<?)', PostgreSQL 'Index Cond')"""
+    return any(
+        column in line.replace(index_name, '')
+        for line in plan_lines
+        if (index_name in line and 'USING' in line) or 'Index Cond' in line
+    )
+
+
+def explain_endpoint_queries(engine):
+    """
+    Run EXPLAIN for every endpoint query and report whether its index is used.
+
+    Returns True when every query's plan uses the expected index (seeking
+    it on the seek column, where one is given).
+    """
+    all_ok = True
+
+    with engine.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            # Small dev tables make a seq scan look cheaper; we want to know the index is usable
+            conn.execute(text('SET enable_seqscan = off'))
+
+        for endpoint, statement, index_name, seek in endpoint_queries():
+            # Bound, not literal, values: SQLite derives an index range from literals it cannot get from ?
+            plan_lines = [str(row[-1]) for row in conn.execute(_Explain(statement)).fetchall()]
+            plan = ' | '.join(plan_lines)
+            ok = index_name in plan and (seek is None or _index_condition_uses(plan_lines, index_name, seek))
+            all_ok = all_ok and ok
+            print(f"{'✅' if ok else '❌'} {endpoint}")
+            print(f"     expects {index_name}{f' seeking on {seek}' if seek else ''}")
+            print(f"     plan: {plan}")
+
+    return all_ok
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        engine = db.engine
+        if '--status' in sys.argv:
+            done = applied_migrations(engine)
+            for migration_id, migration in MIGRATIONS:
+                print(f"{'[x]' if migration_id in done else '[ ]'} {migration_id} - {migration.__doc__}")
+        elif '--explain' in sys.argv:
+            db.create_all()
+            run_migrations(engine)
+            sys.exit(0 if explain_endpoint_queries(engine) else 1)
+        else:
+            db.create_all()
+            applied = run_migrations(engine)
+            print(f"✅ {len(applied)} migration(s) applied" if applied else "✅ Database is up to date")
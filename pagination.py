@@ -0,0 +1,138 @@
+"""
+Keyset (cursor) pagination for history endpoints
+Pages through rows ordered by (timestamp, id) so page cost stays constant
+however deep a client scrolls - no OFFSET, no unbounded LIMIT
+"""
+
+import base64
+from datetime import datetime, timezone
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PaginationError(ValueError):
+    """Raised for malformed cursors, limits or time windows"""
+
+
+def encode_cursor(timestamp, row_id):
+    """Opaque cursor for a (timestamp, id) position"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise PaginationError('Invalid cursor')
+
+
+def _parse_time(value, name):
+    """Naive UTC datetime (what the timestamp columns hold); offsets are converted, not dropped"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise PaginationError(f"'{name}' must be an ISO-8601 timestamp")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_page_args(args, default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Read limit / before / after / from / to from request args.
+
+    limit is clamped to MAX_PAGE_SIZE so a client can never pull a whole
+    table into memory.
+    """
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        raise PaginationError("'limit' must be an integer")
+    if limit < 1:
+        raise PaginationError("'limit' must be at least 1")
+
+    if args.get('before') and args.get('after'):
+        raise PaginationError("Use either 'before' or 'after', not both")
+
+    return {
+        'limit': min(limit, MAX_PAGE_SIZE),
+        'before': decode_cursor(args['before']) if args.get('before') else None,
+        'after': decode_cursor(args['after']) if args.get('after') else None,
+        'from': _parse_time(args['from'], 'from') if args.get('from') else None,
+        'to': _parse_time(args['to'], 'to') if args.get('to') else None,
+    }
+
+
+def paginate(query, time_column, id_column, page):
+    """
+    Apply a time window and keyset cursor to query, newest first.
+
+    Args:
+        query: SQLAlchemy query already filtered to the caller's rows
+        time_column: column to order and window on (e.g. HealthRecord.timestamp)
+        id_column: unique tie-breaker (the primary key)
+        page: dict from parse_page_args
+
+    Returns:
+        (rows, page_info) - rows newest first, page_info holds the cursors
+    """
+    rows = keyset_query(query, time_column, id_column, page).all()
+    return page_rows(rows, time_column, id_column, page)
+
+
+def keyset_query(query, time_column, id_column, page):
+    """
+    The windowed, ordered, limit+1 query paginate() runs.
+
+    Works on a Query or a select() - the async routes (asgi.py) execute the
+    statement themselves and hand the rows to page_rows().
+
+    The cursor predicate carries a redundant plain bound on time_column
+    (<= / >= the cursor time) next to the (time, id) OR, so the planner
+    can range-seek the (owner, timestamp) index to the cursor instead of
+    walking it from the newest row.
+    """
+    if page['from'] is not None:
+        query = query.filter(time_column >= page['from'])
+    if page['to'] is not None:
+        query = query.filter(time_column < page['to'])
+
+    if page['after'] is not None:
+        # Walk forwards (older -> newer) from the cursor; page_rows() flips back to newest first
+        ts, row_id = page['after']
+        query = query.filter(time_column >= ts,
+                             or_(time_column > ts, and_(time_column == ts, id_column > row_id)))
+        return query.order_by(time_column.asc(), id_column.asc()).limit(page['limit'] + 1)
+
+    if page['before'] is not None:
+        ts, row_id = page['before']
+        query = query.filter(time_column <= ts,
+                             or_(time_column < ts, and_(time_column == ts, id_column < row_id)))
+    return query.order_by(time_column.desc(), id_column.desc()).limit(page['limit'] + 1)
+
+
+def page_rows(rows, time_column, id_column, page):
+    """Trim the rows of keyset_query() to the page, newest first, and build page_info"""
+    limit = page['limit']
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    if page['after'] is not None:
+        rows.reverse()
+
+    time_key, id_key = time_column.key, id_column.key
+    first, last = (rows[0], rows[-1]) if rows else (None, None)
+    older_exist = has_more if page['after'] is None else True
+    newer_exist = has_more if page['after'] is not None else page['before'] is not None
+
+    return rows, {
+        'limit': limit,
+        'has_more': older_exist,
+        'next_cursor': encode_cursor(getattr(last, time_key), getattr(last, id_key)) if rows and older_exist else None,
+        'prev_cursor': encode_cursor(getattr(first, time_key), getattr(first, id_key)) if rows and newer_exist else None,
+    }
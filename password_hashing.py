@@ -0,0 +1,72 @@
+"""
+Password Hashing Executor
+Password hashes are deliberately slow, so a burst of logins at shift
+change can occupy every request thread at once. All hashing and
+verification runs on a small dedicated thread pool instead
+(hashlib releases the GIL while it works). Only a bounded number of
+requests may wait for it; beyond that, callers get HashingBusy straight
+away and the route answers 503 with Retry-After rather than queueing.
+
+The pool only frees the request thread's worker when that worker has
+other threads to serve with: gthread workers (the Procfile) or ASGI mode.
+Under gunicorn sync workers, the one request thread waits on the result,
+so the worker is held for the whole hash either way.
+
+The cost is configurable and written into every hash
+("pbkdf2:sha256:<iterations>$salt$hash"). needs_rehash() tells login
+to re-hash a stored password whose method or cost differs from the
+current setting, so hashes move up or down with the configuration.
+
+Configuration:
+    PASSWORD_HASH_ITERATIONS=600000   PBKDF2-SHA256 rounds for new hashes
+    PASSWORD_HASH_WORKERS=2           concurrent hash computations
+    PASSWORD_HASH_QUEUE=32            requests allowed to wait beyond that
+    PASSWORD_HASH_RETRY_AFTER=2       seconds suggested to refused clients
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 600000))
+HASH_METHOD = f'pbkdf2:sha256:{HASH_ITERATIONS}'
+HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 2))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE)
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full - retry after RETRY_AFTER seconds"""
+
+    retry_after = RETRY_AFTER
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy('Too many password operations in progress')
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    """Hash password with the configured method and cost"""
+    return _run(generate_password_hash, password, HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    """Check password against a stored hash of any supported method"""
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True when a stored hash was made with a different method or cost"""
+    return password_hash.split('$', 1)[0] != HASH_METHOD
@@ -0,0 +1,128 @@
+"""
+Chatbot Response Cache
+The chatbot's location answers (safety recommendations, safety queries)
+scan every black spot for the ones near the driver. The cache keeps,
+per geohash cell (state_bucket), the candidate list: the black spots
+within the radius of the cell's centre padded by the cell's
+half-diagonal (cell_radius_km), a superset of what any driver in the
+cell can see. Entries are keyed ('blackspot_candidates', cell,
+radius_km) in a bounded LRU and live at most RESPONSE_CACHE_TTL seconds.
+
+Answers themselves are not cached: the caller measures exact distances
+from the driver's own coordinates after the lookup and builds the reply
+per request. clear() is the invalidation hook: chatbot_api calls it when its
+reference data (black spots, locations) is reloaded. The cache is per
+process.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from heatmap import geohash_encode, geohash_bounds
+
+DEFAULT_MAX_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 4096))
+DEFAULT_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+CELL_PRECISION = int(os.getenv('RESPONSE_CACHE_CELL_PRECISION', 5))  # ~4.9 x 4.9 km
+
+
+def state_bucket(latitude=None, longitude=None, precision=CELL_PRECISION):
+    """Geohash cell of a location, or None without one (0.0 is a coordinate, not a missing one)"""
+    if latitude is None or longitude is None:
+        return None
+    return geohash_encode(latitude, longitude, precision)
+
+
+def cell_centre(cell):
+    """(lat, lon) of a state_bucket cell, or (None, None)"""
+    if cell is None:
+        return None, None
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bounds(cell)
+    return (lat_lo + lat_hi) / 2, (lon_lo + lon_hi) / 2
+
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    """Haversine distance, as chatbot_api.calculate_distance"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin(math.radians(lat2 - lat1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+def cell_radius_km(cell):
+    """Farthest distance from a state_bucket cell's centre to any point of it (a corner), in km"""
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bounds(cell)
+    lat, lon = cell_centre(cell)
+    return max(_distance_km(lat, lon, corner_lat, corner_lon)
+               for corner_lat in (lat_lo, lat_hi) for corner_lon in (lon_lo, lon_hi))
+
+
+def time_of_day(hour=None):
+    """'night' (18:00-06:59) or 'day' - the split the safety recommendations use"""
+    hour = datetime.now().hour if hour is None else hour
+    return 'night' if hour >= 18 or hour <= 6 else 'day'
+
+
+class ResponseCache:
+    """Bounded, expiring key -> value cache"""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0  # Bumped by clear()
+
+    def get_or_set(self, key, compute):
+        """
+        The cached value for key, or compute() stored under it.
+
+        compute() runs outside the lock; if clear() lands meanwhile its
+        result may come from the old reference data, so it is returned
+        but not stored.
+        """
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generation
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            if self._generation != generation:
+                return value
+            self._entries[key] = (value, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'invalidations': self.invalidations
+        }
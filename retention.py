@@ -0,0 +1,243 @@
+"""
+HealthRecord Retention & Downsampling Job
+Keeps raw drowsiness readings for N days, then folds them into per-minute
+and later per-hour summary rows (min / max / mean fatigue, alerts, yawns).
+
+Alert and emergency rows are always kept verbatim. Work happens in
+bounded primary-key windows, each in its own short transaction, so the
+table is never locked for long.
+
+Usage:
+    python retention.py --raw-days 7 --minute-days 30 --batch-size 5000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from database import db, HealthRecord, HealthRecordSummary, RetentionWatermark
+
+DEFAULT_RAW_DAYS = 7
+DEFAULT_MINUTE_DAYS = 30
+DEFAULT_BATCH_SIZE = 5000
+DELETE_CHUNK = 500  # Keeps IN (...) lists under SQLite's bound-parameter limit
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def _bucket(timestamp, resolution):
+    """Truncate a timestamp to the start of its minute or hour"""
+    if resolution == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def _get_watermark(tier):
+    watermark = db.session.get(RetentionWatermark, tier)
+    if watermark is None:
+        watermark = RetentionWatermark(tier=tier, last_id=0)
+        db.session.add(watermark)
+    return watermark
+
+
+def _merge_into_summaries(resolution, buckets):
+    """
+    Add aggregated buckets into summary rows, creating them as needed.
+
+    buckets maps (driver_id, bucket_start) -> dict with samples, fatigue_min,
+    fatigue_max, fatigue_sum, alert_count, yawn_count.
+    """
+    if not buckets:
+        return
+
+    starts = {start for _, start in buckets}
+    existing = {
+        (s.driver_id, s.bucket_start): s
+        for s in HealthRecordSummary.query.filter(
+            HealthRecordSummary.resolution == resolution,
+            HealthRecordSummary.bucket_start >= min(starts),
+            HealthRecordSummary.bucket_start <= max(starts),
+            HealthRecordSummary.driver_id.in_({driver_id for driver_id, _ in buckets})
+        )
+    }
+
+    for (driver_id, start), agg in buckets.items():
+        summary = existing.get((driver_id, start))
+        if summary is None:
+            db.session.add(HealthRecordSummary(driver_id=driver_id, resolution=resolution, bucket_start=start, **agg))
+            continue
+        summary.samples += agg['samples']
+        summary.fatigue_sum += agg['fatigue_sum']
+        summary.alert_count += agg['alert_count']
+        summary.yawn_count += agg['yawn_count']
+        if agg['fatigue_min'] is not None:
+            summary.fatigue_min = agg['fatigue_min'] if summary.fatigue_min is None else min(summary.fatigue_min, agg['fatigue_min'])
+            summary.fatigue_max = agg['fatigue_max'] if summary.fatigue_max is None else max(summary.fatigue_max, agg['fatigue_max'])
+
+
+def _add_to_bucket(buckets, key, samples, fatigue_min, fatigue_max, fatigue_sum, alerts, yawns):
+    agg = buckets.get(key)
+    if agg is None:
+        buckets[key] = {
+            'samples': samples, 'fatigue_min': fatigue_min, 'fatigue_max': fatigue_max,
+            'fatigue_sum': fatigue_sum, 'alert_count': alerts, 'yawn_count': yawns
+        }
+        return
+    agg['samples'] += samples
+    agg['fatigue_sum'] += fatigue_sum
+    agg['alert_count'] += alerts
+    agg['yawn_count'] += yawns
+    if fatigue_min is not None:
+        agg['fatigue_min'] = fatigue_min if agg['fatigue_min'] is None else min(agg['fatigue_min'], fatigue_min)
+        agg['fatigue_max'] = fatigue_max if agg['fatigue_max'] is None else max(agg['fatigue_max'], fatigue_max)
+
+
+def _delete_ids(table, ids):
+    for i in range(0, len(ids), DELETE_CHUNK):
+        db.session.execute(table.delete().where(table.c.id.in_(ids[i:i + DELETE_CHUNK])))
+
+
+# ============================================================================
+# TIERS
+# ============================================================================
+
+def compact_raw_records(cutoff, batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+    """
+    Fold drowsiness readings older than cutoff into per-minute summaries.
+
+    Every reading (alerts included) counts towards its minute's statistics,
+    but only routine non-alert rows are deleted. A watermark on the primary
+    key means rows are folded exactly once even though alert rows stay behind.
+
+    Returns (rows_summarized, rows_deleted).
+    """
+    summarized = deleted = 0
+    max_id = db.session.query(func.max(HealthRecord.id)).scalar() or 0
+
+    while True:
+        watermark = _get_watermark('raw_to_minute')
+        window_start = watermark.last_id
+        if window_start >= max_id:
+            break
+
+        rows = db.session.query(
+            HealthRecord.id, HealthRecord.driver_id, HealthRecord.timestamp, HealthRecord.assessment_type,
+            HealthRecord.fatigue_level, HealthRecord.yawn_detected, HealthRecord.alert_sent
+        ).filter(
+            HealthRecord.id > window_start,
+            HealthRecord.id <= window_start + batch_size
+        ).order_by(HealthRecord.id).all()
+
+        buckets, doomed = {}, []
+        last_id, reached_cutoff = window_start + batch_size, False
+        for row in rows:
+            # Ids grow with time, so the first recent row ends this tier's work
+            if row.timestamp is not None and row.timestamp >= cutoff:
+                last_id, reached_cutoff = row.id - 1, True
+                break
+            if row.assessment_type != 'drowsiness' or row.timestamp is None:
+                continue
+            fatigue = row.fatigue_level
+            _add_to_bucket(
+                buckets, (row.driver_id, _bucket(row.timestamp, 'minute')),
+                1, fatigue, fatigue, fatigue or 0,
+                1 if row.alert_sent else 0, 1 if row.yawn_detected else 0
+            )
+            summarized += 1
+            if not row.alert_sent:
+                doomed.append(row.id)
+
+        _merge_into_summaries('minute', buckets)
+        _delete_ids(HealthRecord.__table__, doomed)
+        deleted += len(doomed)
+        watermark.last_id = min(last_id, max_id)
+        db.session.commit()
+
+        if reached_cutoff:
+            break
+        if pause:
+            time.sleep(pause)
+
+    return summarized, deleted
+
+
+def compact_minute_summaries(cutoff, batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+    """
+    Merge per-minute summaries older than cutoff into per-hour summaries.
+
+    Returns the number of minute rows folded away.
+    """
+    folded = 0
+
+    while True:
+        minutes = HealthRecordSummary.query.filter(
+            HealthRecordSummary.resolution == 'minute',
+            HealthRecordSummary.bucket_start < cutoff
+        ).order_by(HealthRecordSummary.id).limit(batch_size).all()
+        if not minutes:
+            break
+
+        buckets = {}
+        for m in minutes:
+            _add_to_bucket(
+                buckets, (m.driver_id, _bucket(m.bucket_start, 'hour')),
+                m.samples, m.fatigue_min, m.fatigue_max, m.fatigue_sum, m.alert_count, m.yawn_count
+            )
+
+        ids = [m.id for m in minutes]
+        db.session.expunge_all()
+        _delete_ids(HealthRecordSummary.__table__, ids)
+        _merge_into_summaries('hour', buckets)
+        db.session.commit()
+        folded += len(ids)
+
+        if len(minutes) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    return folded
+
+
+def run_retention(raw_days=DEFAULT_RAW_DAYS, minute_days=DEFAULT_MINUTE_DAYS,
+                  batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+    """Run both tiers and return a summary of the work done"""
+    now = datetime.utcnow()
+    summarized, deleted = compact_raw_records(now - timedelta(days=raw_days), batch_size, pause)
+    folded = compact_minute_summaries(now - timedelta(days=minute_days), batch_size, pause)
+    if deleted or folded:
+        # Record counts changed outside the write paths - retire every cached ETag
+        from driver_versions import get_versions
+        get_versions().invalidate_all()
+    return {
+        'raw_rows_summarized': summarized,
+        'raw_rows_deleted': deleted,
+        'minute_rows_folded_to_hours': folded
+    }
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Downsample old HealthRecord rows')
+    parser.add_argument('--raw-days', type=int, default=DEFAULT_RAW_DAYS, help='Days of raw readings to keep')
+    parser.add_argument('--minute-days', type=int, default=DEFAULT_MINUTE_DAYS, help='Days of per-minute summaries to keep')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per transaction')
+    parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+    args = parser.parse_args()
+
+    if args.minute_days < args.raw_days:
+        parser.error('--minute-days must be >= --raw-days')
+
+    from app import app
+
+    with app.app_context():
+        result = run_retention(args.raw_days, args.minute_days, args.batch_size, args.pause)
+
+    print("✅ Retention complete")
+    for key, value in result.items():
+        print(f"   {key}: {value}")
@@ -1,15 +1,34 @@
 """
 Kenya Road Accident Data Scraper using Gemini AI
 Scrapes road accident statistics and safety information from multiple sources
+
+Sources are scraped concurrently (SCRAPE_WORKERS at a time) over one
+pooled keep-alive session. Requests to the same host are spaced at least
+HOST_MIN_INTERVAL apart, while different hosts proceed in parallel. At most
+LLM_CONCURRENCY Gemini calls run at once. Fetches that time out or get
+408/429/5xx, and Gemini rate-limit/outage errors, are retried with
+exponential backoff and full jitter (honouring Retry-After).
+
+Fetched pages are kept in an on-disk HTTP cache (http_cache.py). Repeat
+runs send If-None-Match / If-Modified-Since, and when a page comes back
+304 or with the same body as the last successful extraction, the saved
+scraped_data/<name>.json is reused without extraction, Markdown
+conversion or a Gemini call.
 """
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from markdownify import markdownify
 import json
 import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urlparse
 from config import (
     GEMINI_API_KEY,
     TARGET_URLS,
@@ -18,8 +37,61 @@ from config import (
     GENERATION_CONFIG,
     CONTENT_SELECTORS,
     OUTPUT_DIR,
-    WEB_UNLOCKER_API_KEY
+    WEB_UNLOCKER_API_KEY,
+    SCRAPE_WORKERS,
+    LLM_CONCURRENCY,
+    HOST_MIN_INTERVAL,
+    REQUEST_TIMEOUT,
+    MAX_RETRIES,
+    RETRY_BACKOFF,
+    RETRY_BACKOFF_MAX
 )
+from http_cache import HttpCache
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+LLM_RETRY_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError
+)
+
+
+class HostRateLimiter:
+    """
+    Politeness limit: requests to one host start at least `interval`
+    seconds apart; other hosts are not held up
+    """
+    
+    def __init__(self, interval=HOST_MIN_INTERVAL):
+        self.interval = interval
+        self._next = {}  # host -> earliest start of its next request
+        self._lock = threading.Lock()
+    
+    def wait(self, url):
+        """Claim the next slot for url's host and sleep until it"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Seconds before retry number `attempt` (1-based): full jitter up to an exponential cap, at least Retry-After"""
+    delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (attempt - 1)))
+    return max(delay, min(retry_after or 0, RETRY_BACKOFF_MAX))
+
+
+def _retry_after(response):
+    """Retry-After in seconds, if the server sent a numeric one"""
+    try:
+        return float(response.headers.get('Retry-After', ''))
+    except ValueError:
+        return None
 
 
 class RoadAccidentScraper:
@@ -27,12 +99,14 @@ class RoadAccidentScraper:
     Main scraper class for extracting road accident data using Gemini AI
     """
     
-    def __init__(self, use_web_unlocker=False):
+    def __init__(self, use_web_unlocker=False, use_http_cache=True):
         """
         Initialize the scraper with Gemini API configuration
         
         Args:
             use_web_unlocker: Whether to use Web Unlocker API for bypassing anti-scraping
+            use_http_cache: Revalidate pages against the on-disk HTTP cache and skip
+                            unchanged ones (False: fetch and extract everything)
         """
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY not found. Please set it in your .env file")
@@ -41,6 +115,17 @@ class RoadAccidentScraper:
         self.model = genai.GenerativeModel(GEMINI_MODEL, generation_config=GENERATION_CONFIG)
         self.use_web_unlocker = use_web_unlocker
         
+        # One keep-alive connection pool shared by the worker threads
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=SCRAPE_WORKERS, pool_maxsize=SCRAPE_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.rate_limiter = HostRateLimiter()
+        self._llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+        self.http_cache = HttpCache() if use_http_cache else None
+        
         # Create output directory if it doesn't exist
         if not os.path.exists(OUTPUT_DIR):
             os.makedirs(OUTPUT_DIR)
@@ -60,14 +145,45 @@ class RoadAccidentScraper:
         else:
             return self._fetch_with_requests(url)
     
+    def _request(self, method, url, polite_url=None, timeout=REQUEST_TIMEOUT, **kwargs):
+        """
+        session.request behind the per-host rate limit, retrying timeouts,
+        connection errors and RETRY_STATUSES with jittered backoff
+        
+        Args:
+            polite_url: URL whose host the rate limit applies to (default: url)
+            
+        Returns:
+            The successful response; raises the last error once retries run out
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            self.rate_limiter.wait(polite_url or url)
+            retry_after = None
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                error = requests.exceptions.HTTPError(f"{response.status_code} for {url}", response=response)
+                retry_after = _retry_after(response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            if attempt == MAX_RETRIES:
+                raise error
+            delay = backoff_delay(attempt + 1, retry_after)
+            print(f"   ↻ {polite_url or url}: {error} - retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+    
     def _fetch_with_requests(self, url):
-        """Fetch HTML using standard requests library"""
+        """Fetch HTML using the pooled session (a conditional GET if the page is cached)"""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
+            if not self.http_cache:
+                return self._request('GET', url).content
+            entry = self.http_cache.get(url)
+            response = self._request('GET', url, headers=self.http_cache.conditional_headers(entry))
+            if response.status_code == 304 and entry:
+                return self.http_cache.revalidate(url, response.headers)
+            self.http_cache.store(url, response.content, response.headers)
             return response.content
         except requests.exceptions.RequestException as e:
             print(f"Error fetching {url}: {e}")
@@ -87,13 +203,17 @@ class RoadAccidentScraper:
                 "format": "raw"
             }
             
-            response = requests.post(
-                "https://api.brightdata.com/request", 
-                json=payload, 
+            response = self._request(
+                'POST',
+                "https://api.brightdata.com/request",
+                polite_url=url,
+                json=payload,
                 headers=headers,
                 timeout=60
             )
-            response.raise_for_status()
+            # The unlocker fetches on our behalf, so no conditional request - only the body hash
+            if self.http_cache:
+                self.http_cache.store(url, response.content)
             return response.content
         except requests.exceptions.RequestException as e:
             print(f"Error with Web Unlocker for {url}: {e}")
@@ -178,7 +298,7 @@ CONTENT:
 """
         
         try:
-            response = self.model.generate_content(prompt)
+            response = self._generate(prompt, url_name)
             data = json.loads(response.text)
             
             # Add metadata
@@ -193,6 +313,19 @@ CONTENT:
             print(f"Error extracting data with Gemini for {url_name}: {e}")
             return None
     
+    def _generate(self, prompt, url_name):
+        """model.generate_content with at most LLM_CONCURRENCY calls in flight, retried on rate limits and outages"""
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with self._llm_slots:
+                    return self.model.generate_content(prompt)
+            except LLM_RETRY_ERRORS as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt + 1)
+                print(f"   ↻ [{url_name}] Gemini: {e} - retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+    
     def scrape_url(self, url_config):
         """
         Scrape a single URL and extract road accident data
@@ -207,78 +340,87 @@ CONTENT:
         name = url_config['name']
         description = url_config['description']
         
-        print(f"\n{'='*60}")
-        print(f"Scraping: {description}")
-        print(f"URL: {url}")
-        print(f"{'='*60}")
+        print(f"\n🌐 [{name}] {description}: {url}")
         
         # Step 1: Fetch HTML
-        print("📥 Fetching HTML...")
         html = self.fetch_html(url)
         if not html:
-            print("❌ Failed to fetch HTML")
+            print(f"❌ [{name}] Failed to fetch HTML")
             return None
         
+        output_file = os.path.join(OUTPUT_DIR, f"{name}.json")
+        if self.http_cache and self.http_cache.unchanged(url) and os.path.exists(output_file):
+            try:
+                with open(output_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                reason = '304 Not Modified' if self.http_cache.get(url)['status'] == 304 else 'same content'
+                print(f"♻️  [{name}] Unchanged since last run ({reason}), reusing {output_file}")
+                return data
+            except (OSError, ValueError) as e:
+                print(f"⚠️  [{name}] Could not reuse {output_file} ({e}), extracting again")
+        
         # Step 2: Extract main content
-        print("🔍 Extracting main content...")
         main_html = self.extract_main_content(html)
         if not main_html:
-            print("❌ Failed to extract content")
+            print(f"❌ [{name}] Failed to extract content")
             return None
         
         # Step 3: Convert to Markdown
-        print("📝 Converting to Markdown...")
         markdown = self.html_to_markdown(main_html)
         if not markdown:
-            print("❌ Failed to convert to Markdown")
+            print(f"❌ [{name}] Failed to convert to Markdown")
             return None
         
-        print(f"📊 Content size: {len(markdown)} characters")
-        
         # Step 4: Extract data with Gemini
-        print("🤖 Extracting data with Gemini AI...")
+        print(f"🤖 [{name}] Extracting data with Gemini AI ({len(markdown)} characters)...")
         data = self.extract_data_with_gemini(markdown, name)
         
         if data:
-            print("✅ Data extracted successfully")
             # Save individual file
-            output_file = os.path.join(OUTPUT_DIR, f"{name}.json")
             with open(output_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=4, ensure_ascii=False)
-            print(f"💾 Saved to: {output_file}")
+            if self.http_cache:
+                self.http_cache.mark_extracted(url)
+            print(f"✅ [{name}] Data extracted, saved to: {output_file}")
         else:
-            print("❌ Failed to extract data")
+            print(f"❌ [{name}] Failed to extract data")
         
         return data
     
-    def scrape_all(self, delay=2):
+    def _scrape_one(self, url_config):
+        """scrape_url, with an unexpected error failing only this source"""
+        try:
+            return self.scrape_url(url_config)
+        except Exception as e:
+            print(f"❌ [{url_config['name']}] {e}")
+            return None
+    
+    def scrape_all(self, delay=None, workers=SCRAPE_WORKERS, sources=None):
         """
-        Scrape all configured URLs
+        Scrape all configured URLs concurrently
         
         Args:
-            delay: Delay between requests in seconds
+            delay: Minimum seconds between requests to the same host (default HOST_MIN_INTERVAL)
+            workers: Number of sources scraped at once
+            sources: URL configs to scrape (default TARGET_URLS)
             
         Returns:
-            List of all extracted data
+            List of all extracted data, in source order
         """
-        all_data = []
+        sources = TARGET_URLS if sources is None else sources
+        if delay is not None:
+            self.rate_limiter.interval = delay
         
-        print(f"\n🚀 Starting scraping of {len(TARGET_URLS)} sources...")
-        print(f"⏱️  Delay between requests: {delay} seconds\n")
+        print(f"\n🚀 Starting scraping of {len(sources)} sources "
+              f"({workers} at a time, {LLM_CONCURRENCY} Gemini calls at a time)...")
+        print(f"⏱️  At least {self.rate_limiter.interval} seconds between requests to the same host\n")
         
-        for i, url_config in enumerate(TARGET_URLS, 1):
-            print(f"\n[{i}/{len(TARGET_URLS)}]")
-            
-            data = self.scrape_url(url_config)
-            if data:
-                all_data.append(data)
-            
-            # Delay between requests (except for last one)
-            if i < len(TARGET_URLS):
-                print(f"\n⏳ Waiting {delay} seconds before next request...")
-                time.sleep(delay)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='scraper') as pool:
+            results = list(pool.map(self._scrape_one, sources))
         
-        return all_data
+        if self.http_cache:
+            print(f"\n♻️  HTTP cache: {self.http_cache.stats()}")
+        return [data for data in results if data]
 
 
 def main():
@@ -296,7 +438,7 @@ def main():
     scraper = RoadAccidentScraper(use_web_unlocker=False)
     
     # Scrape all URLs
-    all_data = scraper.scrape_all(delay=3)
+    all_data = scraper.scrape_all()
     
     # Summary
     print("\n" + "="*80)
@@ -0,0 +1,100 @@
+"""
+Test the request-scoped unit of work: every write request commits once
+Drives the write endpoints through app.test_client() against a throwaway
+SQLite database and reads the X-DB-Commits counter (DB_COUNT_HEADERS).
+
+Usage:
+    python -m unittest test_unit_of_work
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+# Configuration is read at import time, so it has to be in place before app is imported
+_work = tempfile.mkdtemp()
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_work, 'uow.db')}",
+    DRIVER_VERSION_FILE=os.path.join(_work, 'versions.bin'),
+    EVENT_BUS_LOG='',
+    DB_COUNT_HEADERS='1'
+)
+os.environ.pop('DB_WRITER_SOCKET', None)
+
+import app as krs
+
+
+def commits(response):
+    return int(response.headers['X-DB-Commits'])
+
+
+class OneCommitPerWriteRequest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with krs.app.app_context():
+            krs.db.create_all()
+        cls.client = krs.app.test_client()
+        cls.client.post('/register', json={
+            'full_name': 'Unit Work', 'username': 'uow', 'email': 'uow@example.com', 'phone': '0700000000',
+            'license_number': 'UOW-1', 'vehicle_type': 'Car', 'password': 'Passw0rd!x'
+        })
+        token = cls.client.post('/login', json={'username': 'uow', 'password': 'Passw0rd!x'}).get_json()['token']
+        cls.headers = {'Authorization': f'Bearer {token}'}
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(_work, ignore_errors=True)
+
+    def post(self, path, payload=None):
+        return self.client.post(path, json=payload or {}, headers=self.headers)
+
+    def test_assess(self):
+        response = self.post('/api/drowsiness/assess', {'tiredness_level': 7, 'sleep_hours': 4, 'hours_driving': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(commits(response), 1)
+
+    def test_session_start_and_end(self):
+        response = self.post('/api/session/start')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(commits(response), 1)
+
+        session_id = response.get_json()['session']['id']
+        response = self.post(f'/api/session/end/{session_id}', {'distance_km': 12})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(commits(response), 1)
+
+        # Ending it again changes nothing
+        response = self.post(f'/api/session/end/{session_id}')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(commits(response), 0)
+
+    def test_record_health(self):
+        response = self.post('/api/health/record', {'sleep_hours': 6, 'tiredness_level': 4, 'fatigue_level': 30})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(commits(response), 1)
+
+    def test_voice_start_session(self):
+        response = self.post('/api/voice/command', {'command': 'start session'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['action'], 'start_session')
+        self.assertEqual(commits(response), 1)
+
+        response = self.post('/api/voice/command', {'command': 'end session'})
+        self.assertEqual(response.get_json()['action'], 'end_session')
+        self.assertEqual(commits(response), 1)
+
+    def test_voice_emergency(self):
+        response = self.post('/api/voice/emergency')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(commits(response), 1)
+
+    def test_read_does_not_commit(self):
+        response = self.client.get('/api/session/history', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(commits(response), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Verified-JWT Cache
+Dashboard clients send the same 30-day token on every request, so each
+token's HS256 signature only needs checking once. Decoded claims are
+kept in a bounded LRU keyed by the token's SHA-256 digest, and entries
+die with the token's `exp` claim.
+
+revoke() is the explicit invalidation hook (used by /logout): a revoked
+token is refused until it would have expired anyway. The cache and the
+revocation list are per process.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import jwt
+
+DEFAULT_MAX_SIZE = int(os.getenv('JWT_CACHE_SIZE', 10000))
+
+
+class VerifiedTokenCache:
+    """Bounded token-digest -> claims cache in front of jwt.decode"""
+
+    def __init__(self, secret, algorithms=('HS256',), max_size=DEFAULT_MAX_SIZE):
+        self.secret = secret
+        self.algorithms = list(algorithms)
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest -> (claims, expires_at or None)
+        self._revoked = {}             # digest -> expires_at or None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def decode(self, token):
+        """
+        Return the token's claims, verifying the signature only on a cache miss.
+
+        Raises the same jwt exceptions as jwt.decode (ExpiredSignatureError,
+        InvalidTokenError, ...), including for revoked tokens.
+        """
+        digest = self._digest(token)
+        now = time.time()
+
+        with self._lock:
+            if digest in self._revoked:
+                raise jwt.InvalidTokenError('Token has been revoked')
+            entry = self._entries.get(digest)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return claims
+                del self._entries[digest]
+                # Fall through so jwt.decode raises ExpiredSignatureError
+            self.misses += 1
+
+        claims = jwt.decode(token, self.secret, algorithms=self.algorithms)
+
+        with self._lock:
+            self._entries[digest] = (claims, claims.get('exp'))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return claims
+
+    def revoke(self, token):
+        """Refuse token from now on (until its own expiry) and drop it from the cache"""
+        digest = self._digest(token)
+        try:
+            expires_at = jwt.decode(token, options={'verify_signature': False}).get('exp')
+        except jwt.InvalidTokenError:
+            expires_at = None
+        now = time.time()
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._revoked[digest] = expires_at
+            # Forget revocations whose tokens have expired on their own
+            for key in [k for k, exp in self._revoked.items() if exp is not None and exp <= now]:
+                del self._revoked[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'revoked': len(self._revoked)
+        }
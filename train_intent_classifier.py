@@ -0,0 +1,127 @@
+"""
+Chat Intent Classifier Training
+===============================
+Trains the hashed character n-gram linear model used by chatbot_api's
+parse_user_query (see intent_classifier.py) on the labelled messages in
+training_data/chat_intents.json.
+
+Softmax regression with class-balanced cross-entropy and L2, fitted by
+full-batch Adam in NumPy - the data is a few hundred messages, so this
+takes seconds and needs nothing beyond NumPy.
+
+Usage:
+    python train_intent_classifier.py            # validate on a held-out split, then fit on everything
+    python train_intent_classifier.py --epochs 400 --l2 1e-4
+"""
+
+import argparse
+import itertools
+import json
+import os
+import numpy as np
+from intent_classifier import (
+    DEFAULT_BUCKETS, DEFAULT_NGRAMS, MODEL_PATH, IntentClassifier, feature_matrix, softmax
+)
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'training_data', 'chat_intents.json')
+VALIDATION_SPLIT = 0.2
+
+
+def load_examples(path=DATA_PATH):
+    """(texts, labels) - the examples plus every template expanded with every place / road"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    texts, labels = [], []
+    for label, examples in data['examples'].items():
+        texts += examples
+        labels += [label] * len(examples)
+
+    for label, templates in data.get('templates', {}).items():
+        for template in templates:
+            places = data['places'] if '{place}' in template else [None]
+            roads = data['roads'] if '{road}' in template else [None]
+            for place, road in itertools.product(places, roads):
+                texts.append(template.format(place=place, road=road))
+                labels.append(label)
+    return texts, labels
+
+
+def fit(texts, labels, epochs=300, learning_rate=0.05, l2=1e-4, buckets=DEFAULT_BUCKETS, ngrams=DEFAULT_NGRAMS):
+    """Train an IntentClassifier"""
+    names = sorted(set(labels))
+    y = np.array([names.index(label) for label in labels])
+    x = feature_matrix(texts, ngrams, buckets)
+    used = np.flatnonzero(x.any(axis=0))  # Buckets no example hits keep weight 0 under L2
+    x = x[:, used]
+    n, classes = len(y), len(names)
+
+    # Templates multiply some intents many times over; weight classes equally
+    counts = np.bincount(y, minlength=classes)
+    sample_weight = (n / (classes * counts))[y] / n
+    target = np.eye(classes, dtype=np.float32)[y]
+
+    w = np.zeros((len(used), classes), dtype=np.float32)
+    b = np.zeros(classes, dtype=np.float32)
+    moments = [np.zeros_like(w), np.zeros_like(w), np.zeros_like(b), np.zeros_like(b)]
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    for epoch in range(1, epochs + 1):
+        p = softmax(x @ w + b)
+        error = (p - target) * sample_weight[:, None]
+        grads = (x.T @ error + l2 * w, error.sum(axis=0))
+        for i, (param, grad) in enumerate(zip((w, b), grads)):
+            m, v = moments[2 * i], moments[2 * i + 1]
+            m *= beta1
+            m += (1 - beta1) * grad
+            v *= beta2
+            v += (1 - beta2) * grad * grad
+            param -= learning_rate * (m / (1 - beta1 ** epoch)) / (np.sqrt(v / (1 - beta2 ** epoch)) + eps)
+
+    weights = np.zeros((buckets, classes), dtype=np.float32)
+    weights[used] = w
+    return IntentClassifier(weights, b, names, ngrams)
+
+
+def _split(texts, labels, fraction, seed=7):
+    """Stratified train / validation split"""
+    rng = np.random.default_rng(seed)
+    train, held = [], []
+    for label in sorted(set(labels)):
+        index = [i for i, l in enumerate(labels) if l == label]
+        rng.shuffle(index)
+        cut = max(1, int(len(index) * fraction))
+        held += index[:cut]
+        train += index[cut:]
+    pick = lambda idx: ([texts[i] for i in idx], [labels[i] for i in idx])
+    return pick(train), pick(held)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the chat intent classifier')
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--learning-rate', type=float, default=0.05)
+    parser.add_argument('--l2', type=float, default=1e-4)
+    parser.add_argument('--output', default=MODEL_PATH)
+    args = parser.parse_args()
+    options = dict(epochs=args.epochs, learning_rate=args.learning_rate, l2=args.l2)
+
+    texts, labels = load_examples()
+    print("\n" + "="*70)
+    print("TRAINING CHAT INTENT CLASSIFIER")
+    print("="*70)
+    print(f"Examples: {len(texts)} ({', '.join(f'{l}: {labels.count(l)}' for l in sorted(set(labels)))})")
+
+    (train_texts, train_labels), (val_texts, val_labels) = _split(texts, labels, VALIDATION_SPLIT)
+    model = fit(train_texts, train_labels, **options)
+    predicted = [intent for intent, _ in model.predict_batch(val_texts)]
+    accuracy = np.mean([p == t for p, t in zip(predicted, val_labels)])
+    print(f"Validation accuracy: {accuracy:.1%} on {len(val_texts)} held-out examples")
+    for text, truth, guess in zip(val_texts, val_labels, predicted):
+        if guess != truth:
+            print(f"   ✗ {text!r}: {truth} -> {guess}")
+
+    model = fit(texts, labels, **options)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    model.save(args.output)
+    print(f"✅ Saved {args.output} ({os.path.getsize(args.output) / 1024:.0f} KB)")
@@ -0,0 +1,117 @@
+"""
+Request-Scoped Unit of Work
+Write operations run during a request only flush; the request's changes
+are committed once, after the handler returns, so every write request
+costs a single commit (one fsync on SQLite, one round trip on Postgres).
+Error responses and exceptions roll everything back.
+
+Per-request counters are kept on flask.g:
+    g.db_queries  - statements sent to any engine
+    g.db_commits  - session commits
+
+Configuration:
+    DB_COUNT_HEADERS=1   add X-DB-Queries / X-DB-Commits to every response
+    DB_STRICT_COMMITS=1  fail any request that commits more than once
+
+test_unit_of_work.py asserts one commit per write request from the counters.
+"""
+
+import os
+from flask import g, has_app_context, jsonify
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from database import db
+from db_routing import RoutingSession
+
+COUNT_HEADERS = os.getenv('DB_COUNT_HEADERS', '').lower() in ('1', 'true', 'yes')
+STRICT_COMMITS = os.getenv('DB_STRICT_COMMITS', '').lower() in ('1', 'true', 'yes')
+
+
+class UnitOfWorkViolation(RuntimeError):
+    """A request committed more than once while DB_STRICT_COMMITS is on"""
+
+
+# ============================================================================
+# COUNTERS
+# ============================================================================
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_pending(session, flush_context):
+    if has_app_context():
+        g.uow_pending = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_statement(orm_execute_state):
+    # Bulk UPDATE/INSERT/DELETE statements change rows without a flush
+    if not orm_execute_state.is_select and has_app_context():
+        g.uow_pending = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _count_commit(session):
+    # Releasing a SAVEPOINT also fires after_commit; only count the real one
+    if has_app_context() and session.get_nested_transaction() is None:
+        g.db_commits = g.get('db_commits', 0) + 1
+        g.uow_pending = False
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _clear_pending(session):
+    if has_app_context() and session.get_nested_transaction() is None:
+        g.uow_pending = False
+
+
+# ============================================================================
+# REQUEST HOOKS
+# ============================================================================
+
+def in_unit_of_work():
+    """True while a request's unit of work will commit for us"""
+    return has_app_context() and g.get('uow_active', False)
+
+
+def init_unit_of_work(app):
+    """Install the commit-once request hooks on app"""
+
+    @app.before_request
+    def _begin():
+        g.uow_active = True
+        g.db_queries = 0
+        g.db_commits = 0
+
+    @app.after_request
+    def _finish(response):
+        g.uow_active = False
+        session = db.session
+        if g.get('uow_pending') or session.new or session.dirty or session.deleted:
+            if response.status_code >= 400:
+                session.rollback()
+            else:
+                try:
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    print(f"❌ Unit of work commit failed: {e}")
+                    response = jsonify({'success': False, 'message': 'Could not save changes'})
+                    response.status_code = 500
+
+        commits = g.get('db_commits', 0)
+        if STRICT_COMMITS and commits > 1:
+            raise UnitOfWorkViolation(f'{commits} commits in one request')
+        if COUNT_HEADERS:
+            response.headers['X-DB-Queries'] = str(g.get('db_queries', 0))
+            response.headers['X-DB-Commits'] = str(commits)
+        return response
+
+    @app.teardown_request
+    def _abandon(exc):
+        # Handler raised: nothing it flushed may survive
+        if exc is not None and g.get('uow_pending'):
+            db.session.rollback()
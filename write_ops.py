@@ -0,0 +1,309 @@
+"""
+Named Database Write Operations
+Every write endpoint expresses its change as a named operation with a
+plain-data payload. perform_write() runs it either:
+  • locally, in the request's own session (default) - committed by the
+    request's unit of work (unit_of_work.py), or
+  • in the single writer process (db_writer.py) when DB_WRITER_SOCKET is
+    set, which batches many operations into one transaction.
+
+Operations take keyword arguments, must not commit, and return plain
+dicts (they may cross a process boundary).
+"""
+
+import itertools
+import os
+import threading
+from datetime import datetime
+from multiprocessing.connection import Client
+from db_routing import note_write
+from unit_of_work import in_unit_of_work
+from database import (
+    db, Driver, DrivingSession, HealthRecord,
+    record_assessment_metrics, record_session_metrics
+)
+from heatmap import record_assessment_location
+
+WRITER_SOCKET = os.getenv('DB_WRITER_SOCKET')
+WRITER_TIMEOUT = float(os.getenv('DB_WRITER_TIMEOUT', 10))
+
+WRITE_OPS = {}
+
+
+def write_op(name):
+    """Register a function as a named write operation"""
+    def register(fn):
+        WRITE_OPS[name] = fn
+        return fn
+    return register
+
+
+class WriteError(Exception):
+    """A write operation failed (locally or in the writer process)"""
+
+
+class WriterUnavailable(WriteError):
+    """The writer process could not be reached - the request was never sent"""
+
+
+# ============================================================================
+# OPERATIONS
+# ============================================================================
+
+@write_op('record_assessment')
+def record_assessment(driver_id, fatigue_level, alert_sent, recommendation,
+                      eye_closure_percentage=0, blink_frequency=15, head_position='normal',
+                      yawn_detected=False, hours_driven=0, latitude=None, longitude=None):
+    """Store a drowsiness assessment and update the driver's current fatigue (and heatmap, if located)"""
+    now = datetime.utcnow()
+    driver = db.session.get(Driver, driver_id)
+    driver.fatigue_level = fatigue_level
+    driver.last_fatigue_assessment = now
+
+    record = HealthRecord(
+        driver_id=driver_id,
+        timestamp=now,
+        assessment_type='drowsiness',
+        fatigue_level=fatigue_level,
+        eye_closure_percentage=eye_closure_percentage,
+        blink_frequency=blink_frequency,
+        head_position=head_position,
+        yawn_detected=yawn_detected,
+        hours_driven=hours_driven,
+        recommendation=recommendation,
+        alert_sent=alert_sent,
+        latitude=latitude,
+        longitude=longitude
+    )
+    db.session.add(record)
+    record_assessment_metrics(record)
+    record_assessment_location(record)
+    db.session.flush()
+    return {'record_id': record.id}
+
+
+@write_op('start_session')
+def start_session(driver_id, start_location='Unknown', weather_condition='Unknown', road_conditions='Normal',
+                  only_if_idle=False):
+    """
+    Open a driving session and mark the driver on_trip.
+
+    With only_if_idle, an already-open session is returned instead of a new
+    one - checked inside the write transaction, so two racing requests
+    cannot both open a session.
+    """
+    if only_if_idle:
+        current = DrivingSession.query.filter_by(driver_id=driver_id, end_time=None).first()
+        if current:
+            return {'already_active': True, 'id': current.id}
+
+    session = DrivingSession(
+        driver_id=driver_id,
+        start_time=datetime.utcnow(),
+        start_location=start_location,
+        weather_condition=weather_condition,
+        road_conditions=road_conditions
+    )
+    db.session.add(session)
+    db.session.get(Driver, driver_id).status = 'on_trip'
+    db.session.flush()
+    return {
+        'already_active': False,
+        'id': session.id,
+        'driver_id': session.driver_id,
+        'start_time': session.start_time.isoformat(),
+        'start_location': session.start_location
+    }
+
+
+@write_op('end_session')
+def end_session(driver_id, session_id, **fields):
+    """
+    Close a driving session, add its hours to the driver and roll it up.
+
+    fields may set end_location, distance_km, average_fatigue, max_fatigue,
+    drowsiness_alerts and breaks_taken; omitted fields are left untouched.
+    Returns None when the session does not belong to the driver, and
+    {'already_ended': True, ...} - without touching the driver or the
+    rollup - when it was ended before.
+    """
+    session = db.session.get(DrivingSession, session_id)
+    if not session or session.driver_id != driver_id:
+        return None
+    if session.end_time is not None:
+        return {'already_ended': True, 'id': session.id}
+
+    session.end_time = datetime.utcnow()
+    for name in ('end_location', 'distance_km', 'average_fatigue', 'max_fatigue', 'drowsiness_alerts', 'breaks_taken'):
+        if name in fields:
+            setattr(session, name, fields[name])
+
+    if session.start_time and session.end_time:
+        duration = (session.end_time - session.start_time).total_seconds() / 3600
+        session.duration_hours = round(duration, 2)
+
+    driver = db.session.get(Driver, driver_id)
+    driver.status = 'inactive'
+    driver.total_driving_hours = (driver.total_driving_hours or 0) + (session.duration_hours or 0)
+
+    record_session_metrics(session)
+    db.session.flush()
+    return {
+        'already_ended': False,
+        'id': session.id,
+        'duration_hours': session.duration_hours,
+        'distance_km': session.distance_km,
+        'average_fatigue': session.average_fatigue,
+        'alerts': session.drowsiness_alerts
+    }
+
+
+@write_op('record_health')
+def record_health(driver_id, record_type='health_update', sleep_hours=None, tiredness_level=None,
+                  fatigue_level=0, recommendation=''):
+    """Store a self-reported health record"""
+    record = HealthRecord(
+        driver_id=driver_id,
+        timestamp=datetime.utcnow(),
+        assessment_type=record_type,
+        sleep_hours=sleep_hours,
+        tiredness_level=tiredness_level,
+        fatigue_level=fatigue_level,
+        recommendation=recommendation
+    )
+    db.session.add(record)
+    record_assessment_metrics(record)
+    db.session.flush()
+    return {
+        'id': record.id,
+        'timestamp': record.timestamp.isoformat(),
+        'sleep_hours': record.sleep_hours,
+        'tiredness_level': record.tiredness_level
+    }
+
+
+@write_op('log_emergency')
+def log_emergency(driver_id, fatigue_level=0):
+    """Store an emergency alert raised by the driver"""
+    record = HealthRecord(
+        driver_id=driver_id,
+        timestamp=datetime.utcnow(),
+        assessment_type='emergency',
+        fatigue_level=fatigue_level,
+        recommendation='EMERGENCY: Driver requested emergency assistance',
+        alert_sent=True
+    )
+    db.session.add(record)
+    record_assessment_metrics(record)
+    db.session.flush()
+    return {'record_id': record.id}
+
+
+# ============================================================================
+# DISPATCH
+# ============================================================================
+
+class _WriterClient:
+    """One connection per thread to the writer process; requests are strictly send-then-receive"""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.local = threading.local()
+        self.request_ids = itertools.count(1)
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+            self.local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self.local, 'conn', None)
+        self.local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def _send(self, message):
+        """Send on this thread's connection, reconnecting once if the writer restarted"""
+        for attempt in (1, 2):
+            try:
+                conn = self._connection()
+                conn.send(message)
+                return conn
+            except (OSError, EOFError) as e:
+                self._reset()
+                if attempt == 2:
+                    raise WriterUnavailable(str(e))
+
+    def call(self, op, payload):
+        request_id = next(self.request_ids)
+        conn = self._send((request_id, op, payload))
+        try:
+            # From here on the writer may have applied the operation, so failures
+            # are reported rather than retried locally (which could double-write)
+            if not conn.poll(WRITER_TIMEOUT):
+                raise WriteError(f"Writer did not acknowledge '{op}' within {WRITER_TIMEOUT}s")
+            reply_id, ok, result = conn.recv()
+        except (OSError, EOFError) as e:
+            self._reset()
+            raise WriteError(f"Writer connection lost during '{op}': {e}")
+        except WriteError:
+            self._reset()
+            raise
+        if reply_id != request_id:
+            self._reset()
+            raise WriteError('Writer reply out of sequence')
+        if not ok:
+            raise WriteError(result)
+        return result
+
+
+_writer_client = None
+_writer_warned = False
+
+
+def _get_writer_client():
+    global _writer_client
+    if _writer_client is None and WRITER_SOCKET:
+        from flask import current_app
+        _writer_client = _WriterClient(WRITER_SOCKET, current_app.config['SECRET_KEY'].encode())
+    return _writer_client
+
+
+def apply_write(op, payload):
+    """Run one operation in the current session without committing"""
+    return WRITE_OPS[op](**payload)
+
+
+def perform_write(op, **payload):
+    """
+    Execute a named write operation and return its result dict.
+
+    Goes through the writer process when one is configured; if it cannot
+    be reached at all the write is applied locally so requests keep working.
+    """
+    global _writer_warned
+
+    client = _get_writer_client()
+    if client is not None:
+        try:
+            result = client.call(op, payload)
+            # The commit happened in the writer process, so mark the driver here
+            note_write(payload.get('driver_id'))
+            return result
+        except WriterUnavailable as e:
+            if not _writer_warned:
+                print(f"⚠️  DB writer unavailable ({e}). Writing directly to the database.")
+                _writer_warned = True
+
+    try:
+        result = apply_write(op, payload)
+        # Inside a request the unit of work commits once when the handler returns
+        if not in_unit_of_work():
+            db.session.commit()
+        return result
+    except Exception:
+        db.session.rollback()
+        raise